@@ -116,7 +116,7 @@ if [ -d "output/shud_project" ]; then
     echo "  $(pwd)/output/shud_project/"
     echo ""
     echo "您可以将此目录复制到 SHUD 模型项目中使用:"
-    echo "  cp -r output/shud_project/* /path/to/your/SHUD_project/"
+    echo "  cp -rL output/shud_project/* /path/to/your/SHUD_project/"
 else
     echo "警告: 未生成 SHUD 项目目录，请检查处理步骤是否成功"
 fi
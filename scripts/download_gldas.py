@@ -12,6 +12,7 @@ import subprocess
 import getpass
 import netrc
 import glob
+import json
 import platform
 from datetime import datetime
 
@@ -40,6 +41,9 @@ def parse_args():
     parser.add_argument("--skip-auth", action="store_true", 
                         help="跳过认证步骤，使用已有的.netrc配置")
     
+    parser.add_argument("--manifest", 
+                        help="check_data_integrity.py生成的检查清单，只重新下载其中缺失和损坏的文件（损坏文件在新文件下载成功后移到quarantine子目录）")
+    
     return parser.parse_args()
 
 def check_wget():
@@ -135,8 +139,21 @@ def setup_netrc(username, password):
         print(f"设置.netrc文件失败: {str(e)}")
         return False
 
-def download_data(url_list, data_dir):
-    """下载GLDAS数据文件"""
+def quarantine_file(file_path, data_dir):
+    """将被替换的旧文件移到数据目录的quarantine子目录，而不是删除"""
+    quarantine_dir = os.path.join(data_dir, "quarantine")
+    os.makedirs(quarantine_dir, exist_ok=True)
+    target = os.path.join(quarantine_dir, os.path.basename(file_path))
+    os.replace(file_path, target)
+    print(f"  旧文件已移至: {target}")
+
+def download_data(url_list, data_dir, flagged=None):
+    """下载GLDAS数据文件
+
+    先下载到临时文件，成功后才替换目标文件；flagged为{链接: 检查清单中标记为损坏的本地文件}，
+    这些文件不会因"文件已存在"被跳过，新文件下载成功后旧文件移到quarantine子目录。
+    """
+    flagged = flagged or {}
     if not os.path.exists(data_dir):
         os.makedirs(data_dir)
     
@@ -150,34 +167,43 @@ def download_data(url_list, data_dir):
         
         filename = os.path.basename(url)
         outfile = os.path.join(data_dir, filename)
+        old_files = [f for f in flagged.get(url, []) if os.path.exists(f)]
         
-        # 检查文件是否已存在
-        if os.path.exists(outfile):
+        # 检查文件是否已存在（检查清单中标记为损坏的文件除外）
+        if os.path.exists(outfile) and os.path.abspath(outfile) not in [os.path.abspath(f) for f in old_files]:
             print(f"文件已存在，跳过: {filename}")
             success_count += 1
             continue
         
         print(f"下载文件 {i+1}/{total_files}: {filename}")
+        part_file = outfile + ".part"
         
         try:
-            # 使用wget下载
+            # 使用wget下载到临时文件
             result = subprocess.run(
                 ["wget", "--load-cookies", "~/.urs_cookies", "--save-cookies", "~/.urs_cookies", 
-                 "--keep-session-cookies", "--no-check-certificate", "-O", outfile, url],
+                 "--keep-session-cookies", "--no-check-certificate", "-O", part_file, url],
                 stdout=subprocess.PIPE, 
                 stderr=subprocess.PIPE,
                 text=True
             )
             
-            if result.returncode == 0:
+            if result.returncode == 0 and os.path.getsize(part_file) > 0:
+                # 下载成功后才移走旧文件并替换
+                for old_file in old_files:
+                    quarantine_file(old_file, data_dir)
+                os.replace(part_file, outfile)
                 print(f"  下载成功: {filename}")
                 success_count += 1
             else:
-                print(f"  下载失败: {filename}")
+                print(f"  下载失败: {filename}，保留原有文件")
                 print(f"  错误信息: {result.stderr}")
         
         except Exception as e:
             print(f"  下载出错: {str(e)}")
+        finally:
+            if os.path.exists(part_file):
+                os.remove(part_file)
     
     print(f"\n下载完成: {success_count}/{total_files} 个文件成功")
     return success_count
@@ -204,6 +230,21 @@ def get_example_file():
         
         return example_file
 
+def read_manifest(manifest_file):
+    """读取完整性检查清单，返回(需要重新下载的链接, {链接: 标记为损坏的本地文件})
+
+    损坏文件不在这里删除，由download_data在新文件下载成功后移到quarantine子目录。
+    """
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    
+    flagged = {}
+    for entry in manifest.get("corrupt", []):
+        if entry.get("url"):
+            flagged.setdefault(entry["url"], []).append(entry["file"])
+    
+    return manifest.get("refetch_urls", []), flagged
+
 def main():
     """主函数"""
     args = parse_args()
@@ -240,28 +281,43 @@ def main():
             print("设置NASA Earthdata认证失败，无法继续下载。")
             return 1
     
-    # 获取下载链接列表
-    list_file = args.list_file
-    if not list_file:
-        list_file = get_example_file()
-        print(f"使用示例下载链接文件: {list_file}")
-    
-    # 读取下载链接
-    try:
-        with open(list_file, 'r') as f:
-            urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    # 根据检查清单重新下载
+    flagged = {}
+    if args.manifest:
+        try:
+            urls, flagged = read_manifest(args.manifest)
+        except Exception as e:
+            print(f"读取检查清单失败: {str(e)}")
+            return 1
         
         if not urls:
-            print(f"下载链接文件为空: {list_file}")
-            return 1
+            print(f"检查清单中没有需要重新下载的文件: {args.manifest}")
+            return 0
         
-        print(f"共找到 {len(urls)} 个下载链接")
-    except Exception as e:
-        print(f"读取下载链接文件失败: {str(e)}")
-        return 1
+        print(f"检查清单中共有 {len(urls)} 个文件需要重新下载")
+    else:
+        # 获取下载链接列表
+        list_file = args.list_file
+        if not list_file:
+            list_file = get_example_file()
+            print(f"使用示例下载链接文件: {list_file}")
+        
+        # 读取下载链接
+        try:
+            with open(list_file, 'r') as f:
+                urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+            
+            if not urls:
+                print(f"下载链接文件为空: {list_file}")
+                return 1
+            
+            print(f"共找到 {len(urls)} 个下载链接")
+        except Exception as e:
+            print(f"读取下载链接文件失败: {str(e)}")
+            return 1
     
     # 开始下载
-    success_count = download_data(urls, data_dir)
+    success_count = download_data(urls, data_dir, flagged)
     
     if success_count > 0:
         print(f"\n数据已下载到: {data_dir}")
@@ -9,6 +9,8 @@ import os
 import sys
 import argparse
 import importlib.util
+import numpy as np
+import xarray as xr
 
 def get_parent_dir():
     """获取上级目录路径"""
@@ -40,11 +42,41 @@ def parse_args():
     parser.add_argument("--buffer", type=float, default=0.1, 
                         help="边界框缓冲距离(度)，默认为0.1度")
     
+    parser.add_argument("--points", nargs='+', type=str,
+                        help="指定的坐标点列表，格式为'lon,lat'，与--point-file、--bbox同时使用时合并")
+    
+    parser.add_argument("--point-file", type=str,
+                        help="包含坐标点的文件，每行一个点，格式为'lon,lat'，与--points、--bbox同时使用时合并")
+    
     parser.add_argument("--force", action="store_true", 
                         help="强制重新处理已存在的文件")
     
     return parser.parse_args()
 
+def resolve_path(path, parent_dir):
+    """相对路径按项目根目录解析"""
+    if os.path.isabs(path):
+        return path
+    return os.path.join(parent_dir, path.lstrip('./'))
+
+def read_grid_axes(nc_file):
+    """从数据文件读取格点中心的经度和纬度坐标轴"""
+    with xr.open_dataset(nc_file) as ds:
+        return ds['lon'].values, ds['lat'].values
+
+def bbox_points(bbox, buffer, grid_lons, grid_lats):
+    """与加上缓冲距离后的边界框相交的每个网格单元，生成其中心的'lon,lat'坐标点
+
+    网格单元的中心和大小取自数据文件的坐标轴，适用于任意分辨率的产品。
+    """
+    xmin, ymin, xmax, ymax = bbox
+    def intersecting(centers, lo, hi):
+        centers = np.asarray(centers, dtype=float)
+        half = np.abs(np.diff(centers)).max() / 2 if len(centers) > 1 else 0.0
+        return centers[(centers + half > lo - buffer) & (centers - half < hi + buffer)]
+    lons, lats = intersecting(grid_lons, xmin, xmax), intersecting(grid_lats, ymin, ymax)
+    return [f"{lon:.4f},{lat:.4f}" for lat in lats for lon in lons]
+
 def main():
     """主函数"""
     # 获取命令行参数
@@ -59,52 +91,55 @@ def main():
         print(f"错误: 未找到gldas_to_shud.py文件: {gldas_module_path}")
         return 1
     
-    # 动态导入模块
+    # 动态导入模块（src目录加入搜索路径，以便导入其依赖的共享模块）
+    sys.path.insert(0, os.path.dirname(gldas_module_path))
     gldas_module = import_module_from_file(gldas_module_path)
     
-    # 设置参数
-    class Args:
-        def __init__(self):
-            # 解析数据目录路径
-            if os.path.isabs(args.data_dir):
-                self.data_dir = args.data_dir
-            else:
-                self.data_dir = os.path.join(parent_dir, args.data_dir.lstrip('./'))
-            
-            # 解析输出目录路径
-            if os.path.isabs(args.output_dir):
-                self.output_dir = args.output_dir
-            else:
-                self.output_dir = os.path.join(parent_dir, args.output_dir.lstrip('./'))
-            
-            self.bbox = args.bbox
-            self.buffer = args.buffer
-            self.force = args.force
-    
-    # 创建参数对象
-    module_args = Args()
+    data_dir = resolve_path(args.data_dir, parent_dir)
+    output_dir = resolve_path(args.output_dir, parent_dir)
     
     # 确保目录存在
-    os.makedirs(module_args.data_dir, exist_ok=True)
-    os.makedirs(module_args.output_dir, exist_ok=True)
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # 检查数据目录中是否有文件
+    if not os.listdir(data_dir):
+        print(f"警告: 数据目录 '{data_dir}' 为空!")
+        print("请先下载GLDAS数据文件到该目录，或使用 download_gldas.py 脚本下载数据。")
+        return 1
+    
+    # 合并--points、--point-file和--bbox的坐标点
+    points = list(args.points or [])
+    if args.point_file:
+        points += [f"{p['lon']},{p['lat']}" for p in gldas_module.read_points_from_file(args.point_file)]
+    if args.bbox:
+        nc_files = gldas_module.get_nc4_files(data_dir, "*.nc4*")
+        if not nc_files:
+            print(f"错误: 数据目录中没有NC4文件，无法按边界框生成坐标点: {data_dir}")
+            return 1
+        points += bbox_points(args.bbox, args.buffer, *read_grid_axes(nc_files[0]))
+    
+    # 用gldas_to_shud自己的参数解析器生成参数对象，保证字段与main_with_args一致
+    module_argv = ["--data-dir", data_dir, "--output-dir", output_dir]
+    if points:
+        module_argv += ["--points"] + points
+    if args.force:
+        module_argv.append("--force")
+    module_args = gldas_module.parse_arguments(module_argv)
     
     print("=" * 80)
     print("GLDAS数据处理工具")
     print("=" * 80)
     print(f"数据目录: {module_args.data_dir}")
     print(f"输出目录: {module_args.output_dir}")
-    if module_args.bbox:
-        print(f"研究区域: {module_args.bbox}")
-    print(f"缓冲距离: {module_args.buffer}度")
+    if args.bbox:
+        print(f"研究区域: {args.bbox}")
+        print(f"缓冲距离: {args.buffer}度")
+    if module_args.points:
+        print(f"坐标点: {len(module_args.points)}个")
     print(f"强制重写: {'是' if module_args.force else '否'}")
     print("=" * 80)
     
-    # 检查数据目录中是否有文件
-    if not os.listdir(module_args.data_dir):
-        print(f"警告: 数据目录 '{module_args.data_dir}' 为空!")
-        print("请先下载GLDAS数据文件到该目录，或使用 download_gldas.py 脚本下载数据。")
-        return 1
-    
     # 调用gldas_to_shud模块的main函数
     return gldas_module.main_with_args(module_args)
 
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+从共享驱动数据池组装多个SHUD项目目录
+功能:
+1. 以process_gldas_for_shud.py的输出目录（或某个情景目录）作为驱动数据池
+2. 为每个项目目录（情景、子流域等）链接meteo.tsd.forc和其中列出的CSV文件，
+   不重复占用磁盘空间；每个项目可使用自己的meteo.tsd.forc
+3. 再次运行时只处理内容变化的文件，并删除不再列出的文件
+"""
+
+import os
+import argparse
+
+from shud_project import LINK_MODES, assemble_project
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="从共享驱动数据池组装SHUD项目目录")
+    parser.add_argument("--pool-dir", default="output", help="驱动数据池目录（包含meteo.tsd.forc和csv/）")
+    parser.add_argument("--project", action="append", required=True,
+                        help="项目定义 项目目录[:meteo.tsd.forc]，默认使用数据池中的meteo.tsd.forc，可重复指定")
+    parser.add_argument("--link-mode", choices=LINK_MODES, default="auto",
+                        help="驱动文件的放置方式，auto依次尝试硬链接、reflink、符号链接、复制")
+    return parser.parse_args()
+
+def parse_project(spec):
+    """解析项目定义 项目目录[:meteo.tsd.forc]，返回(项目目录, meteo.tsd.forc或None)"""
+    project_dir, _, forc_file = spec.partition(":")
+    if forc_file and not os.path.exists(forc_file):
+        raise FileNotFoundError(f"没有找到项目 '{project_dir}' 的meteo.tsd.forc: {forc_file}")
+    return project_dir, forc_file or None
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+
+    if not os.path.exists(os.path.join(args.pool_dir, "meteo.tsd.forc")):
+        print(f"错误: 驱动数据池中没有meteo.tsd.forc: {args.pool_dir}")
+        return 1
+
+    projects = [parse_project(spec) for spec in args.project]
+    print(f"从{args.pool_dir}组装{len(projects)}个SHUD项目...")
+    missing = 0
+    for project_dir, forc_file in projects:
+        counts = assemble_project(args.pool_dir, project_dir, forc_file, args.link_mode)
+        missing += counts["missing"]
+
+    print("SHUD项目组装完成")
+    return 1 if missing else 0
+
+if __name__ == "__main__":
+    try:
+        exit_code = main()
+        exit(exit_code)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        exit(1)
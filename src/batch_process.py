@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多流域批处理工具 - 一次读取NC文件，同时生成多个项目的SHUD气象驱动数据
+功能:
+1. 读取YAML批处理定义: 共享的数据目录和产品，以及多个项目（点来源、日期范围、输出目录和其他处理参数）
+2. 合并所有项目的格点和文件，每个NC文件只读取一次，提取到共享缓存（支持检查点、断点续提和增量提取）
+3. 按项目的格点、变量和日期范围从共享缓存切片，写入各项目自己的缓存和台账
+4. 每个项目按自己的参数生成驱动文件、配置文件和SHUD项目，与单独运行process_gldas_for_shud.py的结果相同
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from ldas_products import DEFAULT_PRODUCT, get_product, available_variables
+from process_gldas_for_shud import (parse_arguments as parse_project_arguments, create_directories,
+                                    get_nc4_files, filter_files_by_date, group_files_by_year,
+                                    extract_date_from_filename, read_input_points, plan_forcing_cells,
+                                    extract_points_to_cache, write_forcing_outputs,
+                                    _atomic_savez, _atomic_write_json)
+
+# 只能在批处理定义顶层设置、所有项目共享的参数
+SHARED_KEYS = ["data_dir", "product"]
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="按YAML批处理定义一次生成多个项目的SHUD气象驱动数据")
+    parser.add_argument("--config", required=True, help="批处理定义文件(.yml)")
+    parser.add_argument("--cache-dir", type=str, help="共享缓存目录，默认为批处理定义中的cache_dir或output/batch_cache")
+    parser.add_argument("--projects", nargs='+', type=str, help="只处理这些项目（按name），默认全部")
+    parser.add_argument("--force", action="store_true", help="强制重新提取共享缓存")
+    return parser.parse_args()
+
+def load_batch_config(config_file):
+    """读取YAML批处理定义"""
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("读取批处理定义需要pyyaml，请先安装: pip install pyyaml")
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+    projects = config.get("projects") or []
+    if not projects:
+        raise ValueError(f"批处理定义中没有项目: {config_file}")
+    for idx, project in enumerate(projects):
+        if "output_dir" not in project:
+            raise ValueError(f"第{idx + 1}个项目没有指定output_dir")
+        project.setdefault("name", os.path.basename(os.path.normpath(project["output_dir"])))
+    return config
+
+def project_arguments(config, project):
+    """项目参数: 命令行默认值，依次用批处理定义的defaults和项目设置覆盖"""
+    args = parse_project_arguments([])
+    args.data_dir = config.get("data_dir", args.data_dir)
+    args.product = config.get("product", DEFAULT_PRODUCT)
+    settings = dict(config.get("defaults") or {})
+    settings.update(project)
+    for key, value in settings.items():
+        name = key.replace("-", "_")
+        if name == "name":
+            continue
+        if name in SHARED_KEYS:
+            raise ValueError(f"项目 '{project['name']}' 不能单独设置 {key}，请在批处理定义顶层设置")
+        if not hasattr(args, name):
+            raise ValueError(f"项目 '{project['name']}' 中有未知的参数: {key}")
+        # YAML会把20230501读成整数
+        if name in ("start_date", "end_date", "time_step") and value is not None:
+            value = str(value)
+        if name == "points" and isinstance(value, str):
+            value = [value]
+        setattr(args, name, value)
+    return args
+
+def union_cells(projects):
+    """合并所有项目的提取格点（按格点ID去重，保持首次出现的顺序）"""
+    cells = {}
+    for project in projects:
+        for cell in project["forcing_cells"]:
+            cells.setdefault(cell["id"], {key: cell[key] for key in ("id", "lon", "lat", "lat_idx", "lon_idx")})
+    return list(cells.values())
+
+def route_cache(shared_cache, shared_ledger, cache_file, ledger_file, cell_ids, variables, files):
+    """从共享缓存切出项目的格点、变量和日期范围，写入项目缓存和台账，返回项目缓存文件或None"""
+    dates = [extract_date_from_filename(f) for f in files]
+    with np.load(shared_cache) as cache_data:
+        point_ids = [str(i) for i in cache_data['point_ids']]
+        shared_vars = [str(v) for v in cache_data['variables']]
+        times = pd.DatetimeIndex(cache_data['times'])
+        mask = (times >= pd.Timestamp(min(dates))) & (times <= pd.Timestamp(max(dates)))
+        if not mask.any():
+            return None
+        point_index = pd.Index(point_ids).get_indexer(cell_ids)
+        var_index = [shared_vars.index(v) for v in variables]
+        data_array = cache_data['data_array'][point_index][:, mask][:, :, var_index]
+
+    _atomic_savez(
+        cache_file,
+        data_array=data_array,
+        point_ids=list(cell_ids),
+        variables=list(variables),
+        times=times[mask].values
+    )
+
+    # 项目台账只记录项目日期范围内的文件，之后单独运行--append时可继续增量提取
+    with open(shared_ledger, 'r') as f:
+        shared_files = json.load(f)["files"]
+    names = [os.path.basename(f) for f in files]
+    _atomic_write_json(ledger_file, {
+        "files": {name: shared_files[name] for name in names if name in shared_files},
+        "point_ids": list(cell_ids),
+        "variables": list(variables),
+    })
+    return cache_file
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    config = load_batch_config(args.config)
+    product = get_product(config.get("product", DEFAULT_PRODUCT))
+    prefix = product["cache_prefix"]
+    cache_dir = args.cache_dir or config.get("cache_dir") or os.path.join("output", "batch_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    print(f"数据产品: {product['name']} ({product['description']})")
+    all_files = get_nc4_files(config.get("data_dir", "data/gldas_data"), product["file_pattern"])
+    if not all_files:
+        print("错误: 没有找到NC4文件，退出")
+        return 1
+
+    # 逐个项目读取点、过滤文件并规划格点
+    projects = []
+    for project in config["projects"]:
+        if args.projects and project["name"] not in args.projects:
+            continue
+        print(f"========== 项目 {project['name']} ==========")
+        project_args = project_arguments(config, project)
+        point_ids, lons, lats, point_elevations = read_input_points(project_args)
+        if len(point_ids) == 0:
+            print(f"错误: 项目 '{project['name']}' 没有有效的坐标点，跳过")
+            continue
+        files = filter_files_by_date(all_files, project_args.start_date, project_args.end_date)
+        if not files:
+            print(f"错误: 项目 '{project['name']}' 没有文件符合日期范围要求，跳过")
+            continue
+        gldas_points, forcing_cells, output_cells, sites = plan_forcing_cells(
+            project_args, point_ids, lons, lats, point_elevations, files[0], product)
+        projects.append({"name": project["name"], "args": project_args, "files": files,
+                         "gldas_points": gldas_points, "forcing_cells": forcing_cells,
+                         "output_cells": output_cells, "sites": sites})
+
+    if not projects:
+        print("错误: 没有可处理的项目")
+        return 1
+
+    # 所有项目的格点和文件取并集，每个文件只读取一次
+    cells = union_cells(projects)
+    files = sorted(set(f for project in projects for f in project["files"]))
+    optional = any(bool(project["args"].derived) for project in projects)
+    print(f"========== 共享提取: {len(projects)}个项目，{len(cells)}个格点，{len(files)}个文件 ==========")
+
+    with xr.open_dataset(files[0]) as first_ds:
+        nc_variables = first_ds.variables
+        project_variables = {flag: available_variables(product, nc_variables, flag) for flag in (False, True)}
+
+    shared_caches = {}
+    for year, year_files in group_files_by_year(files).items():
+        print(f"处理{year}年的数据...")
+        cache_file = extract_points_to_cache(year_files, year, cache_dir, cells, args.force,
+                                             projects[0]["args"].checkpoint_every, projects[0]["args"].max_attempts,
+                                             product, optional=optional, incremental=True)
+        if cache_file:
+            shared_caches[year] = cache_file
+
+    if not shared_caches:
+        print("错误: 没有成功创建共享缓存文件")
+        return 1
+
+    # 按项目切片共享缓存，再按各自的参数生成驱动数据
+    failed = []
+    for project in projects:
+        project_args = project["args"]
+        print(f"========== 生成项目 {project['name']} 的驱动数据 ==========")
+        dirs = create_directories(project_args.output_dir)
+        cell_ids = [cell["id"] for cell in project["forcing_cells"]]
+        variables = project_variables[bool(project_args.derived)]
+        cache_files = []
+        for year, year_files in group_files_by_year(project["files"]).items():
+            if year not in shared_caches:
+                continue
+            shared_cache = shared_caches[year]
+            cache_file = route_cache(shared_cache, shared_cache.replace(".cache.npz", ".ledger.json"),
+                                     os.path.join(dirs["cache"], f"{prefix}-{year}-points.cache.npz"),
+                                     os.path.join(dirs["cache"], f"{prefix}-{year}-points.ledger.json"),
+                                     cell_ids, variables, year_files)
+            if cache_file:
+                print(f"  项目缓存已保存: {cache_file}")
+                cache_files.append(cache_file)
+        if not cache_files:
+            print(f"错误: 项目 '{project['name']}' 没有缓存数据")
+            failed.append(project["name"])
+            continue
+        if write_forcing_outputs(project_args, dirs, cache_files, project["gldas_points"],
+                                 project["output_cells"], project["sites"], product) != 0:
+            failed.append(project["name"])
+
+    if failed:
+        print(f"错误: {len(failed)}个项目处理失败: {', '.join(failed)}")
+        return 1
+    print(f"批处理完成: {len(projects)}个项目")
+    return 0
+
+if __name__ == "__main__":
+    try:
+        exit_code = main()
+        exit(exit_code)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        exit(1)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+GLDAS数据完整性检查工具
+功能:
+1. 使用进程池并行打开所有nc4文件，检查文件头、变量和时间值
+2. 根据首末时间点构建预期的3小时时间轴，找出缺失和重复的时间点
+3. 输出机器可读的清单文件(JSON)，并可生成需要重新下载的链接列表
+"""
+
+import os
+import re
+import json
+import glob
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ldas_products import PRODUCTS, DEFAULT_PRODUCT, get_product, source_variables
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="并行检查GLDAS数据文件的完整性和时间连续性")
+    parser.add_argument("--data-dir", default="data/gldas_data", help="GLDAS数据目录（同时检查downloads子目录）")
+    parser.add_argument("--product", choices=sorted(PRODUCTS), default=DEFAULT_PRODUCT, help="LDAS数据产品，决定默认的文件模式、时间步长和变量")
+    parser.add_argument("--pattern", help="文件匹配模式，默认使用产品的文件模式")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="并行进程数，默认为CPU核数")
+    parser.add_argument("--step-hours", type=int, help="预期时间步长(小时)，默认使用产品的时间步长")
+    parser.add_argument("--variables", nargs='+', help="每个文件必须包含的变量，默认使用产品的原始变量")
+    parser.add_argument("--manifest", default="data_integrity_manifest.json", help="输出的检查清单文件(JSON)")
+    parser.add_argument("--links-file", type=str, help="将缺失和损坏文件的下载链接写入此文件，供download_gldas.py --list-file使用")
+    parser.add_argument("--url-template", help="下载链接模板（可用{year} {doy} {date} {hhmm}），默认使用产品的下载链接模板")
+    parser.add_argument("--header-only", action="store_true", help="只检查文件头和时间值，不读取变量数据")
+    return parser.parse_args()
+
+def get_nc4_files(data_dir, pattern="*.nc4"):
+    """获取数据目录及其downloads子目录中的所有NC4文件"""
+    files = glob.glob(os.path.join(data_dir, pattern))
+    downloads_dir = os.path.join(data_dir, "downloads")
+    if os.path.exists(downloads_dir):
+        files.extend(glob.glob(os.path.join(downloads_dir, pattern)))
+    return sorted(files)
+
+def extract_date_from_filename(filename):
+    """从GLDAS文件名中提取日期时间信息"""
+    base = os.path.basename(filename)
+
+    # 新格式: GLDAS_YYYYMMDD_HHMM.nc4
+    match = re.match(r'GLDAS_(\d{8})_(\d{4})\.nc4', base)
+    if not match:
+        # 旧格式: GLDAS_NOAH025_3H_EP.A20230501.0000.021.nc4
+        match = re.search(r'\.A(\d{8})\.(\d{4})\.', base)
+    if not match:
+        return None
+
+    return datetime.strptime(match.group(1) + match.group(2), "%Y%m%d%H%M")
+
+def check_file(args):
+    """检查单个NC4文件（在子进程中运行）"""
+    nc_file, variables, header_only = args
+
+    result = {
+        "file": nc_file,
+        "time": None,
+        "size": os.path.getsize(nc_file),
+        "errors": [],
+    }
+
+    file_time = extract_date_from_filename(nc_file)
+    if file_time is None:
+        result["errors"].append("无法从文件名解析时间")
+    else:
+        result["time"] = file_time.strftime("%Y-%m-%dT%H:%M")
+
+    try:
+        import xarray as xr
+        with xr.open_dataset(nc_file) as ds:
+            # 检查维度
+            for dim in ("time", "lat", "lon"):
+                if dim not in ds.dims:
+                    result["errors"].append(f"缺少维度 {dim}")
+            if "lat" in ds.dims and "lon" in ds.dims:
+                result["grid"] = [int(ds.sizes["lat"]), int(ds.sizes["lon"])]
+
+            # 检查时间值与文件名是否一致
+            if "time" in ds.variables and ds.time.size > 0:
+                data_time = np.datetime64(ds.time.values[0], "m").astype(datetime)
+                if file_time is not None and data_time != file_time:
+                    result["errors"].append(f"时间值 {data_time} 与文件名时间不一致")
+            else:
+                result["errors"].append("缺少时间值")
+
+            # 检查变量，读取数据以触发HDF5块解压
+            for var in variables:
+                if var not in ds.variables:
+                    result["errors"].append(f"缺少变量 {var}")
+                    continue
+                if header_only:
+                    continue
+                values = ds[var].values
+                if not np.isfinite(values).any():
+                    result["errors"].append(f"变量 {var} 全部为缺测值")
+    except Exception as e:
+        result["errors"].append(f"无法读取文件: {str(e)}")
+
+    return result
+
+def build_download_url(time_value, url_template):
+    """根据时间点生成下载链接"""
+    return url_template.format(
+        year=time_value.year,
+        doy=time_value.timetuple().tm_yday,
+        date=time_value.strftime("%Y%m%d"),
+        hhmm=time_value.strftime("%H%M"),
+    )
+
+def scan_files(nc_files, variables, workers, header_only=False):
+    """使用进程池并行检查所有文件"""
+    tasks = [(f, variables, header_only) for f in nc_files]
+    chunksize = max(1, len(tasks) // (max(workers, 1) * 8))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for idx, result in enumerate(executor.map(check_file, tasks, chunksize=chunksize)):
+            results.append(result)
+            if (idx + 1) % 500 == 0 or idx + 1 == len(tasks):
+                print(f"  已检查 {idx+1}/{len(tasks)} 个文件")
+
+    return results
+
+def build_manifest(results, step_hours, url_template):
+    """根据检查结果构建清单：缺失、重复、损坏和偏离时间轴的文件"""
+    # 损坏文件
+    corrupt = []
+    for r in results:
+        if r["errors"]:
+            entry = {"file": r["file"], "time": r["time"], "errors": r["errors"]}
+            if r["time"]:
+                entry["url"] = build_download_url(datetime.strptime(r["time"], "%Y-%m-%dT%H:%M"), url_template)
+            corrupt.append(entry)
+
+    # 按时间点分组
+    by_time = {}
+    for r in results:
+        if r["time"]:
+            by_time.setdefault(r["time"], []).append(r["file"])
+
+    duplicates = [{"time": t, "files": files} for t, files in sorted(by_time.items()) if len(files) > 1]
+
+    # 构建预期时间轴
+    missing = []
+    off_axis = []
+    first_time = last_time = None
+    expected_count = 0
+    if by_time:
+        present = sorted(datetime.strptime(t, "%Y-%m-%dT%H:%M") for t in by_time)
+        first_time, last_time = present[0], present[-1]
+
+        expected = np.arange(
+            np.datetime64(first_time, "m"),
+            np.datetime64(last_time, "m") + np.timedelta64(1, "m"),
+            np.timedelta64(step_hours * 60, "m"),
+        )
+        expected_count = len(expected)
+        present_arr = np.array(present, dtype="datetime64[m]")
+
+        for t in np.setdiff1d(expected, present_arr).astype(datetime):
+            missing.append({"time": t.strftime("%Y-%m-%dT%H:%M"), "url": build_download_url(t, url_template)})
+        for t in np.setdiff1d(present_arr, expected).astype(datetime):
+            off_axis.append({"time": t.strftime("%Y-%m-%dT%H:%M"), "files": by_time[t.strftime("%Y-%m-%dT%H:%M")]})
+
+    # 网格尺寸不一致的文件
+    grids = [tuple(r["grid"]) for r in results if r.get("grid")]
+    if grids:
+        values, counts = np.unique(np.array(grids), axis=0, return_counts=True)
+        common_grid = list(values[counts.argmax()])
+        for r in results:
+            if r.get("grid") and list(r["grid"]) != common_grid and not r["errors"]:
+                corrupt.append({
+                    "file": r["file"],
+                    "time": r["time"],
+                    "errors": [f"网格尺寸 {r['grid']} 与多数文件 {common_grid} 不一致"],
+                    "url": build_download_url(datetime.strptime(r["time"], "%Y-%m-%dT%H:%M"), url_template) if r["time"] else None,
+                })
+
+    return {
+        "scanned_at": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+        "step_hours": step_hours,
+        "first_time": first_time.strftime("%Y-%m-%dT%H:%M") if first_time else None,
+        "last_time": last_time.strftime("%Y-%m-%dT%H:%M") if last_time else None,
+        "file_count": len(results),
+        "expected_count": expected_count,
+        "missing": missing,
+        "duplicates": duplicates,
+        "corrupt": corrupt,
+        "off_axis": off_axis,
+        "refetch_urls": sorted({e["url"] for e in missing + corrupt if e.get("url")}),
+    }
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+
+    # 未指定的参数使用产品注册表中的定义
+    product = get_product(args.product)
+    args.pattern = args.pattern or product["file_pattern"]
+    args.step_hours = args.step_hours or product["timestep_hours"]
+    args.variables = args.variables or source_variables(product)
+    args.url_template = args.url_template or product["url_template"]
+
+    print("=== GLDAS数据完整性检查 ===")
+    print(f"数据产品: {product['name']}")
+    print(f"数据目录: {args.data_dir}")
+
+    if not os.path.isdir(args.data_dir):
+        print(f"错误: 数据目录不存在: {args.data_dir}")
+        return 1
+
+    nc_files = get_nc4_files(args.data_dir, args.pattern)
+    if not nc_files:
+        print("错误: 没有找到NC4文件")
+        return 1
+
+    print(f"检测到 {len(nc_files)} 个GLDAS数据文件，使用 {args.workers} 个进程检查")
+    results = scan_files(nc_files, args.variables, args.workers, args.header_only)
+
+    manifest = build_manifest(results, args.step_hours, args.url_template)
+    manifest["data_dir"] = os.path.abspath(args.data_dir)
+
+    with open(args.manifest, 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    print(f"数据起始时间点: {manifest['first_time']}")
+    print(f"数据结束时间点: {manifest['last_time']}")
+    print(f"预期时间点数: {manifest['expected_count']}，实际文件数: {manifest['file_count']}")
+    print(f"缺失时间点: {len(manifest['missing'])}")
+    print(f"重复时间点: {len(manifest['duplicates'])}")
+    print(f"损坏文件: {len(manifest['corrupt'])}")
+    print(f"偏离时间轴的文件: {len(manifest['off_axis'])}")
+    print(f"检查清单已保存至: {args.manifest}")
+
+    if args.links_file:
+        with open(args.links_file, 'w') as f:
+            for url in manifest["refetch_urls"]:
+                f.write(url + "\n")
+        print(f"需要重新下载的链接({len(manifest['refetch_urls'])}个)已保存至: {args.links_file}")
+
+    has_issues = any(manifest[k] for k in ("missing", "duplicates", "corrupt", "off_axis"))
+    return 1 if has_issues else 0
+
+if __name__ == "__main__":
+    try:
+        exit_code = main()
+        exit(exit_code)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        exit(1)
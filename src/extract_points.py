@@ -20,6 +20,7 @@ import matplotlib.pyplot as plt
 from datetime import datetime
 from scipy.spatial import distance
 import re
+from shud_forcing import EXTRACT_TABLE, load_cache_cube, convert_cube, write_shud_forcing_csv
 
 def parse_arguments():
     """解析命令行参数"""
@@ -286,41 +287,22 @@ def extract_points_to_cache(nc_files, year, cache_dir, points, force=False):
     
     return cache_file
 
-def convert_to_rh(qair, tair, psurf):
-    """
-    将比湿转换为相对湿度
-    """
-    # 绝对零度
-    t0 = 273.15  # K
-    
-    # 计算相对湿度 (与AutoSHUD保持一致)
-    rh = 0.263 * psurf * qair / np.exp(17.67 * (tair - t0) / (tair - 29.65)) 
-    
-    # 将百分比转换为0-1的比例
-    rh = rh / 100.0
-    
-    # 限制在0.1-1.0的范围内
-    rh = np.minimum(rh, 1.0)
-    rh = np.maximum(rh, 0.1)
-    
-    return rh
-
 def process_cache_to_csv(cache_file, csv_dir, force=False):
     """将缓存文件转换为每个点的CSV文件"""
     print(f"从{cache_file}加载缓存数据...")
     
     try:
         # 加载缓存数据
-        cache_data = np.load(cache_file, allow_pickle=True)
-        data_array = cache_data['data_array']
-        point_ids = cache_data['point_ids']
-        gldas_ids = cache_data['gldas_ids']
-        variables = cache_data['variables']
-        times = cache_data['times']
+        data_array, point_ids, variables, times = load_cache_cube(cache_file)
+        with np.load(cache_file, allow_pickle=True) as cache_data:
+            gldas_ids = [str(i) for i in cache_data['gldas_ids']]
     except Exception as e:
         print(f"加载缓存文件失败: {str(e)}")
         return False
     
+    # 对整个数据立方体做单位转换，沿用本工具原有的列名和单位（气压为Pa）
+    forcing, columns = convert_cube(data_array, variables, EXTRACT_TABLE)
+    
     # 处理每个点的数据
     for p_idx, point_id in enumerate(point_ids):
         # 检查是否已经存在CSV文件
@@ -328,104 +310,11 @@ def process_cache_to_csv(cache_file, csv_dir, force=False):
         if os.path.exists(csv_file) and not force:
             print(f"  CSV文件已存在: {csv_file} (跳过)")
             continue
-            
-        print(f"  处理点 {p_idx+1}/{len(point_ids)}: {point_id} (GLDAS点: {gldas_ids[p_idx]})")
-        
-        # 提取当前点的所有时间步长的数据
-        point_data = data_array[p_idx, :, :]
-        
-        # 创建临时数据字典
-        data_dict = {}
-        for var_idx, var in enumerate(variables):
-            data_dict[var] = point_data[:, var_idx]
-        
-        # 创建DataFrame
-        df = pd.DataFrame(data_dict)
-        
-        # 添加时间信息
-        df['time'] = times
-        
-        # 单位转换
-        # 1. 降水: kg m-2 s-1 (GLDAS) -> mm day-1 (SHUD)
-        if 'Rainf_tavg' in df.columns:
-            df['Precip_mm.d'] = df['Rainf_tavg'] * 86400
-        else:
-            print(f"  警告: 未找到降水变量 'Rainf_tavg'，将使用0值")
-            df['Precip_mm.d'] = 0.0
         
-        # 2. 温度: K -> C
-        if 'Tair_f_inst' in df.columns:
-            df['Temp_C'] = df['Tair_f_inst'] - 273.15
-        else:
-            print(f"  警告: 未找到气温变量，使用默认值")
-            df['Temp_C'] = 15.0
-        
-        # 3. 相对湿度: 比湿 -> 相对湿度(0-1)
-        if all(var in df.columns for var in ['Qair_f_inst', 'Tair_f_inst', 'Psurf_f_inst']):
-            df['RH_1'] = convert_to_rh(df['Qair_f_inst'], df['Tair_f_inst'], df['Psurf_f_inst'])
-        else:
-            print(f"  警告: 未找到湿度相关变量，使用默认值")
-            df['RH_1'] = 0.7
-        
-        # 4. 风速: 保持不变
-        if 'Wind_f_inst' in df.columns:
-            df['Wind_m.s'] = df['Wind_f_inst']
-        else:
-            print(f"  警告: 未找到风速变量，使用默认值")
-            df['Wind_m.s'] = 2.0
-        
-        # 5. 辐射: 保持不变
-        if 'Swnet_tavg' in df.columns:
-            df['RN_w.m2'] = df['Swnet_tavg']
-        elif 'SWdown_f_tavg' in df.columns:
-            df['RN_w.m2'] = df['SWdown_f_tavg']
-        else:
-            print(f"  警告: 未找到辐射变量，使用0值")
-            df['RN_w.m2'] = 0.0
-        
-        # 6. 气压: Pa，保持不变
-        if 'Psurf_f_inst' in df.columns:
-            df['Pres_pa'] = df['Psurf_f_inst']
-        else:
-            print(f"  警告: 未找到气压变量，使用默认值")
-            df['Pres_pa'] = 101325.0  # 标准大气压
-        
-        # 保留4位小数
-        output_columns = ['Precip_mm.d', 'Temp_C', 'RH_1', 'Wind_m.s', 'RN_w.m2', 'Pres_pa']
-        df[output_columns] = df[output_columns].round(4)
-        
-        # 准备输出数据
-        output_df = df[output_columns].copy()
-        
-        # 计算时间间隔(天)
-        time_intervals = []
-        for i, t in enumerate(times):
-            if i == 0:
-                time_intervals.append(0)
-            else:
-                # 计算与起始时间的间隔（以天为单位）
-                delta = (t - times[0]).total_seconds() / (24 * 3600)
-                time_intervals.append(delta)
+        print(f"  处理点 {p_idx+1}/{len(point_ids)}: {point_id} (GLDAS点: {gldas_ids[p_idx]})")
         
         # 写入符合SHUD要求的CSV格式
-        with open(csv_file, 'w') as f:
-            # 第一行: 元数据 - 时间步数 列数 开始日期 结束日期 时间间隔(秒)
-            start_date = times[0].strftime("%Y%m%d")
-            end_date = times[-1].strftime("%Y%m%d")
-            time_step = int((times[1] - times[0]).total_seconds())  # 秒
-            num_rows = len(output_df)
-            num_cols = len(output_columns) + 1  # 变量 + 时间列
-            
-            f.write(f"{num_rows}\t{num_cols}\t{start_date}\t{end_date}\t{time_step}\n")
-            
-            # 第二行: 列名
-            f.write("Time_interval\t" + "\t".join(output_columns) + "\n")
-            
-            # 数据行
-            for i, row in output_df.iterrows():
-                # 使用Time_interval作为时间列
-                values = [f"{time_intervals[i]:.4f}"] + [f"{val:.4f}" for val in row.values]
-                f.write("\t".join(values) + "\n")
+        write_shud_forcing_csv(csv_file, times, forcing[p_idx], columns)
         
         print(f"  CSV文件已创建: {csv_file}")
     
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SHUD气象驱动情景/集合生成工具
+功能:
+1. 读取process_gldas_for_shud.py已生成的驱动数据（meteo.tsd.forc和csv/）作为基准
+2. 按扰动定义生成全组合的增量情景或蒙特卡洛集合，例如:
+   --perturb Precip:scale:0.8,0.9,1.0,1.1,1.2 --perturb Temp:shift:1,2,3,4
+3. 每个情景输出独立的csv/目录和meteo.tsd.forc，并行写出，未扰动的数据直接复用
+4. 扰动Temp时Tmin、Tmax一起扰动；带有派生列(--derived columns)的驱动数据只允许扰动Precip
+"""
+
+import os
+import argparse
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from shud_scenarios import (parse_perturbation, build_scenarios, scenario_table, check_perturbations,
+                            write_point_scenarios)
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="生成SHUD气象驱动的情景和集合")
+    parser.add_argument("--output-dir", default="output", help="基准驱动数据目录（包含meteo.tsd.forc和csv/）")
+    parser.add_argument("--scenario-dir", type=str, help="情景输出目录，默认为输出目录下的scenarios/")
+    parser.add_argument("--perturb", action="append", required=True,
+                        help="扰动定义 列名:方式:值1,值2,...，方式为scale(乘)或shift(加)，可重复指定")
+    parser.add_argument("--samples", type=int, help="蒙特卡洛抽样的情景数，在各扰动的取值范围内均匀抽样（默认取全组合）")
+    parser.add_argument("--seed", type=int, help="蒙特卡洛抽样的随机数种子")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="并行进程数，默认为CPU核数")
+    parser.add_argument("--force", action="store_true", help="覆盖已存在的情景目录")
+    return parser.parse_args()
+
+def read_meteo_forc(forc_file):
+    """读取meteo.tsd.forc，返回(驱动文件相对目录, 驱动文件名列表)"""
+    with open(forc_file, 'r') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    n_files = int(lines[0].split()[0])
+    return lines[1], lines[2:2 + n_files]
+
+def build_tasks(base_csv_dir, csv_files, scenario_dirs, perturbations, params, workers):
+    """按驱动文件和情景批次划分任务，使任务数足够所有进程并行"""
+    n_scenarios = len(scenario_dirs)
+    batches = max(1, min(n_scenarios, (max(workers, 1) * 4 + len(csv_files) - 1) // len(csv_files)))
+    edges = [round(i * n_scenarios / batches) for i in range(batches + 1)]
+
+    tasks = []
+    for csv_file in csv_files:
+        for start, end in zip(edges[:-1], edges[1:]):
+            out_files = [os.path.join(d, "csv", csv_file) for d in scenario_dirs[start:end]]
+            tasks.append((os.path.join(base_csv_dir, csv_file), out_files, perturbations, params[start:end]))
+    return tasks
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+
+    perturbations = [parse_perturbation(spec) for spec in args.perturb]
+    columns = [p["column"] for p in perturbations]
+    if len(set(columns)) != len(columns):
+        print("错误: 每个驱动列只能定义一个扰动")
+        return 1
+
+    forc_file = os.path.join(args.output_dir, "meteo.tsd.forc")
+    if not os.path.exists(forc_file):
+        print(f"错误: 没有找到基准驱动数据: {forc_file}")
+        return 1
+    csv_path, csv_files = read_meteo_forc(forc_file)
+    base_csv_dir = os.path.join(args.output_dir, csv_path)
+
+    # 所有驱动文件的列相同，写出前检查一次扰动是否兼容
+    with open(os.path.join(base_csv_dir, csv_files[0]), 'r') as f:
+        f.readline()
+        base_columns = f.readline().split()[1:]
+    try:
+        check_perturbations(perturbations, base_columns)
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 1
+
+    names, params = build_scenarios(perturbations, args.samples, args.seed)
+    scenario_root = args.scenario_dir or os.path.join(args.output_dir, "scenarios")
+    print(f"生成{len(names)}个情景 x {len(csv_files)}个驱动文件，输出到: {scenario_root}")
+
+    # 每个情景一个目录，包含自己的meteo.tsd.forc
+    scenario_dirs = [os.path.join(scenario_root, name) for name in names]
+    for scenario_dir in scenario_dirs:
+        if os.path.exists(scenario_dir):
+            if not args.force:
+                print(f"错误: 情景目录已存在: {scenario_dir}（使用--force覆盖）")
+                return 1
+            shutil.rmtree(scenario_dir)
+        os.makedirs(os.path.join(scenario_dir, "csv"))
+        shutil.copy2(forc_file, os.path.join(scenario_dir, "meteo.tsd.forc"))
+
+    table_file = os.path.join(scenario_root, "scenarios.csv")
+    scenario_table(names, params, perturbations).to_csv(table_file, index=False, float_format="%.6g")
+    print(f"情景参数表已保存至: {table_file}")
+
+    # 按(驱动文件, 情景批次)并行写出
+    tasks = build_tasks(base_csv_dir, csv_files, scenario_dirs, perturbations, params, args.workers)
+    total = len(names) * len(csv_files)
+    written = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for count in executor.map(write_point_scenarios, tasks):
+            written += count
+            if written % max(1, total // 10) < count or written == total:
+                print(f"  已写出 {written}/{total} 个驱动文件")
+
+    print(f"情景生成完成: {len(names)}个情景，保存在 {scenario_root}")
+    return 0
+
+if __name__ == "__main__":
+    try:
+        exit_code = main()
+        exit(exit_code)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        exit(1)
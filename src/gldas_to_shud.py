@@ -21,16 +21,17 @@ from datetime import datetime
 import geopandas as gpd
 from scipy.spatial import distance
 import re
+from shud_forcing import GLDAS_TO_SHUD_TABLE, load_cache_cube, convert_cube
 
-def parse_arguments():
-    """解析命令行参数"""
+def parse_arguments(argv=None):
+    """解析命令行参数（argv为None时读取sys.argv）"""
     parser = argparse.ArgumentParser(description="将GLDAS数据处理为SHUD模型所需格式")
     parser.add_argument("--data-dir", default="gldas_data", help="GLDAS数据目录")
     parser.add_argument("--output-dir", default="0513/output", help="输出目录")
     parser.add_argument("--points", nargs='+', type=str, help="指定的坐标点列表，格式为'lon,lat'，例如 '120.5,30.5'")
     parser.add_argument("--point-file", type=str, help="包含坐标点的文件，每行一个点，格式为'lon,lat'")
     parser.add_argument("--force", action="store_true", help="强制重新处理已存在的文件")
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 def create_directories(base_dir):
     """创建必要的目录结构"""
@@ -290,45 +291,21 @@ def extract_points_to_cache(nc_files, year, cache_dir, points, force=False):
     
     return cache_file
 
-def convert_to_rh(qair, tair, psurf):
-    """
-    将比湿转换为相对湿度
-    使用与AutoSHUD/Rfunction/LDAS_UnitConvert.R中完全相同的计算方法
-    参考: https://www.ncl.ucar.edu/Document/Functions/Contributed/relhum_ttd.shtml
-    """
-    # 绝对零度
-    t0 = 273.15  # K
-    
-    # 计算相对湿度 (AutoSHUD中的公式)
-    # 0.263 是相对湿度计算中的常数
-    # 17.67和29.65来自Bolton公式计算饱和水汽压
-    rh = 0.263 * psurf * qair / np.exp(17.67 * (tair - t0) / (tair - 29.65)) 
-    
-    # 将百分比转换为0-1的比例
-    rh = rh / 100.0
-    
-    # 限制在0.1-1.0的范围内，与AutoSHUD处理方式一致
-    rh = np.minimum(rh, 1.0)
-    rh = np.maximum(rh, 0.1)
-    
-    return rh
-
 def process_cache_to_csv(cache_file, csv_dir, force=False):
     """将缓存文件转换为每个点的CSV文件"""
     print(f"从{cache_file}加载缓存数据...")
     
     try:
         # 加载缓存数据
-        cache_data = np.load(cache_file, allow_pickle=True)
-        data_array = cache_data['data_array']
-        point_ids = cache_data['point_ids']
-        original_ids = cache_data.get('original_ids', point_ids)  # 兼容没有original_ids的旧缓存
-        variables = cache_data['variables']
-        times = cache_data['times']
+        data_array, point_ids, variables, times = load_cache_cube(cache_file)
     except Exception as e:
         print(f"加载缓存文件失败: {str(e)}")
         return False
     
+    # 对整个数据立方体做单位转换，沿用本工具原有的列名和气压单位(hPa)
+    forcing, columns = convert_cube(data_array, variables, GLDAS_TO_SHUD_TABLE)
+    time_strings = times.strftime('%Y-%m-%d %H:%M:%S')
+    
     # 处理每个点的数据
     print(f"处理{len(point_ids)}个点的数据...")
     for p_idx, point_id in enumerate(point_ids):
@@ -340,42 +317,9 @@ def process_cache_to_csv(cache_file, csv_dir, force=False):
             
         print(f"  处理点 {p_idx+1}/{len(point_ids)}: {point_id}")
         
-        # 创建DataFrame
-        df = pd.DataFrame(index=times)
-        
-        # 添加时间列
-        df['TIME'] = [t.strftime('%Y-%m-%d %H:%M:%S') for t in times]
-        
-        # 添加变量数据
-        for v_idx, var in enumerate(variables):
-            if var == "Rainf_tavg":
-                # 转换单位: kg m-2 s-1 -> mm/day
-                values = data_array[p_idx, :, v_idx] * 86400
-                df['PRCP'] = values
-            elif var == "Tair_f_inst":
-                # 转换单位: K -> ℃
-                values = data_array[p_idx, :, v_idx] - 273.15
-                df['TEMP'] = values
-            elif var == "Qair_f_inst":
-                # 比湿，保留原始值
-                values = data_array[p_idx, :, v_idx]
-                df['RH'] = values
-            elif var == "Wind_f_inst":
-                # 风速，保留原始值 (m/s)
-                values = data_array[p_idx, :, v_idx]
-                df['WIND'] = values
-            elif var == "SWdown_f_tavg":
-                # 短波辐射，保留原始值 (W/m2)
-                values = data_array[p_idx, :, v_idx]
-                df['RADN'] = values
-            elif var == "Psurf_f_inst":
-                # 气压，hPa = mbar，转换单位: Pa -> hPa
-                values = data_array[p_idx, :, v_idx] / 100.0
-                df['VP'] = values
-        
-        # 重新排序列以符合SHUD要求
-        column_order = ['TIME', 'PRCP', 'TEMP', 'RH', 'VP', 'WIND', 'RADN']
-        df = df[column_order]
+        # 第一列为时间，其余为转换后的驱动列
+        df = pd.DataFrame(forcing[p_idx], columns=columns)
+        df.insert(0, 'TIME', time_strings)
         
         # 保存为CSV文件
         try:
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+LDAS数据产品注册表
+功能:
+1. 记录各LDAS产品的变量名、原始单位、网格分辨率、时间步长和文件名模式
+2. 将各产品的原始变量统一转换为标准变量（使用GLDAS NOAH的变量名和单位），
+   之后的批量提取、单位转换(shud_forcing.py)等步骤对所有产品通用
+3. 提供按产品读取单个文件中所有点数据的批量读取函数
+
+新增产品时只需在PRODUCTS中添加一项，不需要复制整套处理脚本。
+"""
+
+import numpy as np
+
+# 标准变量及其单位（与GLDAS NOAH一致），shud_forcing.FORCING_TABLE基于这些变量转换
+STANDARD_VARIABLES = {
+    "Rainf_tavg": "kg m-2 s-1",
+    "Tair_f_inst": "K",
+    "Qair_f_inst": "kg kg-1",
+    "Wind_f_inst": "m s-1",
+    "SWdown_f_tavg": "W m-2",
+    "Psurf_f_inst": "Pa",
+}
+
+# 计算派生变量（潜在蒸散发、净辐射）时额外提取的可选变量
+OPTIONAL_VARIABLES = {
+    "LWdown_f_tavg": "W m-2",
+    "Swnet_tavg": "W m-2",
+    "Lwnet_tavg": "W m-2",
+}
+
+# GLDAS NOAH各版本的变量与标准变量相同，无需转换
+_GLDAS_NOAH_VARIABLES = {
+    name: {"source": [name], "unit": unit} for name, unit in STANDARD_VARIABLES.items()
+}
+_GLDAS_NOAH_OPTIONAL = {
+    name: {"source": [name], "unit": unit} for name, unit in OPTIONAL_VARIABLES.items()
+}
+
+# 每个变量的定义：
+#   source - 原始变量名列表
+#   unit   - 原始单位
+#   scale/offset - 线性转换到标准单位: 标准值 = 原始值 * scale + offset
+#   func   - 多个原始变量合成一个标准变量的函数（如风速分量合成风速）
+# optional_variables为可选变量，只在需要派生变量时提取
+# url_template为GES DISC上按时间点生成下载链接的模板（year、doy、date、hhmm）
+PRODUCTS = {
+    "GLDAS_NOAH025_3H": {
+        "description": "GLDAS Noah 2.1 0.25° 3小时（含早期产品EP）",
+        "cache_prefix": "GLDAS",
+        "resolution": 0.25,
+        "timestep_hours": 3,
+        "file_pattern": "*.nc4",
+        "url_template": ("https://hydro1.gesdisc.eosdis.nasa.gov/data/GLDAS/GLDAS_NOAH025_3H_EP.2.1/"
+                         "{year}/{doy:03d}/GLDAS_NOAH025_3H_EP.A{date}.{hhmm}.021.nc4"),
+        "variables": _GLDAS_NOAH_VARIABLES,
+        "optional_variables": _GLDAS_NOAH_OPTIONAL,
+    },
+    "GLDAS_NOAH10_3H": {
+        "description": "GLDAS Noah 2.1 1.0° 3小时",
+        "cache_prefix": "GLDAS10",
+        "resolution": 1.0,
+        "timestep_hours": 3,
+        "file_pattern": "GLDAS_NOAH10_3H*.nc4",
+        "url_template": ("https://hydro1.gesdisc.eosdis.nasa.gov/data/GLDAS/GLDAS_NOAH10_3H.2.1/"
+                         "{year}/{doy:03d}/GLDAS_NOAH10_3H.A{date}.{hhmm}.021.nc4"),
+        "variables": _GLDAS_NOAH_VARIABLES,
+        "optional_variables": _GLDAS_NOAH_OPTIONAL,
+    },
+    "NLDAS_FORA0125_H": {
+        "description": "NLDAS-2 Forcing A 0.125° 1小时（北美）",
+        "cache_prefix": "NLDAS",
+        "resolution": 0.125,
+        "timestep_hours": 1,
+        "file_pattern": "NLDAS_FORA0125_H*.nc*",
+        "url_template": ("https://hydro1.gesdisc.eosdis.nasa.gov/data/NLDAS/NLDAS_FORA0125_H.2.0/"
+                         "{year}/{doy:03d}/NLDAS_FORA0125_H.A{date}.{hhmm}.020.nc"),
+        "variables": {
+            # NLDAS降水为每小时累计量(kg m-2)，换算为速率
+            "Rainf_tavg": {"source": ["Rainf"], "unit": "kg m-2", "scale": 1.0 / 3600.0},
+            "Tair_f_inst": {"source": ["Tair"], "unit": "K"},
+            "Qair_f_inst": {"source": ["Qair"], "unit": "kg kg-1"},
+            "Wind_f_inst": {"source": ["Wind_E", "Wind_N"], "unit": "m s-1", "func": np.hypot},
+            "SWdown_f_tavg": {"source": ["SWdown"], "unit": "W m-2"},
+            "Psurf_f_inst": {"source": ["PSurf"], "unit": "Pa"},
+        },
+        "optional_variables": {
+            "LWdown_f_tavg": {"source": ["LWdown"], "unit": "W m-2"},
+        },
+    },
+}
+
+DEFAULT_PRODUCT = "GLDAS_NOAH025_3H"
+
+def get_product(name=None):
+    """按名称获取产品定义"""
+    name = name or DEFAULT_PRODUCT
+    if name not in PRODUCTS:
+        raise ValueError(f"未知的LDAS产品: {name}，可选: {', '.join(PRODUCTS)}")
+    product = dict(PRODUCTS[name])
+    product["name"] = name
+    return product
+
+def source_variables(product):
+    """返回产品需要读取的全部原始变量名"""
+    names = []
+    for spec in product["variables"].values():
+        for source in spec["source"]:
+            if source not in names:
+                names.append(source)
+    return names
+
+def variable_spec(product, name):
+    """返回标准变量或可选变量的定义"""
+    if name in product["variables"]:
+        return product["variables"][name]
+    return product.get("optional_variables", {})[name]
+
+def available_variables(product, dataset_variables, optional=False, verbose=True):
+    """返回数据集中原始变量齐全的标准变量列表，optional为True时同时包含可用的可选变量
+
+    verbose为False时不打印缺少的变量。
+    """
+    dataset_variables = set(dataset_variables)
+    variables = []
+    for name, spec in product["variables"].items():
+        missing = [s for s in spec["source"] if s not in dataset_variables]
+        if not missing:
+            variables.append(name)
+        elif verbose:
+            print(f"警告: 变量 {name} 所需的 {missing} 不在数据集中")
+
+    if optional:
+        for name, spec in product.get("optional_variables", {}).items():
+            if all(s in dataset_variables for s in spec["source"]):
+                variables.append(name)
+            elif verbose:
+                print(f"提示: 可选变量 {name} 不在数据集中")
+    return variables
+
+def read_product_points(ds, product, variables, lat_indices, lon_indices):
+    """从已打开的数据集中批量读取所有点的标准变量，返回[点数, 变量数]数组
+
+    只读取包含所有点的最小矩形窗口，每个原始变量只读取一次。
+    """
+    lat_indices = np.asarray(lat_indices)
+    lon_indices = np.asarray(lon_indices)
+    lat_slice = slice(int(lat_indices.min()), int(lat_indices.max()) + 1)
+    lon_slice = slice(int(lon_indices.min()), int(lon_indices.max()) + 1)
+    rel_lat = lat_indices - lat_slice.start
+    rel_lon = lon_indices - lon_slice.start
+
+    raw = {}
+    values = np.empty((len(lat_indices), len(variables)))
+    for var_idx, name in enumerate(variables):
+        spec = variable_spec(product, name)
+        sources = []
+        for source in spec["source"]:
+            if source not in raw:
+                da = ds[source]
+                if "time" in da.dims:
+                    da = da.isel(time=0)
+                window = da.isel(lat=lat_slice, lon=lon_slice).values
+                raw[source] = window[rel_lat, rel_lon].astype(float)
+            sources.append(raw[source])
+
+        column = spec["func"](*sources) if "func" in spec else sources[0]
+        scale = spec.get("scale", 1.0)
+        offset = spec.get("offset", 0.0)
+        values[:, var_idx] = column * scale + offset if (scale != 1.0 or offset) else column
+
+    return values
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+从NetCDF驱动文件重新生成SHUD格式的CSV驱动文件
+功能:
+1. 读取process_gldas_for_shud.py --output-format netcdf生成的forcing.nc
+2. 按需只生成指定站点的CSV文件，默认生成全部站点
+3. 输出的CSV文件与直接输出CSV时相同，可配合meteo.tsd.forc直接运行SHUD
+"""
+
+import os
+import argparse
+
+from shud_netcdf import netcdf_to_csv
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="从NetCDF驱动文件生成SHUD格式的CSV文件")
+    parser.add_argument("--output-dir", default="output", help="process_gldas_for_shud.py的输出目录")
+    parser.add_argument("--nc-file", type=str, help="NetCDF驱动文件，默认为输出目录下的forcing.nc")
+    parser.add_argument("--csv-dir", type=str, help="CSV输出目录，默认为输出目录下的csv/")
+    parser.add_argument("--points", nargs='+', type=str, help="只生成这些驱动文件ID（如X10.375Y43.125），默认全部")
+    parser.add_argument("--force", action="store_true", help="覆盖已存在的CSV文件")
+    return parser.parse_args()
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+
+    nc_file = args.nc_file or os.path.join(args.output_dir, "forcing.nc")
+    if not os.path.exists(nc_file):
+        print(f"错误: 没有找到NetCDF驱动文件: {nc_file}")
+        return 1
+
+    csv_dir = args.csv_dir or os.path.join(args.output_dir, "csv")
+    netcdf_to_csv(nc_file, csv_dir, args.points, args.force)
+    return 0
+
+if __name__ == "__main__":
+    try:
+        exit_code = main()
+        exit(exit_code)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        exit(1)
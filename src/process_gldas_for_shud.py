@@ -11,7 +11,6 @@ GLDAS数据处理工具 - 生成SHUD模型所需的气象驱动数据
 """
 
 import os
-import glob
 import argparse
 import numpy as np
 import xarray as xr
@@ -19,21 +18,77 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from datetime import datetime
 import geopandas as gpd
-from scipy.spatial import distance
-import re
-import shutil
+import json
+import time
+import signal
+from shud_catalog import (get_nc4_files, extract_date_from_filename, lookup_grid_indices,
+                          read_grid_axes, format_cell_id)
+from shud_mesh import read_mesh_points, write_shud_att_forc
+from shud_forcing import (load_cache_cube, convert_cube, write_shud_forcing_csv, append_shud_forcing_csv,
+                          read_last_forcing_time)
+from shud_netcdf import write_forcing_netcdf, netcdf_start_date
+from shud_arrow import ARROW_LAYOUTS, write_forcing_arrow
+from shud_project import LINK_MODES, assemble_project, load_manifest
+from shud_watch import watch_directories
+from shud_resample import parse_time_step, native_time_step, resample_cube
+from shud_gaps import fill_cube_gaps, write_gap_report
+from shud_qc import run_qc, qc_flags_file
+from shud_derived import compute_derived, DERIVED_COLUMNS
+from shud_downscale import (DEFAULT_LAPSE_RATE, sample_raster, cell_elevations,
+                            build_elevation_sites, downscale_cube)
+from shud_bias import bias_correct_cube, bias_transfer_file
+from ldas_products import PRODUCTS, DEFAULT_PRODUCT, get_product, available_variables, read_product_points
 
-def parse_arguments():
-    """解析命令行参数"""
+# 监视模式刷新时，在已写出的最后时间步之前重新处理的天数（质控持续不变检查、插补和气候值的上下文）
+REFRESH_CONTEXT_DAYS = 30
+
+def parse_arguments(argv=None):
+    """解析命令行参数（argv为None时读取命令行）"""
     parser = argparse.ArgumentParser(description="处理GLDAS数据生成SHUD模型所需的气象驱动数据")
     parser.add_argument("--data-dir", default="data/gldas_data", help="GLDAS数据目录")
+    parser.add_argument("--product", choices=sorted(PRODUCTS), default=DEFAULT_PRODUCT, help="LDAS数据产品")
     parser.add_argument("--output-dir", default="output", help="输出目录")
-    parser.add_argument("--shp-file", type=str, help="包含研究区域点的shapefile文件")
+    parser.add_argument("--shp-file", type=str, help="包含研究区域点的shapefile文件（支持点、多点和面要素）")
+    parser.add_argument("--shp-point", choices=["centroid", "representative"], default="centroid",
+                        help="非点要素取质心(centroid)还是内部代表点(representative)")
     parser.add_argument("--points", nargs='+', type=str, help="指定的坐标点列表，格式为'lon,lat'，例如 '120.5,30.5'")
+    parser.add_argument("--mesh-file", type=str, help="SHUD网格文件(.sp.mesh)，为每个网格单元分配气象驱动")
+    parser.add_argument("--att-file", type=str, help="SHUD属性文件(.sp.att)，默认与网格文件同名，写入FORC列")
+    parser.add_argument("--mesh-crs", type=str, help="网格坐标的投影（如EPSG:32632或.prj文件内容），默认查找.prj文件")
+    parser.add_argument("--dem-file", type=str, help="DEM栅格文件，按点与GLDAS格点的高差对气温和气压降尺度")
+    parser.add_argument("--elevation-band", type=float, default=100.0, help="降尺度时同一格点内按此高程间隔(米)合并气象驱动站点")
+    parser.add_argument("--lapse-rate", type=float, default=DEFAULT_LAPSE_RATE, help="气温递减率(K/m)，默认0.0065")
+    parser.add_argument("--bias-correct", action="store_true",
+                        help="用站点观测对驱动数据做分位数映射偏差校正（已有缓存的传递函数时直接校正）")
+    parser.add_argument("--stations-file", type=str, help="站点shapefile（如data/shp数据/hydro_stations.shp），用于偏差校正")
+    parser.add_argument("--obs-file", type=str, help="站点观测CSV（ID, Time和Precip、Temp等驱动列），用于拟合偏差校正")
+    parser.add_argument("--bias-refit", action="store_true", help="忽略已缓存的传递函数，重新拟合偏差校正")
+    parser.add_argument("--append", action="store_true",
+                        help="增量更新: 缓存只提取新文件，已有驱动文件只追加新的时间步并原地改写第一行")
+    parser.add_argument("--output-format", choices=["csv", "netcdf", "both"], default="csv",
+                        help="驱动数据输出格式: 每点一个CSV、一个CF timeSeries NetCDF文件(forcing.nc)或两者都输出")
+    parser.add_argument("--arrow", choices=ARROW_LAYOUTS,
+                        help="另外将单位转换后的驱动数据写入Arrow IPC/Feather文件(forcing.arrow)，long为长表，wide为宽表")
+    parser.add_argument("--link-mode", choices=LINK_MODES, default="auto",
+                        help="组装shud_project/时驱动文件的放置方式，auto依次尝试硬链接、reflink、符号链接、复制")
+    parser.add_argument("--watch", action="store_true",
+                        help="处理完成后持续监视数据目录和downloads子目录，增量提取新到达的文件（Ctrl+C结束）")
+    parser.add_argument("--poll-seconds", type=float, default=60, help="监视模式下扫描目录的间隔(秒)")
+    parser.add_argument("--settle-seconds", type=float, default=120, help="监视模式下文件大小和修改时间保持不变多少秒后才提取")
+    parser.add_argument("--refresh-minutes", type=float, default=15, help="监视模式下有新数据时刷新驱动文件的最短间隔(分钟)")
     parser.add_argument("--force", action="store_true", help="强制重新处理已存在的文件")
     parser.add_argument("--start-date", type=str, default="20230501", help="数据开始日期 (YYYYMMDD)")
     parser.add_argument("--end-date", type=str, default="", help="数据结束日期 (YYYYMMDD)，默认处理到最后一个文件")
-    return parser.parse_args()
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="每提取多少个文件保存一次检查点")
+    parser.add_argument("--max-attempts", type=int, default=3, help="单个文件的最大尝试次数，超过后隔离该文件")
+    parser.add_argument("--qc-mask", action="store_true", help="将未通过质控（超出范围、尖峰、过饱和）的值视为缺测并插补")
+    parser.add_argument("--max-gap-steps", type=int, default=8, help="超过此步数的缺测段使用气候平均值插补，较短的缺测段按变量插值或补0")
+    parser.add_argument("--derived", choices=["sidecar", "columns"],
+                        help="计算派生变量(PET、净辐射Rn、实际水汽压Ea)并额外提取LWdown/Swnet/Lwnet: "
+                             "sidecar写入derived/目录，columns追加到驱动文件中")
+    parser.add_argument("--time-step", type=str, help="输出驱动数据的时间步长，如1D、1H、6H或秒数，默认与原始数据相同")
+    parser.add_argument("--temp-extremes", action="store_true", help="聚合时额外输出日最低/最高气温列(Tmin, Tmax)")
+    return parser.parse_args(argv)
 
 def create_directories(base_dir):
     """创建必要的目录结构"""
@@ -48,63 +103,6 @@ def create_directories(base_dir):
         
     return dirs
 
-def get_nc4_files(data_dir, pattern="*.nc4"):
-    """获取所有NC4文件并按时间排序"""
-    files = []
-    
-    # 首先尝试在根目录查找NC4文件
-    root_files = glob.glob(os.path.join(data_dir, pattern))
-    files.extend(root_files)
-    
-    # 然后尝试在downloads子目录查找
-    downloads_dir = os.path.join(data_dir, "downloads")
-    if os.path.exists(downloads_dir):
-        downloads_files = glob.glob(os.path.join(downloads_dir, pattern))
-        files.extend(downloads_files)
-    
-    # 按文件名排序
-    files = sorted(files)
-    print(f"找到NC4文件总数: {len(files)}")
-    
-    return files
-
-def extract_date_from_filename(filename):
-    """从GLDAS文件名中提取日期时间信息"""
-    # 文件名示例: GLDAS_NOAH025_3H.A20230501.0000.021.nc4
-    base = os.path.basename(filename)
-    
-    # 尝试新格式: GLDAS_YYYYMMDD_HHMM.nc4
-    match = re.match(r'GLDAS_(\d{8})_(\d{4})\.nc4', base)
-    if match:
-        date_str = match.group(1)  # 例如 "20230501"
-        time_str = match.group(2)  # 例如 "0000"
-        
-        # 解析日期和时间
-        year = int(date_str[0:4])
-        month = int(date_str[4:6])
-        day = int(date_str[6:8])
-        hour = int(time_str[0:2])
-        minute = int(time_str[2:4])
-        
-        return datetime(year, month, day, hour, minute)
-    
-    # 尝试旧格式: GLDAS_NOAH025_3H_EP.A20230501.0000.021.nc4
-    match = re.search(r'\.A(\d{8})\.(\d{4})\.', base)
-    if match:
-        date_str = match.group(1)  # 例如 "20230501"
-        time_str = match.group(2)  # 例如 "0000"
-        
-        # 解析日期和时间
-        year = int(date_str[0:4])
-        month = int(date_str[4:6])
-        day = int(date_str[6:8])
-        hour = int(time_str[0:2])
-        minute = int(time_str[2:4])
-        
-        return datetime(year, month, day, hour, minute)
-    
-    return None
-
 def filter_files_by_date(files, start_date_str, end_date_str=None):
     """根据日期过滤文件"""
     filtered_files = []
@@ -152,51 +150,85 @@ def group_files_by_year(files):
     
     return year_groups
 
-def read_points_from_shapefile(shp_file):
+def read_shapefile_coordinates(shp_file, polygon_point="centroid"):
+    """从shapefile中批量读取要素坐标，返回(ID数组, 经度数组, 纬度数组)
+    
+    点要素直接使用其坐标；多点、面等要素使用质心(centroid)或内部代表点
+    (representative)。坐标统一转换为EPSG:4326。
+    """
+    print(f"从shapefile读取点: {shp_file}")
+    gdf = gpd.read_file(shp_file)
+    
+    # 输出shapefile的基本信息
+    print(f"Shapefile包含{len(gdf)}个要素")
+    print(f"坐标系统: {gdf.crs}")
+    print(f"列名: {gdf.columns.tolist()}")
+    
+    # 去掉空几何
+    valid = gdf.geometry.notna() & ~gdf.geometry.is_empty
+    if not valid.all():
+        print(f"警告: 跳过{int((~valid).sum())}个空几何要素")
+        gdf = gdf[valid]
+    
+    geom_types = gdf.geom_type
+    is_point = (geom_types == "Point").values
+    type_counts = geom_types.value_counts().to_dict()
+    print(f"几何类型: {type_counts}")
+    
+    geoms = gdf.geometry
+    if gdf.crs is None:
+        print("警告: shapefile没有坐标系统信息，按经纬度(EPSG:4326)处理")
+        geoms = geoms.set_crs("EPSG:4326")
+    
+    if not is_point.all():
+        # 在投影坐标系中计算质心，避免经纬度下的面积变形
+        work_crs = geoms.crs if not geoms.crs.is_geographic else geoms.estimate_utm_crs()
+        projected = geoms.to_crs(work_crs)
+        if polygon_point == "representative":
+            reps = projected.representative_point()
+        else:
+            reps = projected.centroid
+        geoms = geoms.where(is_point, reps.to_crs(geoms.crs))
+    
+    # 一次性转换到EPSG:4326
+    geoms = geoms.to_crs("EPSG:4326")
+    lons = geoms.x.values
+    lats = geoms.y.values
+    
+    # 按列提取ID字段
+    id_column = next((c for c in ("ID", "id", "Id") if c in gdf.columns), None)
+    if id_column:
+        point_ids = np.asarray(gdf[id_column].astype(str), dtype=str)
+    else:
+        point_ids = (np.arange(len(gdf)) + 1).astype(str)
+    
+    print(f"读取{len(point_ids)}个点，经度范围[{lons.min():.4f}, {lons.max():.4f}]，纬度范围[{lats.min():.4f}, {lats.max():.4f}]")
+    return point_ids, lons, lats
+
+def read_points_from_shapefile(shp_file, polygon_point="centroid"):
     """从shapefile中读取坐标点"""
     try:
-        print(f"从shapefile读取点: {shp_file}")
-        gdf = gpd.read_file(shp_file)
-        points = []
-        
-        # 输出shapefile的基本信息
-        print(f"Shapefile包含{len(gdf)}个要素")
-        print(f"坐标系统: {gdf.crs}")
-        print(f"列名: {gdf.columns.tolist()}")
-        
-        # 获取点的坐标
-        for idx, row in gdf.iterrows():
-            # 获取几何对象
-            geom = row.geometry
-            
-            # 如果是点类型
-            if geom.type == 'Point':
-                x, y = geom.x, geom.y
-                point_id = f"{idx+1}"  # 使用索引作为ID
-                
-                # 如果shapefile中有ID字段，使用该字段
-                if 'ID' in gdf.columns:
-                    point_id = str(row['ID'])
-                elif 'id' in gdf.columns:
-                    point_id = str(row['id'])
-                elif 'Id' in gdf.columns:
-                    point_id = str(row['Id'])
-                
-                # 创建点对象
-                points.append({
-                    "id": point_id,
-                    "lon": x,
-                    "lat": y
-                })
-                print(f"  点{point_id}: ({x}, {y})")
-        
-        return points
+        point_ids, lons, lats = read_shapefile_coordinates(shp_file, polygon_point)
+        return points_from_arrays(point_ids, lons, lats)
     except Exception as e:
         print(f"读取shapefile时出错: {str(e)}")
         import traceback
         traceback.print_exc()
         return []
 
+def points_from_arrays(point_ids, lons, lats):
+    """由ID和坐标数组构建点列表"""
+    return [
+        {"id": f"{point_id}", "lon": float(lon), "lat": float(lat)}
+        for point_id, lon, lat in zip(point_ids, lons, lats)
+    ]
+
+def default_att_file(mesh_file):
+    """根据网格文件名推断属性文件名: xxx.sp.mesh -> xxx.sp.att"""
+    if mesh_file.endswith(".mesh"):
+        return mesh_file[:-len(".mesh")] + ".att"
+    return mesh_file + ".att"
+
 def parse_point_list(point_strings):
     """解析命令行参数中的点列表"""
     points = []
@@ -215,137 +247,318 @@ def parse_point_list(point_strings):
 
 def find_nearest_gldas_points(user_points, nc_file):
     """找到最接近用户指定点的GLDAS格点"""
+    point_ids = [p["id"] for p in user_points]
+    xs = np.array([p["lon"] for p in user_points], dtype=float)
+    ys = np.array([p["lat"] for p in user_points], dtype=float)
+    return snap_points_to_grid(point_ids, xs, ys, nc_file)
+
+def snap_points_to_grid(point_ids, xs, ys, nc_file):
+    """根据坐标数组找到每个点最近的GLDAS格点"""
     print(f"查找最近的GLDAS格点...")
     
     # 打开NC文件获取所有格点信息
-    ds = xr.open_dataset(nc_file)
-    lats = ds.lat.values
-    lons = ds.lon.values
-    ds.close()
+    lats, lons = read_grid_axes(nc_file)
+    
+    # 一次性计算所有点的格点索引
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    lat_indices = lookup_grid_indices(ys, lats)
+    lon_indices = lookup_grid_indices(xs, lons)
+    
+    # 距最近格点超过一个网格间距的点在数据范围之外
+    outside = ((np.abs(lats[lat_indices] - ys) > np.abs(np.diff(lats)).max())
+               | (np.abs(lons[lon_indices] - xs) > np.abs(np.diff(lons)).max()))
+    if outside.any():
+        print(f"警告: {int(outside.sum())}个点位于数据网格范围之外，将使用边缘格点")
     
     nearest_points = []
-    for point in user_points:
-        point_id = point["id"]
-        x = point["lon"]
-        y = point["lat"]
-        
-        # 找到最接近的经纬度点
-        lat_idx = np.abs(lats - y).argmin()
-        lon_idx = np.abs(lons - x).argmin()
-        
-        nearest_lat = lats[lat_idx]
-        nearest_lon = lons[lon_idx]
-        
-        # 生成点ID
-        gldas_id = f"{point_id}"  # 保持与原始ID一致
+    for i, point_id in enumerate(point_ids):
+        lat_idx = int(lat_indices[i])
+        lon_idx = int(lon_indices[i])
         
         nearest_points.append({
-            "id": gldas_id,  # 使用与用户点相同的ID
+            "id": f"{point_id}",  # 使用与用户点相同的ID
             "original_id": point_id,
-            "original_lon": x,
-            "original_lat": y,
-            "lon": nearest_lon,
-            "lat": nearest_lat,
+            "original_lon": xs[i],
+            "original_lat": ys[i],
+            "lon": lons[lon_idx],
+            "lat": lats[lat_idx],
             "lon_idx": lon_idx,
             "lat_idx": lat_idx
         })
-        
-        print(f"  点{point_id} ({x:.4f}, {y:.4f}) -> GLDAS点 ({nearest_lon:.4f}, {nearest_lat:.4f})")
+    
+    # 点数较多时只输出前几个点
+    for p in nearest_points[:20]:
+        print(f"  点{p['id']} ({p['original_lon']:.4f}, {p['original_lat']:.4f}) -> GLDAS点 ({p['lon']:.4f}, {p['lat']:.4f})")
+    if len(nearest_points) > 20:
+        print(f"  ... 共{len(nearest_points)}个点")
     
     return nearest_points
 
-def extract_points_to_cache(nc_files, year, cache_dir, points, force=False):
-    """从NC文件中提取特定点的数据并保存为缓存文件"""
-    # 检查是否已存在对应年份的缓存文件
-    cache_file = os.path.join(cache_dir, f"GLDAS-{year}-points.cache.npz")
-    if os.path.exists(cache_file) and not force:
-        print(f"缓存文件已存在: {cache_file}，跳过处理")
-        return cache_file
-    
-    # 需要提取的变量
-    extract_vars = [
-        "Rainf_tavg",   # 降水 (kg m-2 s-1)
-        "Tair_f_inst",   # 温度 (K)
-        "Qair_f_inst",   # 比湿 (kg kg-1)
-        "Wind_f_inst",   # 风速 (m s-1)
-        "SWdown_f_tavg", # 短波辐射 (W m-2)
-        "Psurf_f_inst"   # 表面气压 (Pa)
-    ]
+def build_forcing_cells(gldas_points):
+    """将落在同一GLDAS格点的点合并为唯一的气象驱动格点
+    
+    返回唯一格点列表（按首次出现的顺序），并在每个点上记录所属格点的
+    ID和在meteo.tsd.forc中的序号(forc, 从1开始)
+    """
+    lat_indices = np.array([p["lat_idx"] for p in gldas_points], dtype=np.int64)
+    lon_indices = np.array([p["lon_idx"] for p in gldas_points], dtype=np.int64)
+    
+    keys = lat_indices * (int(lon_indices.max()) + 1) + lon_indices
+    _, first_index, inverse, counts = np.unique(
+        keys, return_index=True, return_inverse=True, return_counts=True)
+    
+    # 按首次出现顺序对格点重新编号
+    order = np.argsort(first_index)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    cell_of_point = rank[inverse.ravel()]
+    
+    cells = []
+    for unique_idx in order:
+        p = gldas_points[first_index[unique_idx]]
+        cells.append({
+            "id": format_cell_id(p["lon"], p["lat"]),
+            "lon": p["lon"],
+            "lat": p["lat"],
+            "lon_idx": p["lon_idx"],
+            "lat_idx": p["lat_idx"],
+            "n_points": int(counts[unique_idx])
+        })
+    
+    for point, cell_idx in zip(gldas_points, cell_of_point):
+        point["forc"] = int(cell_idx) + 1
+        point["cell_id"] = cells[cell_idx]["id"]
+    
+    print(f"{len(gldas_points)}个点合并为{len(cells)}个唯一GLDAS格点")
+    return cells
+
+def read_file_points(nc_file, variables, lat_indices, lon_indices, product=None):
+    """读取单个NC文件中所有点的变量值，返回(时间戳, [点数, 变量数]数组)"""
+    product = product or get_product()
+    with xr.open_dataset(nc_file) as ds:
+        time_value = pd.to_datetime(ds.time.values[0])
+        values = read_product_points(ds, product, variables, lat_indices, lon_indices)
+    return time_value, values
+
+def _atomic_savez(path, **arrays):
+    """先写临时文件再替换，避免中断时留下损坏的npz文件"""
+    tmp_file = path + ".tmp.npz"
+    np.savez_compressed(tmp_file, **arrays)
+    os.replace(tmp_file, path)
+
+def _atomic_write_json(path, data):
+    """先写临时文件再替换，避免中断时留下损坏的JSON文件"""
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+    os.replace(tmp_file, path)
+
+def load_extraction_ledger(ledger_file, checkpoint_file, point_ids, variables):
+    """读取提取台账和检查点，返回(台账, 已完成的文件, 时间列表, 数据列表)"""
+    empty = ({"files": {}}, [], [], [])
+    if not os.path.exists(ledger_file):
+        return empty
+    
+    try:
+        with open(ledger_file, 'r') as f:
+            ledger = json.load(f)
+    except Exception as e:
+        print(f"读取台账失败，重新开始: {str(e)}")
+        return empty
+    
+    # 点或变量发生变化时，检查点不可复用
+    if ledger.get("point_ids") != list(point_ids) or ledger.get("variables") != list(variables):
+        print("点或变量与台账不一致，重新开始提取")
+        return empty
+    
+    done_files, times, all_data = [], [], []
+    if os.path.exists(checkpoint_file):
+        try:
+            checkpoint = np.load(checkpoint_file)
+            done_files = [str(f) for f in checkpoint['files']]
+            times = list(pd.to_datetime(checkpoint['times']))
+            all_data = list(checkpoint['data'])
+        except Exception as e:
+            print(f"读取检查点失败，重新开始: {str(e)}")
+            return empty
+    
+    # 以检查点为准：检查点之后完成的文件需要重新提取
+    for name, entry in ledger["files"].items():
+        if entry["status"] == "done" and name not in done_files:
+            entry["status"] = "pending"
+    
+    print(f"从检查点恢复: 已完成{len(done_files)}个文件")
+    return ledger, done_files, times, all_data
+
+def save_extraction_checkpoint(ledger_file, checkpoint_file, ledger, done_files, times, all_data):
+    """保存检查点和台账（先保存检查点，台账中的完成状态不会超前于检查点）"""
+    n_points = len(ledger["point_ids"])
+    n_vars = len(ledger["variables"])
+    data = np.array(all_data).reshape(len(all_data), n_points, n_vars)
+    _atomic_savez(
+        checkpoint_file,
+        data=data,
+        times=np.array(times, dtype="datetime64[ns]"),
+        files=np.array(done_files)
+    )
+    _atomic_write_json(ledger_file, ledger)
+
+def unrecorded_files(ledger_file, nc_files):
+    """台账中没有记录为已完成或已隔离的文件（没有台账时无法判断，返回空列表）"""
+    if not os.path.exists(ledger_file):
+        return []
+    with open(ledger_file, 'r') as f:
+        files_status = json.load(f).get("files", {})
+    return [f for f in nc_files
+            if files_status.get(os.path.basename(f), {}).get("status") not in ("done", "quarantined")]
+
+def load_cache_as_checkpoint(cache_file, ledger_file):
+    """将已完成的缓存文件作为检查点读取，用于增量提取，返回(台账, 已完成的文件, 时间列表, 数据列表)"""
+    with open(ledger_file, 'r') as f:
+        ledger = json.load(f)
+    with np.load(cache_file) as cache_data:
+        times = list(pd.to_datetime(cache_data['times']))
+        all_data = list(cache_data['data_array'].transpose(1, 0, 2))
+    done_files = [name for name, entry in ledger["files"].items() if entry["status"] == "done"]
+    return ledger, done_files, times, all_data
+
+def cache_matches_points(cache_file, points, variables=None):
+    """检查已有缓存文件中的点ID（和变量）是否与当前要提取的一致"""
+    try:
+        with np.load(cache_file) as cache_data:
+            cached_ids = [str(i) for i in cache_data['point_ids']]
+            cached_vars = [str(v) for v in cache_data['variables']]
+    except Exception:
+        return False
+    if variables is not None and cached_vars != list(variables):
+        return False
+    return cached_ids == [p["id"] for p in points]
+
+def extract_points_to_cache(nc_files, year, cache_dir, points, force=False,
+                            checkpoint_every=100, max_attempts=3, product=None, optional=False,
+                            incremental=False):
+    """从NC文件中提取特定点的数据并保存为缓存文件（支持检查点和断点续提）
+
+    optional为True时同时提取产品的可选变量（用于计算派生变量）；
+    incremental为True时已有缓存只补充提取台账中没有记录的新文件。
+    """
+    product = product or get_product()
+    prefix = product["cache_prefix"]
     
     # 按照时间顺序排序
     nc_files.sort()
     
+    # 根据第一个文件确定可提取的标准变量（由产品注册表定义）
+    with xr.open_dataset(nc_files[0]) as first_ds:
+        variables = available_variables(product, first_ds.variables, optional)
+    
+    # 检查是否已存在对应年份的缓存文件
+    cache_file = os.path.join(cache_dir, f"{prefix}-{year}-points.cache.npz")
+    ledger_file = os.path.join(cache_dir, f"{prefix}-{year}-points.ledger.json")
+    checkpoint_file = os.path.join(cache_dir, f"{prefix}-{year}-points.partial.npz")
+    extend_cache = False
+    if os.path.exists(cache_file) and not force:
+        if cache_matches_points(cache_file, points, variables):
+            new_files = unrecorded_files(ledger_file, nc_files) if incremental else []
+            if not new_files:
+                print(f"缓存文件已存在: {cache_file}，跳过处理")
+                return cache_file
+            print(f"缓存文件已存在，增量提取{len(new_files)}个新文件: {cache_file}")
+            extend_cache = True
+        else:
+            print(f"缓存文件中的点或变量与当前不一致，重新提取: {cache_file}")
+    
     # 获取点信息
     point_ids = [p["id"] for p in points]
     lat_indices = [p["lat_idx"] for p in points]
     lon_indices = [p["lon_idx"] for p in points]
     
-    # 获取第一个文件，用于检查变量
-    first_ds = xr.open_dataset(nc_files[0])
-    
-    # 获取变量列表
-    available_vars = list(first_ds.variables)
-    variables = []
-    for var in extract_vars:
-        if var in available_vars:
-            variables.append(var)
-        else:
-            print(f"警告: 变量 {var} 不在数据集中")
-    
-    first_ds.close()
-    
     print(f"提取{len(point_ids)}个点的数据")
     print(f"提取变量: {variables}")
     
-    # 初始化数据数组和时间列表
-    times = []
-    all_data = []
-    
-    # 逐个处理NC文件
-    for idx, nc_file in enumerate(nc_files):
-        print(f"  处理文件 {idx+1}/{len(nc_files)}: {os.path.basename(nc_file)}")
-        
-        try:
-            # 打开NC文件
-            ds = xr.open_dataset(nc_file)
-            
-            # 获取时间戳
-            time_value = pd.to_datetime(ds.time.values[0])
-            times.append(time_value)
-            
-            # 创建当前时间步的数据数组
-            time_step_data = np.zeros((len(point_ids), len(variables)))
+    # 强制重新处理时丢弃旧的台账和检查点
+    if force:
+        for old_file in (ledger_file, checkpoint_file):
+            if os.path.exists(old_file):
+                os.remove(old_file)
+    
+    # 读取台账和检查点（增量提取时以已有缓存为检查点），times与all_data始终一一对应
+    if extend_cache:
+        ledger, done_files, times, all_data = load_cache_as_checkpoint(cache_file, ledger_file)
+    else:
+        ledger, done_files, times, all_data = load_extraction_ledger(
+            ledger_file, checkpoint_file, point_ids, variables)
+    ledger["point_ids"] = point_ids
+    ledger["variables"] = variables
+    files_status = ledger["files"]
+    done_set = set(done_files)
+    
+    # 待处理文件: 未完成且未被隔离
+    pending = []
+    for nc_file in nc_files:
+        name = os.path.basename(nc_file)
+        entry = files_status.setdefault(name, {"status": "pending", "attempts": 0})
+        if name in done_set or entry["status"] == "quarantined":
+            continue
+        pending.append(nc_file)
+    
+    quarantined = [name for name, entry in files_status.items() if entry["status"] == "quarantined"]
+    if quarantined:
+        print(f"跳过{len(quarantined)}个已隔离的文件")
+    
+    # 逐个处理NC文件，失败的文件在本轮末尾重试，超过最大尝试次数则隔离
+    since_checkpoint = 0
+    while pending:
+        retry = []
+        for idx, nc_file in enumerate(pending):
+            name = os.path.basename(nc_file)
+            entry = files_status[name]
+            print(f"  处理文件 {idx+1}/{len(pending)}: {name}")
             
-            # 遍历所有点和所有变量，提取数据
-            for point_idx in range(len(points)):
-                lat_idx = lat_indices[point_idx]
-                lon_idx = lon_indices[point_idx]
-                
-                for var_idx, var in enumerate(variables):
-                    # 提取数据
-                    value = float(ds[var].isel(lat=lat_idx, lon=lon_idx).values.item())
-                    time_step_data[point_idx, var_idx] = value
+            try:
+                time_value, time_step_data = read_file_points(nc_file, variables, lat_indices, lon_indices, product)
+            except Exception as e:
+                entry["attempts"] += 1
+                entry["error"] = str(e)
+                if entry["attempts"] >= max_attempts:
+                    entry["status"] = "quarantined"
+                    print(f"    处理文件时出错(第{entry['attempts']}次)，已隔离: {str(e)}")
+                else:
+                    entry["status"] = "failed"
+                    retry.append(nc_file)
+                    print(f"    处理文件时出错(第{entry['attempts']}次)，稍后重试: {str(e)}")
+                continue
             
-            # 将当前时间步的数据添加到所有数据中
+            # 文件完整读取成功后才同时记录时间和数据
+            times.append(time_value)
             all_data.append(time_step_data)
+            done_files.append(name)
+            entry["status"] = "done"
+            entry["attempts"] += 1
+            entry.pop("error", None)
             
-        except Exception as e:
-            print(f"    处理文件时出错: {str(e)}")
-            continue
+            since_checkpoint += 1
+            if since_checkpoint >= checkpoint_every:
+                save_extraction_checkpoint(ledger_file, checkpoint_file, ledger, done_files, times, all_data)
+                since_checkpoint = 0
+        
+        pending = retry
     
     # 检查是否提取到了数据
     if len(all_data) == 0:
+        _atomic_write_json(ledger_file, ledger)
         print(f"警告: 未能从NC文件中提取到任何数据")
         return None
     
-    # 将所有时间步的数据合并为一个数组
-    data_array = np.zeros((len(point_ids), len(times), len(variables)))
-    for t_idx, t_data in enumerate(all_data):
-        data_array[:, t_idx, :] = t_data
+    # 按时间排序（重试成功的文件可能排在后面）
+    order = np.argsort(np.array(times, dtype="datetime64[ns]"), kind="stable")
+    times = np.array(times, dtype="datetime64[ns]")[order]
+    data_array = np.array(all_data)[order].transpose(1, 0, 2)
     
     # 保存为缓存文件
     try:
-        np.savez_compressed(
+        _atomic_savez(
             cache_file,
             data_array=data_array,
             point_ids=point_ids,
@@ -357,173 +570,204 @@ def extract_points_to_cache(nc_files, year, cache_dir, points, force=False):
         print(f"保存缓存文件失败: {str(e)}")
         return None
     
-    return cache_file
-
-def convert_to_rh(qair, tair, psurf):
-    """将比湿转换为相对湿度"""
-    # 绝对零度
-    t0 = 273.15  # K
-    
-    # 计算相对湿度
-    rh = 0.263 * psurf * qair / np.exp(17.67 * (tair - t0) / (tair - 29.65)) 
+    # 缓存完成后删除检查点，台账保留隔离文件的记录
+    _atomic_write_json(ledger_file, ledger)
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
     
-    # 将百分比转换为0-1的比例
-    rh = rh / 100.0
+    quarantined = [name for name, entry in files_status.items() if entry["status"] == "quarantined"]
+    if quarantined:
+        print(f"警告: {len(quarantined)}个文件已隔离，详见台账: {ledger_file}")
     
-    # 限制在0.1-1.0的范围内
-    rh = np.minimum(rh, 1.0)
-    rh = np.maximum(rh, 0.1)
-    
-    return rh
+    return cache_file
 
-def process_cache_to_csv(cache_file, csv_dir, force=False):
-    """将缓存文件转换为每个点的CSV文件"""
-    print(f"从{cache_file}加载缓存数据...")
+def process_cache_to_csv(cache_files, csv_dir, force=False, time_step=None, temp_extremes=False,
+                         report_dir=None, max_gap_steps=8, qc_mask=False, derived=None,
+                         sites=None, lapse_rate=DEFAULT_LAPSE_RATE, bias=None, append=False, netcdf=None,
+                         arrow=None, since=None):
+    """将缓存文件（可为多个年份）转换为每个点的CSV文件，可重采样到指定时间步长(秒)
+    
+    指定sites时按高程降尺度，每个站点输出一个CSV文件；指定bias时用站点观测做偏差校正。
+    append为True时已有的CSV文件只追加新的时间步。
+    指定netcdf时所有点写入一个NetCDF文件，netcdf["write_csv"]为False时不再写出CSV文件。
+    指定arrow时数据立方体（包括派生变量列）另外写入一个Arrow IPC文件。
+    指定since时只处理此时间之后的数据（监视模式的增量刷新），不写出质控和缺测报告。
+    """
+    print(f"从{cache_files}加载缓存数据...")
     
     try:
-        # 加载缓存数据
-        cache_data = np.load(cache_file, allow_pickle=True)
-        data_array = cache_data['data_array']
-        point_ids = cache_data['point_ids']
-        variables = cache_data['variables']
-        times = cache_data['times']
+        # 加载并按时间拼接缓存数据
+        data_array, point_ids, variables, times = load_cache_cube(cache_files)
     except Exception as e:
         print(f"加载缓存文件失败: {str(e)}")
         return False
     
-    # 处理每个点的数据
+    report_dir = report_dir or os.path.dirname(os.path.abspath(csv_dir))
+    
+    # 增量刷新只保留末尾的时间窗口，报告保留上次完整处理的结果
+    if since is not None:
+        keep = times >= since
+        data_array, times = data_array[:, keep], times[keep]
+        print(f"增量刷新: 处理{times[0]}之后的{len(times)}个时间步")
+    
+    # 质量控制检查，标志数组保存在缓存文件旁
+    if since is None:
+        run_qc(data_array, times, point_ids, variables, qc_flags_file(cache_files),
+               os.path.join(report_dir, "qc_summary.csv"), qc_mask)
+    else:
+        run_qc(data_array, times, point_ids, variables, None, None, qc_mask)
+    
+    # 补齐缺失的时间步并插补缺测
+    data_array, times, gap_report = fill_cube_gaps(data_array, times, variables, point_ids,
+                                                   native_time_step(times), max_gap_steps)
+    if since is None:
+        write_gap_report(gap_report, report_dir)
+    
+    # 按高程降尺度，格点数据展开为站点数据
+    if sites:
+        data_array = downscale_cube(data_array, variables, sites, lapse_rate)
+        point_ids = [site["id"] for site in sites]
+    
+    # 对整个数据立方体做一次单位转换
+    forcing, columns = convert_cube(data_array, variables)
+    
+    # 派生变量作为附加列，与驱动列一起重采样
+    if derived:
+        extra, extra_columns = compute_derived(data_array, variables)
+        forcing = np.concatenate([forcing, extra], axis=2)
+        columns = columns + extra_columns
+    
+    # 对整个数据立方体做一次时间重采样
+    if time_step:
+        forcing, times, columns = resample_cube(forcing, times, columns, time_step, temp_extremes)
+    
+    # 在输出时间步长上做偏差校正，传递函数缓存在缓存文件旁
+    if bias:
+        bias_correct_cube(forcing, times, columns, transfer_file=bias_transfer_file(cache_files), **bias)
+    
+    # sidecar模式下派生变量单独写入derived目录
+    derived_names = [spec["column"] for spec in DERIVED_COLUMNS]
+    if derived == "sidecar":
+        derived_dir = os.path.join(report_dir, "derived")
+        os.makedirs(derived_dir, exist_ok=True)
+        forcing_idx = [i for i, c in enumerate(columns) if c not in derived_names]
+        derived_idx = [i for i, c in enumerate(columns) if c in derived_names]
+    else:
+        forcing_idx = list(range(len(columns)))
+        derived_idx = []
+    
+    # 数据立方体直接写入Arrow IPC文件，供pandas/polars内存映射读取
+    if arrow:
+        write_forcing_arrow(arrow["arrow_file"], times, forcing, point_ids, columns, arrow["layout"], time_step)
+    
+    # 所有点写入一个NetCDF文件，站点元数据与meteo_locations.csv一致
+    if netcdf:
+        cells_by_id = {cell["id"]: cell for cell in netcdf["cells"]}
+        write_forcing_netcdf(netcdf["nc_file"], times, forcing[:, :, forcing_idx],
+                             [columns[i] for i in forcing_idx], [cells_by_id[p] for p in point_ids], time_step)
+        if not netcdf["write_csv"]:
+            return True
+    
+    # 每个点只需切片并写出
     for p_idx, point_id in enumerate(point_ids):
         # 创建CSV文件名
         csv_file = os.path.join(csv_dir, f"{point_id}.csv")
         if os.path.exists(csv_file) and not force:
-            print(f"  CSV文件已存在: {csv_file} (跳过)")
+            if not append:
+                print(f"  CSV文件已存在: {csv_file} (跳过)")
+                continue
+            n_new = append_shud_forcing_csv(csv_file, times, forcing[p_idx][:, forcing_idx],
+                                            [columns[i] for i in forcing_idx], time_step)
+            derived_file = os.path.join(report_dir, "derived", f"{point_id}.csv")
+            if derived_idx and os.path.exists(derived_file):
+                append_shud_forcing_csv(derived_file, times, forcing[p_idx][:, derived_idx],
+                                        [columns[i] for i in derived_idx], time_step)
+            print(f"  CSV文件已追加{n_new}个时间步 ({p_idx+1}/{len(point_ids)}): {csv_file}")
             continue
-            
-        print(f"  处理点 {p_idx+1}/{len(point_ids)}: {point_id}")
-        
-        # 创建数据字典
-        data_dict = {}
-        for var_idx, var in enumerate(variables):
-            data_dict[var] = data_array[p_idx, :, var_idx]
         
-        # 将数据添加到DataFrame
-        df = pd.DataFrame(data_dict, index=times)
-        
-        # 1. 时间间隔（以天为单位）
-        time_intervals = [(t - times[0]).total_seconds() / (24 * 3600) for t in times]
-        
-        # 2. 降水: kg m-2 s-1 -> mm/day
-        if 'Rainf_tavg' in df.columns:
-            df['Precip'] = df['Rainf_tavg'] * 86400  # 转换为mm/day
-        else:
-            df['Precip'] = 0.0
-        
-        # 3. 温度: K -> ℃
-        if 'Tair_f_inst' in df.columns:
-            df['Temp'] = df['Tair_f_inst'] - 273.15
-        else:
-            df['Temp'] = 15.0  # 默认值
-        
-        # 4. 相对湿度: 比湿 -> 相对湿度(0-1)
-        if all(var in df.columns for var in ['Qair_f_inst', 'Tair_f_inst', 'Psurf_f_inst']):
-            df['RH'] = convert_to_rh(df['Qair_f_inst'], df['Tair_f_inst'], df['Psurf_f_inst'])
-        else:
-            df['RH'] = 0.7  # 默认值
-        
-        # 5. 风速: m/s
-        if 'Wind_f_inst' in df.columns:
-            df['Wind'] = df['Wind_f_inst']
-        else:
-            df['Wind'] = 2.0  # 默认值
-        
-        # 6. 辐射: W/m2
-        if 'SWdown_f_tavg' in df.columns:
-            df['RADN'] = df['SWdown_f_tavg']
-        else:
-            df['RADN'] = 0.0  # 默认值
-        
-        # 7. 气压: Pa -> kPa
-        if 'Psurf_f_inst' in df.columns:
-            df['VP'] = df['Psurf_f_inst'] / 1000.0  # 转换为kPa
-        else:
-            df['VP'] = 101.325  # 默认值 (标准大气压)
-        
-        # 保留4位小数
-        columns = ['Precip', 'Temp', 'RH', 'VP', 'Wind', 'RADN']
-        df[columns] = df[columns].round(4)
-        
-        # 写入SHUD模型所需的CSV格式
-        with open(csv_file, 'w') as f:
-            # 第一行: 时间步数 列数 开始日期 结束日期 时间间隔(秒)
-            start_date = times[0].strftime("%Y%m%d")
-            end_date = times[-1].strftime("%Y%m%d")
-            time_step = int((times[1] - times[0]).total_seconds())  # 秒
-            num_rows = len(df)
-            num_cols = len(columns) + 1  # 变量列 + 时间列
-            
-            f.write(f"{num_rows}\t{num_cols}\t{start_date}\t{end_date}\t{time_step}\n")
-            
-            # 第二行: 列名
-            f.write("Time_interval\t" + "\t".join(columns) + "\n")
-            
-            # 数据行
-            for i, (time, row) in enumerate(zip(time_intervals, df[columns].values)):
-                values = [f"{time:.4f}"] + [f"{val:.4f}" for val in row]
-                f.write("\t".join(values) + "\n")
-        
-        print(f"  CSV文件已创建: {csv_file}")
+        write_shud_forcing_csv(csv_file, times, forcing[p_idx][:, forcing_idx],
+                               [columns[i] for i in forcing_idx], time_step)
+        if derived_idx:
+            write_shud_forcing_csv(os.path.join(derived_dir, f"{point_id}.csv"), times,
+                                   forcing[p_idx][:, derived_idx], [columns[i] for i in derived_idx], time_step)
+        print(f"  CSV文件已创建 ({p_idx+1}/{len(point_ids)}): {csv_file}")
     
     return True
 
-def create_meteotsd_file(csv_dir, points, output_dir):
-    """创建SHUD模型需要的meteo.tsd.forc文件"""
+def create_meteotsd_file(csv_dir, cells, output_dir):
+    """创建SHUD模型需要的meteo.tsd.forc文件（每个唯一格点一个驱动文件）"""
     print("创建meteo.tsd.forc文件...")
     
-    # 获取第一个CSV文件的开始日期
-    first_csv = os.path.join(csv_dir, f"{points[0]['id']}.csv")
-    
-    with open(first_csv, 'r') as f:
-        first_line = f.readline().strip().split('\t')
-        if len(first_line) >= 3:
-            start_date = first_line[2]  # 开始日期
-        else:
-            print("警告: CSV文件格式不正确，使用默认日期")
-            start_date = "20230501"
+    # 获取第一个CSV文件的开始日期，只输出NetCDF时从forcing.nc读取
+    first_csv = os.path.join(csv_dir, f"{cells[0]['id']}.csv")
+    nc_file = os.path.join(output_dir, "forcing.nc")
+    
+    if not os.path.exists(first_csv) and os.path.exists(nc_file):
+        start_date = netcdf_start_date(nc_file)
+    else:
+        with open(first_csv, 'r') as f:
+            first_line = f.readline().strip().split('\t')
+            if len(first_line) >= 3:
+                start_date = first_line[2]  # 开始日期
+            else:
+                print("警告: CSV文件格式不正确，使用默认日期")
+                start_date = "20230501"
     
     # 创建meteo.tsd.forc文件
     meteo_file = os.path.join(output_dir, "meteo.tsd.forc")
     
     with open(meteo_file, 'w') as f:
-        # 写入点数和开始日期
-        f.write(f"{len(points)} {start_date}\n")
+        # 写入驱动文件数和开始日期
+        f.write(f"{len(cells)} {start_date}\n")
         
         # 写入相对路径
         f.write("./csv/\n")
         
-        # 写入各点的文件名
-        for point in points:
-            f.write(f"{point['id']}.csv\n")
+        # 写入各格点的文件名
+        for cell in cells:
+            f.write(f"{cell['id']}.csv\n")
     
     print(f"已创建meteo.tsd.forc文件: {meteo_file}")
     return True
 
-def create_point_locations_file(points, output_dir):
-    """创建包含点位置信息的CSV文件"""
+def create_point_locations_file(cells, output_dir):
+    """创建包含气象驱动格点位置信息的CSV文件"""
     print("创建点位置文件...")
     
     location_file = os.path.join(output_dir, "meteo_locations.csv")
     
     with open(location_file, 'w') as f:
-        # 写入表头
-        f.write("ID,Original_Lon,Original_Lat,GLDAS_Lon,GLDAS_Lat\n")
+        # 写入表头，FORC为该格点在meteo.tsd.forc中的序号；降尺度站点另有高程列
+        with_elevation = "elevation" in cells[0]
+        header = "FORC,ID,GLDAS_Lon,GLDAS_Lat,N_Points"
+        f.write(header + (",Elevation,GLDAS_Elevation\n" if with_elevation else "\n"))
         
-        # 写入每个点的信息
-        for point in points:
-            f.write(f"{point['id']},{point['original_lon']},{point['original_lat']},{point['lon']},{point['lat']}\n")
+        # 写入每个格点的信息
+        for i, cell in enumerate(cells):
+            line = f"{i+1},{cell['id']},{cell['lon']},{cell['lat']},{cell['n_points']}"
+            if with_elevation:
+                line += f",{cell['elevation']:.1f},{cell['cell_elevation']:.1f}"
+            f.write(line + "\n")
     
     print(f"已创建点位置文件: {location_file}")
     return True
 
+def create_point_cell_map_file(points, output_dir):
+    """创建用户点到气象驱动格点的对应关系文件"""
+    map_file = os.path.join(output_dir, "meteo_point_map.csv")
+    
+    df = pd.DataFrame({
+        "Point_ID": [p["original_id"] for p in points],
+        "Original_Lon": [p["original_lon"] for p in points],
+        "Original_Lat": [p["original_lat"] for p in points],
+        "FORC": [p["forc"] for p in points],
+        "Forcing_ID": [p["cell_id"] for p in points],
+    })
+    df.to_csv(map_file, index=False)
+    
+    print(f"已创建点与格点对应关系文件: {map_file}")
+    return True
+
 def save_points_map(points, output_dir):
     """保存原始点和GLDAS点的对应关系图"""
     print("创建点对应关系图...")
@@ -533,21 +777,26 @@ def save_points_map(points, output_dir):
     # 绘制原始点
     user_x = [p["original_lon"] for p in points]
     user_y = [p["original_lat"] for p in points]
-    plt.scatter(user_x, user_y, c='blue', marker='o', s=80, label='原始点')
+    if len(points) <= 1000:
+        plt.scatter(user_x, user_y, c='blue', marker='o', s=80, label='原始点')
+    else:
+        # 大量点（如网格单元质心）用像素点绘制
+        plt.plot(user_x, user_y, ',', color='blue', alpha=0.3, rasterized=True, label='原始点')
     
     # 绘制GLDAS点
     gldas_x = [p["lon"] for p in points]
     gldas_y = [p["lat"] for p in points]
-    plt.scatter(gldas_x, gldas_y, c='red', marker='x', s=100, label='GLDAS点')
-    
-    # 连接对应的点
-    for i in range(len(points)):
-        plt.plot([user_x[i], gldas_x[i]], [user_y[i], gldas_y[i]], 'k--', alpha=0.5)
+    cell_xy = sorted(set(zip(gldas_x, gldas_y)))
+    plt.scatter([c[0] for c in cell_xy], [c[1] for c in cell_xy], c='red', marker='x', s=100, label='GLDAS点')
     
-    # 添加点ID标签
-    for i, p in enumerate(points):
-        plt.annotate(p["id"], (user_x[i], user_y[i]), 
-                    textcoords="offset points", xytext=(0,10), ha='center')
+    # 点数较少时才连接对应的点并添加ID标签（网格单元等大量点只绘制散点）
+    if len(points) <= 1000:
+        for i in range(len(points)):
+            plt.plot([user_x[i], gldas_x[i]], [user_y[i], gldas_y[i]], 'k--', alpha=0.5)
+        
+        for i, p in enumerate(points):
+            plt.annotate(p["id"], (user_x[i], user_y[i]), 
+                        textcoords="offset points", xytext=(0,10), ha='center')
     
     plt.xlabel('经度')
     plt.ylabel('纬度')
@@ -563,31 +812,18 @@ def save_points_map(points, output_dir):
     print(f"已创建点对应关系图: {map_file}")
     return True
 
-def prepare_shud_project(output_dir):
-    """准备SHUD模型项目目录结构"""
+def prepare_shud_project(output_dir, link_mode="auto"):
+    """准备SHUD模型项目目录结构（驱动文件链接到输出目录，只同步变化的文件）"""
     # 确保CSV目录在输出目录中
     source_csv_dir = os.path.join(output_dir, "csv")
     if not os.path.exists(source_csv_dir):
         print(f"错误: CSV目录不存在: {source_csv_dir}")
         return False
     
-    # 复制文件到SHUD项目目录
+    # 链接或复制meteo.tsd.forc和其中列出的CSV文件到SHUD项目目录
     try:
-        # 确保项目目录存在
         shud_dir = os.path.join(output_dir, "shud_project")
-        os.makedirs(shud_dir, exist_ok=True)
-        
-        # 复制meteo.tsd.forc文件
-        shutil.copy(os.path.join(output_dir, "meteo.tsd.forc"), shud_dir)
-        
-        # 创建并复制CSV目录
-        shud_csv_dir = os.path.join(shud_dir, "csv")
-        os.makedirs(shud_csv_dir, exist_ok=True)
-        
-        # 复制所有CSV文件
-        for file in os.listdir(source_csv_dir):
-            if file.endswith(".csv"):
-                shutil.copy(os.path.join(source_csv_dir, file), shud_csv_dir)
+        assemble_project(output_dir, shud_dir, mode=link_mode)
         
         print(f"SHUD模型项目已创建: {shud_dir}")
         print(f"  - meteo.tsd.forc: 气象驱动配置文件")
@@ -598,6 +834,212 @@ def prepare_shud_project(output_dir):
         print(f"准备SHUD项目时出错: {str(e)}")
         return False
 
+def read_input_points(args):
+    """按--mesh-file、--shp-file或--points读取用户点，返回(点ID, 经度, 纬度, 高程或None)"""
+    point_ids, lons, lats = [], [], []
+    point_elevations = None
+    if args.mesh_file:
+        # 从SHUD网格读取单元质心（降尺度时同时读取单元高程）
+        if args.dem_file:
+            point_ids, lons, lats, point_elevations = read_mesh_points(args.mesh_file, args.mesh_crs, with_elevation=True)
+        else:
+            point_ids, lons, lats = read_mesh_points(args.mesh_file, args.mesh_crs)
+    elif args.shp_file:
+        # 从shapefile批量读取点
+        point_ids, lons, lats = read_shapefile_coordinates(args.shp_file, args.shp_point)
+    elif args.points:
+        # 从命令行参数读取点
+        user_points = parse_point_list(args.points)
+        point_ids = [p["id"] for p in user_points]
+        lons = [p["lon"] for p in user_points]
+        lats = [p["lat"] for p in user_points]
+    return point_ids, lons, lats, point_elevations
+
+def plan_forcing_cells(args, point_ids, lons, lats, point_elevations, nc_file, product):
+    """将点对齐到格点并合并为唯一格点，返回(用户点, 提取格点, 输出站点, 降尺度站点或None)"""
+    # 找到最接近研究点的GLDAS格点
+    gldas_points = snap_points_to_grid(point_ids, lons, lats, nc_file)
+    
+    # 合并落在同一格点的点，只对唯一格点提取数据
+    forcing_cells = build_forcing_cells(gldas_points)
+    
+    # 高程降尺度: 按(格点, 高程带)划分气象驱动站点
+    sites = None
+    if args.dem_file:
+        print(f"从DEM读取高程: {args.dem_file}")
+        if point_elevations is None:
+            point_elevations = sample_raster(args.dem_file, lons, lats)
+        cell_elev = cell_elevations(args.dem_file, [c["lon"] for c in forcing_cells],
+                                    [c["lat"] for c in forcing_cells], product["resolution"])
+        sites = build_elevation_sites(gldas_points, forcing_cells, point_elevations, cell_elev, args.elevation_band)
+    return gldas_points, forcing_cells, sites or forcing_cells, sites
+
+def write_forcing_outputs(args, dirs, cache_files, gldas_points, output_cells, sites, product, since=None):
+    """从缓存文件生成驱动文件、配置文件和SHUD项目，返回退出码
+
+    指定since时为监视模式的增量刷新: 只处理since之后的数据并向CSV追加新的时间步，
+    不重写NetCDF/Arrow文件和不随时间变化的输出（meteo.tsd.forc、位置文件、.sp.att、对应关系图）。
+    """
+    # 偏差校正: 读取站点位置，拟合时与驱动格点关联
+    bias = None
+    if args.bias_correct:
+        stations = None
+        if args.stations_file:
+            stations = points_from_arrays(*read_shapefile_coordinates(args.stations_file))
+        bias = {"cells": output_cells, "resolution": product["resolution"], "stations": stations,
+                "obs_file": args.obs_file, "refit": args.bias_refit}
+    
+    # NetCDF输出: 所有驱动站点写入一个文件（增量刷新时不重写）
+    netcdf = None
+    if args.output_format != "csv" and since is None:
+        netcdf = {"nc_file": os.path.join(args.output_dir, "forcing.nc"), "cells": output_cells,
+                  "write_csv": args.output_format == "both"}
+    
+    arrow = None
+    if args.arrow and since is None:
+        arrow = {"arrow_file": os.path.join(args.output_dir, "forcing.arrow"), "layout": args.arrow}
+    
+    # 从缓存文件生成CSV（多个年份按时间拼接为一个驱动文件）
+    if not process_cache_to_csv(cache_files, dirs["csv"], args.force,
+                                parse_time_step(args.time_step), args.temp_extremes,
+                                args.output_dir, args.max_gap_steps, args.qc_mask, args.derived,
+                                sites, args.lapse_rate, bias, args.append, netcdf, arrow, since):
+        print("错误: 没有成功创建CSV文件")
+        return 1
+    
+    if since is not None:
+        # 硬链接或符号链接的项目文件就是csv/中的文件，追加的数据已经可见，不需要重新同步和计算哈希
+        manifest = load_manifest(os.path.join(args.output_dir, "shud_project"))
+        if not manifest or any(entry["mode"] not in ("hardlink", "symlink") for entry in manifest.values()):
+            prepare_shud_project(args.output_dir, args.link_mode)
+        print(f"驱动文件已刷新: {dirs['csv']}")
+        return 0
+    
+    # 创建meteo.tsd.forc文件
+    create_meteotsd_file(dirs["csv"], output_cells, args.output_dir)
+    
+    # 创建点位置信息文件
+    create_point_locations_file(output_cells, args.output_dir)
+    
+    # 创建点与格点对应关系文件
+    create_point_cell_map_file(gldas_points, args.output_dir)
+    
+    # 网格模式: 将气象驱动序号写入.sp.att的FORC列
+    if args.mesh_file:
+        att_file = args.att_file or default_att_file(args.mesh_file)
+        write_shud_att_forc(att_file,
+                            [int(p["original_id"]) for p in gldas_points],
+                            [p["forc"] for p in gldas_points])
+    
+    # 保存点对应关系图
+    save_points_map(gldas_points, args.output_dir)
+    
+    # 准备SHUD项目（只输出NetCDF时没有CSV驱动文件，SHUD无法直接运行，不组装项目）
+    write_csv = args.output_format != "netcdf"
+    if write_csv:
+        prepare_shud_project(args.output_dir, args.link_mode)
+    else:
+        print("只输出了NetCDF，未创建SHUD项目；需要时先运行 netcdf_to_csv.py 生成CSV，再运行 assemble_projects.py")
+    
+    outputs = ["meteo.tsd.forc - SHUD气象配置文件"]
+    if write_csv:
+        outputs.append("csv/ - 各格点的气象数据")
+    if netcdf:
+        outputs.append("forcing.nc - 所有格点的NetCDF驱动数据")
+    outputs += ["meteo_locations.csv - 气象格点位置信息",
+                "meteo_point_map.csv - 点与气象格点对应关系",
+                "fig/meteo_points_map.png - 点对应关系图",
+                "gap_report.csv, gap_times.csv - 缺测插补报告",
+                "qc_summary.csv - 质量控制汇总表"]
+    if write_csv:
+        outputs.append("shud_project/ - 可直接使用的SHUD模型项目")
+    
+    print("==============================================")
+    print("GLDAS数据处理完成!")
+    print(f"SHUD气象驱动数据已保存在 {args.output_dir} 目录")
+    for idx, line in enumerate(outputs):
+        print(f"{idx + 1}. {line}")
+    print("==============================================")
+    
+    return 0
+
+def _stop_watching(signum, frame):
+    """SIGTERM与Ctrl+C一样结束监视"""
+    raise KeyboardInterrupt
+
+def refresh_window_start(csv_dir, cells, time_step=None):
+    """增量刷新需要重新处理的开始时间: 已有驱动文件中最早的最后时间步减去上下文天数
+
+    按输出时间步长对齐，使聚合的时间块与完整处理时一致；有驱动文件不存在时返回None（需要完整处理）。
+    """
+    csv_files = [os.path.join(csv_dir, f"{cell['id']}.csv") for cell in cells]
+    if not csv_files or not all(os.path.exists(f) for f in csv_files):
+        return None
+    last_time = min(read_last_forcing_time(f) for f in csv_files)
+    since = last_time - pd.Timedelta(days=REFRESH_CONTEXT_DAYS)
+    if time_step:
+        since = since.floor(f"{time_step}s")
+    return since
+
+def watch_new_files(args, dirs, product, nc4_files, known_files, forcing_cells, gldas_points, output_cells, sites):
+    """监视数据目录，增量提取新到达的文件，并按固定间隔刷新驱动数据（Ctrl+C或SIGTERM结束）"""
+    watch_dirs = [args.data_dir, os.path.join(args.data_dir, "downloads")]
+    print(f"开始监视: {', '.join(watch_dirs)}（每{args.poll_seconds:g}秒扫描一次，"
+          f"文件稳定{args.settle_seconds:g}秒后提取，最短每{args.refresh_minutes:g}分钟刷新驱动文件）")
+    
+    # 之后的刷新只向已有的驱动文件追加新的时间步，偏差校正使用已缓存的传递函数
+    args.append = True
+    args.force = False
+    args.bias_refit = False
+    processed = list(nc4_files)
+    pending = 0
+    last_refresh = time.time()
+    signal.signal(signal.SIGTERM, _stop_watching)
+    
+    # 只输出NetCDF时没有可追加的CSV，每次刷新都完整重写；否则NetCDF/Arrow文件在结束监视时重写一次
+    full_outputs = args.output_format != "csv" or bool(args.arrow)
+    stale = False
+    
+    def refresh(final=False):
+        nonlocal stale
+        since = None
+        if args.output_format != "netcdf" and not (final and full_outputs):
+            since = refresh_window_start(dirs["csv"], output_cells, parse_time_step(args.time_step))
+        years = group_files_by_year(processed)
+        cache_files = [os.path.join(dirs["cache"], f"{product['cache_prefix']}-{year}-points.cache.npz")
+                       for year in sorted(years) if since is None or year >= since.year]
+        write_forcing_outputs(args, dirs, [f for f in cache_files if os.path.exists(f)],
+                              gldas_points, output_cells, sites, product, since)
+        stale = since is not None and full_outputs
+    
+    try:
+        for new_files in watch_directories(watch_dirs, product["file_pattern"], known_files,
+                                           args.poll_seconds, args.settle_seconds):
+            if new_files:
+                new_files = filter_files_by_date(new_files, args.start_date, args.end_date)
+            if new_files:
+                print(f"发现{len(new_files)}个新文件，增量提取...")
+                processed = sorted(processed + new_files)
+                years = group_files_by_year(processed)
+                for year in sorted(group_files_by_year(new_files)):
+                    extract_points_to_cache(years[year], year, dirs["cache"], forcing_cells, False,
+                                            args.checkpoint_every, args.max_attempts, product,
+                                            optional=bool(args.derived), incremental=True)
+                pending += len(new_files)
+            
+            # 按刷新间隔更新驱动文件，避免每个文件都重写输出
+            if pending and time.time() - last_refresh >= args.refresh_minutes * 60:
+                print(f"刷新驱动文件（{pending}个新文件）...")
+                refresh()
+                pending = 0
+                last_refresh = time.time()
+    except KeyboardInterrupt:
+        print("停止监视")
+        if pending or stale:
+            print(f"刷新驱动文件（{pending}个新文件）..." if pending else "重写NetCDF/Arrow驱动文件...")
+            refresh(final=True)
+    return 0
+
 def main():
     """主函数"""
     # 解析命令行参数
@@ -606,36 +1048,33 @@ def main():
     # 创建目录结构
     dirs = create_directories(args.output_dir)
     
-    # 获取用户指定的点
-    user_points = []
-    if args.shp_file:
-        # 从shapefile读取点
-        user_points = read_points_from_shapefile(args.shp_file)
-    elif args.points:
-        # 从命令行参数读取点
-        user_points = parse_point_list(args.points)
+    # 获取用户指定的点（ID和坐标数组）
+    point_ids, lons, lats, point_elevations = read_input_points(args)
     
-    if not user_points:
-        print("错误: 没有提供有效的坐标点。请使用--shp-file或--points指定坐标点。")
+    if len(point_ids) == 0:
+        print("错误: 没有提供有效的坐标点。请使用--mesh-file、--shp-file或--points指定坐标点。")
         return 1
     
-    print(f"找到{len(user_points)}个坐标点")
+    print(f"找到{len(point_ids)}个坐标点")
     
     # 获取所有NC4文件
     print("搜索GLDAS数据文件...")
-    nc4_files = get_nc4_files(args.data_dir)
-    if not nc4_files:
+    product = get_product(args.product)
+    print(f"数据产品: {product['name']} ({product['description']})")
+    all_files = get_nc4_files(args.data_dir, product["file_pattern"])
+    if not all_files:
         print("错误: 没有找到NC4文件，退出")
         return 1
     
     # 按日期过滤文件
-    nc4_files = filter_files_by_date(nc4_files, args.start_date, args.end_date)
+    nc4_files = filter_files_by_date(all_files, args.start_date, args.end_date)
     if not nc4_files:
         print("错误: 过滤后没有文件符合日期范围要求")
         return 1
     
-    # 找到最接近研究点的GLDAS格点
-    gldas_points = find_nearest_gldas_points(user_points, nc4_files[0])
+    # 对齐格点、合并唯一格点（降尺度时划分高程带站点）
+    gldas_points, forcing_cells, output_cells, sites = plan_forcing_cells(
+        args, point_ids, lons, lats, point_elevations, nc4_files[0], product)
     
     # 按年份分组
     year_groups = group_files_by_year(nc4_files)
@@ -645,7 +1084,9 @@ def main():
     cache_files = []
     for year, files in year_groups.items():
         print(f"处理{year}年的数据...")
-        cache_file = extract_points_to_cache(files, year, dirs["cache"], gldas_points, args.force)
+        cache_file = extract_points_to_cache(files, year, dirs["cache"], forcing_cells, args.force,
+                                             args.checkpoint_every, args.max_attempts, product,
+                                             optional=bool(args.derived), incremental=args.append)
         if cache_file:
             cache_files.append(cache_file)
     
@@ -653,39 +1094,13 @@ def main():
         print("错误: 没有成功创建缓存文件")
         return 1
     
-    # 从缓存文件生成CSV
-    csv_success = False
-    for cache_file in cache_files:
-        result = process_cache_to_csv(cache_file, dirs["csv"], args.force)
-        csv_success = csv_success or result
-    
-    if not csv_success:
-        print("错误: 没有成功创建CSV文件")
-        return 1
-    
-    # 创建meteo.tsd.forc文件
-    create_meteotsd_file(dirs["csv"], gldas_points, args.output_dir)
-    
-    # 创建点位置信息文件
-    create_point_locations_file(gldas_points, args.output_dir)
-    
-    # 保存点对应关系图
-    save_points_map(gldas_points, args.output_dir)
-    
-    # 准备SHUD项目
-    prepare_shud_project(args.output_dir)
+    exit_code = write_forcing_outputs(args, dirs, cache_files, gldas_points, output_cells, sites, product)
     
-    print("==============================================")
-    print("GLDAS数据处理完成!")
-    print(f"SHUD气象驱动数据已保存在 {args.output_dir} 目录")
-    print(f"1. meteo.tsd.forc - SHUD气象配置文件")
-    print(f"2. csv/ - 各点的气象数据")
-    print(f"3. meteo_locations.csv - 气象点位置信息")
-    print(f"4. fig/meteo_points_map.png - 点对应关系图")
-    print(f"5. shud_project/ - 可直接使用的SHUD模型项目")
-    print("==============================================")
-    
-    return 0
+    # 监视模式: 已有的文件都视为已处理，之后只提取新到达的文件
+    if exit_code == 0 and args.watch:
+        return watch_new_files(args, dirs, product, nc4_files, set(all_files),
+                               forcing_cells, gldas_points, output_cells, sites)
+    return exit_code
 
 if __name__ == "__main__":
     try:
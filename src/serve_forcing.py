@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地点位驱动数据服务
+功能:
+1. 启动一个常驻的本地HTTP服务，任意坐标的GLDAS驱动序列无需每次重新运行命令行工具
+2. 文件目录、格点坐标轴、打开的数据集和已读取的格点序列常驻内存，已缓存格点的查询为毫秒级
+3. 返回SHUD单位的JSON或SHUD格式驱动文本，支持多点批量查询
+"""
+
+import argparse
+
+from ldas_products import PRODUCTS, DEFAULT_PRODUCT
+from shud_service import PointForcingService, serve
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="启动本地点位驱动数据HTTP服务")
+    parser.add_argument("--data-dir", default="data/gldas_data", help="GLDAS数据目录（同时查找downloads子目录）")
+    parser.add_argument("--product", choices=sorted(PRODUCTS), default=DEFAULT_PRODUCT, help="LDAS数据产品")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认只接受本机访问")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--max-open-files", type=int, default=64, help="保持打开的数据集数量上限")
+    parser.add_argument("--cache-mb", type=int, default=512, help="格点序列缓存的内存上限(MB)")
+    return parser.parse_args()
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    service = PointForcingService(args.data_dir, args.product, args.max_open_files, args.cache_mb * 1024 * 1024)
+    serve(service, args.host, args.port)
+    return 0
+
+if __name__ == "__main__":
+    try:
+        exit_code = main()
+        exit(exit_code)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        exit(1)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SHUD气象驱动数据的Arrow IPC/Feather导出
+功能:
+1. 直接从内存中的[点, 时间, 列]数据立方体写出Arrow IPC文件（Feather V2），不经过DataFrame
+2. 长表(long)每行一个(点, 时间)，宽表(wide)每行一个时间、每个(列, 点)一列；
+   时间列为timestamp类型，点ID列为字典编码
+3. 分批写出且不压缩，pandas/polars/pyarrow可用内存映射直接打开多GB的驱动数据
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+# 每个记录批次的目标数值个数，限制写出时的额外内存
+ARROW_BATCH_ROWS = 1 << 20
+
+ARROW_LAYOUTS = ["long", "wide"]
+
+def _import_pyarrow():
+    """导入pyarrow（导出Arrow文件需要）"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError("导出Arrow/Feather文件需要pyarrow，请先安装: pip install pyarrow")
+    return pyarrow
+
+def wide_column_name(column, point_id):
+    """宽表中(列, 点)对应的列名，如Precip_X10.375Y43.125"""
+    return f"{column}_{point_id}"
+
+def _schema_metadata(columns, layout, time_step):
+    """写入文件的元数据"""
+    return {
+        "source": "GLDAS2SHUD",
+        "layout": layout,
+        "shud_columns": " ".join(columns),
+        "time_step_seconds": str(int(time_step or 0)),
+    }
+
+def write_forcing_arrow(arrow_file, times, values, point_ids, columns, layout="long", time_step=None):
+    """将[点, 时间, 列]驱动数据写入Arrow IPC文件，返回写出的行数"""
+    pa = _import_pyarrow()
+    if layout not in ARROW_LAYOUTS:
+        raise ValueError(f"未知的Arrow表格布局 '{layout}'，可用: {', '.join(ARROW_LAYOUTS)}")
+
+    n_points, n_times, n_columns = values.shape
+    t64 = pd.DatetimeIndex(times).values.astype("datetime64[s]")
+    if time_step is None:
+        time_step = int((t64[1] - t64[0]).astype(np.int64)) if n_times > 1 else 0
+    metadata = _schema_metadata(columns, layout, time_step)
+
+    if layout == "long":
+        point_type = pa.dictionary(pa.int32(), pa.string())
+        fields = [pa.field("point_id", point_type), pa.field("time", pa.timestamp("s"))]
+        fields += [pa.field(column, pa.float64()) for column in columns]
+        schema = pa.schema(fields, metadata=metadata)
+        dictionary = pa.array([str(p) for p in point_ids], type=pa.string())
+        step = max(1, ARROW_BATCH_ROWS // max(n_times, 1))
+        with pa.ipc.new_file(arrow_file + ".tmp", schema) as writer:
+            for p0 in range(0, n_points, step):
+                p1 = min(p0 + step, n_points)
+                block = values[p0:p1]
+                indices = np.repeat(np.arange(p0, p1, dtype=np.int32), n_times)
+                arrays = [pa.DictionaryArray.from_arrays(indices, dictionary), pa.array(np.tile(t64, p1 - p0))]
+                arrays += [pa.array(block[:, :, c].ravel()) for c in range(n_columns)]
+                writer.write_batch(pa.record_batch(arrays, schema=schema))
+        n_rows = n_points * n_times
+    else:
+        # 宽表每行一个时间步，列按(列, 点)展开，按时间分批
+        names = [wide_column_name(column, p) for column in columns for p in point_ids]
+        fields = [pa.field("time", pa.timestamp("s"))] + [pa.field(name, pa.float64()) for name in names]
+        schema = pa.schema(fields, metadata=metadata)
+        step = max(1, ARROW_BATCH_ROWS // max(len(names), 1))
+        with pa.ipc.new_file(arrow_file + ".tmp", schema) as writer:
+            for t0 in range(0, n_times, step):
+                t1 = min(t0 + step, n_times)
+                arrays = [pa.array(t64[t0:t1])]
+                arrays += [pa.array(values[p, t0:t1, c]) for c in range(n_columns) for p in range(n_points)]
+                writer.write_batch(pa.record_batch(arrays, schema=schema))
+        n_rows = n_times
+    os.replace(arrow_file + ".tmp", arrow_file)
+
+    print(f"Arrow驱动文件已保存至: {arrow_file}（{layout}布局，{n_rows}行）")
+    return n_rows
+
+def open_forcing_arrow(arrow_file):
+    """以内存映射方式打开Arrow驱动文件，返回pyarrow.Table（数据不复制到内存）"""
+    pa = _import_pyarrow()
+    source = pa.memory_map(arrow_file, "r")
+    return pa.ipc.open_file(source).read_all()
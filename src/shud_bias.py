@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基于站点观测的经验分位数映射(Quantile Mapping)偏差校正
+功能:
+1. 按站点、驱动列和月份拟合经验分位数映射，每个月份的所有站点一次向量化计算分位数
+2. 传递函数（驱动和观测的分位数表）缓存为npz文件，日常更新时只执行校正步骤
+3. 对所有关联格点的驱动数据一次性校正: 所有(站点, 月份)的分位数表拼接为一个单调序列，
+   一次插值完成整个数据立方体的映射
+4. 观测步长比驱动步长长时（如日观测），按时间块平均值校正，再将差值或比值分配到块内各时间步
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from shud_resample import native_time_step
+from shud_stations import (read_observations, link_stations, representative_series,
+                           block_means, common_step, align_series)
+
+# 分位数映射使用的分位点
+QM_QUANTILES = np.linspace(0.0, 1.0, 51)
+# 每个站点每个月份拟合所需的最少配对样本数，不足时该月不校正
+QM_MIN_SAMPLES = 20
+
+# 各驱动列的校正方式:
+#   kind - delta为加性校正（超出拟合范围时保持边缘的差值），
+#          ratio为乘性校正（超出范围时保持边缘的比值，0保持为0）
+#   min/max - 校正后的取值范围
+BIAS_RULES = {
+    "Precip": {"kind": "ratio", "min": 0.0},
+    "Temp": {"kind": "delta"},
+    "RH": {"kind": "delta", "min": 0.1, "max": 1.0},
+    "Wind": {"kind": "ratio", "min": 0.0},
+    "RADN": {"kind": "ratio", "min": 0.0},
+}
+
+def bias_transfer_file(cache_files):
+    """传递函数文件路径: 与缓存文件在同一目录，使用相同的产品前缀"""
+    first = cache_files[0] if isinstance(cache_files, (list, tuple)) else cache_files
+    prefix = os.path.basename(first).split("-")[0]
+    return os.path.join(os.path.dirname(first), f"{prefix}-bias-qm.npz")
+
+def fit_quantile_mapping(model, obs, times):
+    """对[站点, 时间块, 列]的配对数据按月份拟合分位数表
+
+    返回(驱动分位数, 观测分位数, 样本数)，形状分别为[站点, 列, 12, 分位点]和[站点, 列, 12]，
+    样本不足的(站点, 列, 月份)分位数为NaN。
+    """
+    n_stations, _, n_cols = model.shape
+    months = np.asarray(pd.DatetimeIndex(times).month) - 1
+    model_q = np.full((n_stations, n_cols, 12, len(QM_QUANTILES)), np.nan)
+    obs_q = np.full_like(model_q, np.nan)
+    samples = np.zeros((n_stations, n_cols, 12), dtype=np.int64)
+
+    for month in np.unique(months):
+        # 每个月份对所有站点和列一次计算分位数
+        in_month = months == month
+        model_month = model[:, in_month]
+        obs_month = obs[:, in_month]
+        count = np.isfinite(model_month).sum(axis=1)
+        enough = count >= QM_MIN_SAMPLES
+        samples[:, :, month] = count
+        if not enough.any():
+            continue
+        with np.errstate(invalid="ignore"):
+            mq = np.nanquantile(np.where(enough[:, None], model_month, np.nan), QM_QUANTILES, axis=1)
+            oq = np.nanquantile(np.where(enough[:, None], obs_month, np.nan), QM_QUANTILES, axis=1)
+        model_q[:, :, month] = np.moveaxis(mq, 0, -1)
+        obs_q[:, :, month] = np.moveaxis(oq, 0, -1)
+
+    return model_q, obs_q, samples
+
+def save_transfer(transfer_file, transfer):
+    """保存传递函数"""
+    np.savez_compressed(transfer_file, **{k: np.asarray(v) for k, v in transfer.items()})
+    print(f"偏差校正传递函数已保存至: {transfer_file}")
+
+def load_transfer(transfer_file):
+    """读取传递函数"""
+    with np.load(transfer_file) as data:
+        transfer = {k: data[k] for k in data.files}
+    transfer["station_ids"] = [str(s) for s in transfer["station_ids"]]
+    transfer["columns"] = [str(c) for c in transfer["columns"]]
+    transfer["step"] = int(transfer["step"])
+    return transfer
+
+def map_values(values, groups, model_q, obs_q, kind):
+    """按分位数表映射数值
+
+    values和groups为同形状数组，groups为每个值使用的分位数表序号，
+    model_q/obs_q为[表数, 分位点]。所有表平移到互不重叠的区间后拼接为一个单调序列，
+    整个数组只需一次np.interp。
+    """
+    valid_tables = np.all(np.isfinite(model_q) & np.isfinite(obs_q), axis=1)
+    lower, upper = model_q[:, 0], model_q[:, -1]
+    low = np.nanmin(lower[valid_tables])
+    span = np.nanmax(upper[valid_tables]) - low + 1.0
+
+    offsets = np.arange(len(model_q)) * span
+    xp = np.where(valid_tables[:, None], model_q - low, 0.0) + offsets[:, None]
+    fp = np.where(valid_tables[:, None], obs_q, 0.0)
+
+    clipped = np.clip(values, lower[groups], upper[groups])
+    mapped = np.interp(clipped - low + offsets[groups], xp.ravel(), fp.ravel())
+
+    # 超出拟合范围的部分保持边缘的差值或比值
+    if kind == "ratio":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corrected = np.where(clipped > 0, mapped * values / clipped, mapped)
+        corrected = np.where(values == 0, 0.0, corrected)
+    else:
+        corrected = mapped + (values - clipped)
+
+    # 没有传递函数的表和缺测值保持不变
+    keep = ~valid_tables[groups] | ~np.isfinite(values)
+    return np.where(keep, values, corrected)
+
+def apply_quantile_mapping(values, times, columns, transfer, series_station):
+    """对[序列, 时间, 列]驱动数据做分位数映射校正（原地修改），返回被校正的序列数
+
+    series_station为每个序列使用的站点序号（-1为不校正）。
+    """
+    rows = np.flatnonzero(series_station >= 0)
+    if len(rows) == 0:
+        return 0
+
+    stations = series_station[rows]
+    step = transfer["step"]
+    native = native_time_step(times)
+    if native > step:
+        print(f"  警告: 驱动步长{native}秒大于拟合步长{step}秒，直接按分位数表校正")
+    for t_col, column in enumerate(transfer["columns"]):
+        if column not in columns:
+            continue
+        rule = BIAS_RULES[column]
+        col_idx = list(columns).index(column)
+        model_q = transfer["model_q"][:, t_col].reshape(-1, len(QM_QUANTILES))
+        obs_q = transfer["obs_q"][:, t_col].reshape(-1, len(QM_QUANTILES))
+        if not np.all(np.isfinite(model_q) & np.isfinite(obs_q), axis=1).any():
+            continue
+
+        series = values[rows, :, col_idx]
+        if step > native:
+            # 按时间块平均值校正，再把块的差值或比值分配到块内每个时间步
+            means, starts, block_of_time = block_means(series[:, :, None], times, step)
+            means = means[:, :, 0]
+            months = np.asarray(starts.month) - 1
+            groups = stations[:, None] * 12 + months[None, :]
+            corrected = map_values(means, groups, model_q, obs_q, rule["kind"])
+            if rule["kind"] == "ratio":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    factor = np.where(means > 0, corrected / means, 1.0)
+                series = series * factor[:, block_of_time]
+            else:
+                series = series + (corrected - means)[:, block_of_time]
+        else:
+            months = np.asarray(pd.DatetimeIndex(times).month) - 1
+            groups = stations[:, None] * 12 + months[None, :]
+            series = map_values(series, groups, model_q, obs_q, rule["kind"])
+
+        values[rows, :, col_idx] = np.clip(series, rule.get("min", -np.inf), rule.get("max", np.inf))
+
+    return len(rows)
+
+def fit_bias_correction(values, times, columns, cells, stations, obs_file, resolution):
+    """用观测数据拟合传递函数，返回传递函数字典（没有可用站点时返回None）"""
+    station_ids = [s["id"] for s in stations]
+    fit_columns = [c for c in columns if c in BIAS_RULES]
+    obs, obs_times, obs_columns = read_observations(obs_file, station_ids, fit_columns)
+
+    station_cell, cell_of_series, n_cells = link_stations(
+        [s["lon"] for s in stations], [s["lat"] for s in stations], cells, resolution)
+    fit_series = representative_series(cell_of_series, cells, n_cells)
+    linked = np.flatnonzero(station_cell >= 0)
+    if len(linked) == 0:
+        print("警告: 没有站点位于驱动格点内，跳过偏差校正")
+        return None
+
+    # 每个站点与其所在格点的代表序列配对，按共同时间步长对齐
+    col_idx = [list(columns).index(c) for c in obs_columns]
+    model = values[fit_series[station_cell[linked]]][:, :, col_idx]
+    step = common_step(native_time_step(times), native_time_step(obs_times))
+    model_blocks, obs_blocks, block_times = align_series(model, times, obs[linked], obs_times, step)
+    print(f"拟合分位数映射: {len(linked)}个站点，{len(block_times)}个共同时间步（步长{step}秒）")
+
+    model_q = np.full((len(stations), len(obs_columns), 12, len(QM_QUANTILES)), np.nan)
+    obs_q = np.full_like(model_q, np.nan)
+    samples = np.zeros((len(stations), len(obs_columns), 12), dtype=np.int64)
+    model_q[linked], obs_q[linked], samples[linked] = fit_quantile_mapping(model_blocks, obs_blocks, block_times)
+
+    fitted = np.all(np.isfinite(model_q), axis=-1)
+    for c_idx, column in enumerate(obs_columns):
+        print(f"  {column}: {int(fitted[:, c_idx].any(axis=1).sum())}个站点，"
+              f"{int(fitted[:, c_idx].sum())}个(站点, 月份)组合")
+
+    return {
+        "station_ids": np.asarray(station_ids, dtype=str),
+        "lons": np.array([s["lon"] for s in stations], dtype=float),
+        "lats": np.array([s["lat"] for s in stations], dtype=float),
+        "columns": np.asarray(obs_columns, dtype=str),
+        "quantiles": QM_QUANTILES,
+        "model_q": model_q,
+        "obs_q": obs_q,
+        "samples": samples,
+        "step": step,
+        "obs_file": os.path.abspath(obs_file),
+    }
+
+def bias_correct_cube(values, times, columns, cells, transfer_file, resolution,
+                      stations=None, obs_file=None, refit=False):
+    """偏差校正: 有缓存的传递函数时直接校正，否则先用观测数据拟合并缓存（原地修改values）"""
+    if os.path.exists(transfer_file) and not refit:
+        print(f"使用已缓存的偏差校正传递函数: {transfer_file}")
+        transfer = load_transfer(transfer_file)
+    else:
+        if not stations or not obs_file:
+            print("警告: 没有缓存的传递函数，也没有提供站点和观测数据，跳过偏差校正")
+            return values
+        transfer = fit_bias_correction(values, times, columns, cells, stations, obs_file, resolution)
+        if transfer is None:
+            return values
+        save_transfer(transfer_file, transfer)
+        transfer = load_transfer(transfer_file)
+
+    # 按当前的驱动格点重新关联站点，格点内的所有驱动序列使用同一站点的传递函数
+    station_cell, cell_of_series, n_cells = link_stations(transfer["lons"], transfer["lats"], cells, resolution)
+    cell_station = np.full(n_cells, -1, dtype=np.int64)
+    linked = np.flatnonzero(station_cell >= 0)
+    # 同一格点有多个站点时使用第一个站点
+    cell_station[station_cell[linked][::-1]] = linked[::-1]
+    series_station = cell_station[cell_of_series]
+
+    n_corrected = apply_quantile_mapping(values, times, columns, transfer, series_station)
+    print(f"偏差校正完成: {n_corrected}个驱动序列，校正列: {', '.join(c for c in transfer['columns'] if c in columns)}")
+    return values
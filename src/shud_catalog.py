@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+LDAS文件目录和格点查找
+功能:
+1. 列出数据目录及downloads子目录中的数据文件，从文件名解析时间（不打开文件）
+2. 读取格点坐标轴，将坐标向量化对齐到最近格点，生成格点驱动文件ID
+3. 只依赖numpy和xarray，命令行工具、ForcingStore和HTTP服务共用，导入时不加载绘图和GIS库
+"""
+
+import os
+import re
+import glob
+import numpy as np
+import xarray as xr
+from datetime import datetime
+
+def get_nc4_files(data_dir, pattern="*.nc4", verbose=True):
+    """获取所有NC4文件并按时间排序（verbose为False时不打印文件数）"""
+    files = []
+    
+    # 首先尝试在根目录查找NC4文件
+    root_files = glob.glob(os.path.join(data_dir, pattern))
+    files.extend(root_files)
+    
+    # 然后尝试在downloads子目录查找
+    downloads_dir = os.path.join(data_dir, "downloads")
+    if os.path.exists(downloads_dir):
+        downloads_files = glob.glob(os.path.join(downloads_dir, pattern))
+        files.extend(downloads_files)
+    
+    # 按文件名排序
+    files = sorted(files)
+    if verbose:
+        print(f"找到NC4文件总数: {len(files)}")
+    
+    return files
+
+def extract_date_from_filename(filename):
+    """从GLDAS文件名中提取日期时间信息"""
+    # 文件名示例: GLDAS_NOAH025_3H.A20230501.0000.021.nc4
+    base = os.path.basename(filename)
+    
+    # 尝试新格式: GLDAS_YYYYMMDD_HHMM.nc4
+    match = re.match(r'GLDAS_(\d{8})_(\d{4})\.nc4', base)
+    if match:
+        date_str = match.group(1)  # 例如 "20230501"
+        time_str = match.group(2)  # 例如 "0000"
+        
+        # 解析日期和时间
+        year = int(date_str[0:4])
+        month = int(date_str[4:6])
+        day = int(date_str[6:8])
+        hour = int(time_str[0:2])
+        minute = int(time_str[2:4])
+        
+        return datetime(year, month, day, hour, minute)
+    
+    # 尝试旧格式: GLDAS_NOAH025_3H_EP.A20230501.0000.021.nc4
+    match = re.search(r'\.A(\d{8})\.(\d{4})\.', base)
+    if match:
+        date_str = match.group(1)  # 例如 "20230501"
+        time_str = match.group(2)  # 例如 "0000"
+        
+        # 解析日期和时间
+        year = int(date_str[0:4])
+        month = int(date_str[4:6])
+        day = int(date_str[6:8])
+        hour = int(time_str[0:2])
+        minute = int(time_str[2:4])
+        
+        return datetime(year, month, day, hour, minute)
+    
+    return None
+
+def lookup_grid_indices(coords, grid):
+    """在排序的格点坐标轴上查找最近格点的索引（向量化，等距时取较小索引，与argmin一致）"""
+    coords = np.asarray(coords, dtype=float)
+    grid = np.asarray(grid, dtype=float)
+    
+    # 降序坐标轴先翻转
+    descending = grid[0] > grid[-1]
+    if descending:
+        grid = grid[::-1]
+    
+    idx = np.clip(np.searchsorted(grid, coords), 1, len(grid) - 1)
+    left = grid[idx - 1]
+    right = grid[idx]
+    idx = idx - ((coords - left) <= (right - coords))
+    
+    if descending:
+        idx = len(grid) - 1 - idx
+    return idx
+
+def read_grid_axes(nc_file):
+    """读取NC文件的经纬度坐标轴"""
+    with xr.open_dataset(nc_file) as ds:
+        lats = ds.lat.values
+        lons = ds.lon.values
+    return lats, lons
+
+def format_cell_id(lon, lat):
+    """根据格点坐标生成气象驱动文件ID，例如 X11.125Y43.625"""
+    return f"X{round(float(lon), 4)}Y{round(float(lat), 4)}"
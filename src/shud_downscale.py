@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基于高程的气温和气压降尺度
+功能:
+1. 从DEM栅格一次性批量采样点高程和GLDAS格点的平均高程
+2. 按(GLDAS格点, 高程带)将点合并为气象驱动站点，同一格点内高程相近的点共用一个驱动文件
+3. 按每个站点与所属格点的高差预先计算气温(递减率)和气压(压高公式)的修正量，
+   广播到整个时间轴上，计算量只与站点数有关
+"""
+
+import numpy as np
+
+# 重力加速度(m s-2)和干空气气体常数(J kg-1 K-1)
+GRAVITY = 9.80665
+R_DRY = 287.05
+# 默认气温递减率(K/m)
+DEFAULT_LAPSE_RATE = 0.0065
+
+def _open_raster(raster_file):
+    """打开栅格文件（需要rasterio）"""
+    try:
+        import rasterio
+    except ImportError:
+        raise ImportError("读取DEM需要rasterio，请先安装: pip install rasterio")
+    return rasterio.open(raster_file)
+
+def _to_raster_crs(src, lons, lats):
+    """将经纬度转换到栅格的坐标系"""
+    if src.crs is None or src.crs.is_geographic:
+        return np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)
+    from pyproj import Transformer
+    transformer = Transformer.from_crs("EPSG:4326", src.crs.to_wkt(), always_xy=True)
+    xs, ys = transformer.transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    return np.asarray(xs), np.asarray(ys)
+
+def sample_raster(raster_file, lons, lats):
+    """批量采样栅格在各经纬度位置的值，只读取包含所有点的窗口，范围外或无数据时为NaN"""
+    from rasterio.windows import Window
+
+    lons = np.asarray(lons, dtype=float)
+    values = np.full(lons.shape, np.nan)
+    if lons.size == 0:
+        return values
+
+    with _open_raster(raster_file) as src:
+        xs, ys = _to_raster_crs(src, lons, lats)
+        cols, rows = ~src.transform * (xs, ys)
+        rows = np.floor(rows).astype(np.int64)
+        cols = np.floor(cols).astype(np.int64)
+        inside = (rows >= 0) & (rows < src.height) & (cols >= 0) & (cols < src.width)
+        if not inside.any():
+            return values
+
+        row0, row1 = rows[inside].min(), rows[inside].max() + 1
+        col0, col1 = cols[inside].min(), cols[inside].max() + 1
+        window = src.read(1, window=Window(col0, row0, col1 - col0, row1 - row0), masked=True)
+        data = window.filled(np.nan).astype(float)
+
+    values[inside] = data[rows[inside] - row0, cols[inside] - col0]
+    return values
+
+def cell_elevations(raster_file, cell_lons, cell_lats, resolution, samples=5):
+    """计算每个GLDAS格点范围内的平均高程（在格点内均匀采样samples x samples个位置）"""
+    cell_lons = np.asarray(cell_lons, dtype=float)
+    cell_lats = np.asarray(cell_lats, dtype=float)
+    offsets = ((np.arange(samples) + 0.5) / samples - 0.5) * resolution
+    dx, dy = np.meshgrid(offsets, offsets)
+
+    lons = (cell_lons[:, None] + dx.ravel()[None, :]).ravel()
+    lats = (cell_lats[:, None] + dy.ravel()[None, :]).ravel()
+    sampled = sample_raster(raster_file, lons, lats).reshape(len(cell_lons), -1)
+
+    with np.errstate(invalid="ignore"):
+        valid = np.isfinite(sampled)
+        return np.where(valid.any(axis=1),
+                        np.where(valid, sampled, 0.0).sum(axis=1) / np.maximum(valid.sum(axis=1), 1),
+                        np.nan)
+
+def build_elevation_sites(gldas_points, cells, point_elevations, cell_elevation, band=100.0):
+    """按(所属格点, 高程带)将点合并为气象驱动站点
+
+    返回站点列表（按首次出现的顺序），并将每个点的forc和cell_id更新为所属站点。
+    高程未知的点使用格点高程（不做修正）。
+    """
+    cell_of_point = np.array([p["forc"] - 1 for p in gldas_points], dtype=np.int64)
+    cell_elevation = np.asarray(cell_elevation, dtype=float)
+    elevations = np.asarray(point_elevations, dtype=float)
+    elevations = np.where(np.isfinite(elevations), elevations, cell_elevation[cell_of_point])
+
+    # 高程带编号（低于海平面时为负数）；格点高程也未知时不分带，单独标记而不占用带号
+    known = np.isfinite(elevations)
+    bands = np.where(known, np.floor(np.where(known, elevations, 0.0) / band), 0).astype(np.int64)
+    keys = np.column_stack([cell_of_point, known, bands])
+    _, first_index, inverse, counts = np.unique(keys, axis=0, return_index=True, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+
+    # 按首次出现顺序对站点重新编号
+    order = np.argsort(first_index)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    site_of_point = rank[inverse]
+
+    # 站点高程为其中所有点高程的平均值
+    with np.errstate(invalid="ignore"):
+        site_elevation = np.bincount(site_of_point, weights=np.nan_to_num(elevations), minlength=len(order)) \
+            / np.bincount(site_of_point, minlength=len(order))
+
+    sites = []
+    for site_idx, unique_idx in enumerate(order):
+        first = first_index[unique_idx]
+        cell_idx = int(cell_of_point[first])
+        cell = cells[cell_idx]
+        band_id = f"{int(bands[first] * band)}" if known[first] else "NA"
+        sites.append({
+            "id": f"{cell['id']}Z{band_id}",
+            "lon": cell["lon"],
+            "lat": cell["lat"],
+            "cell_index": cell_idx,
+            "elevation": float(site_elevation[site_idx]) if np.isfinite(cell_elevation[cell_idx]) else np.nan,
+            "cell_elevation": float(cell_elevation[cell_idx]),
+            "n_points": int(counts[unique_idx]),
+        })
+
+    for point, site_idx, elevation in zip(gldas_points, site_of_point, elevations):
+        point["forc"] = int(site_idx) + 1
+        point["cell_id"] = sites[site_idx]["id"]
+        point["elevation"] = float(elevation)
+
+    print(f"{len(gldas_points)}个点按{band:g}米高程带合并为{len(sites)}个气象驱动站点（{len(cells)}个GLDAS格点）")
+    return sites
+
+def downscale_cube(data_array, variables, sites, lapse_rate=DEFAULT_LAPSE_RATE):
+    """将[格点, 时间, 变量]数据展开为[站点, 时间, 变量]并按高差修正气温和气压"""
+    site_cell = np.array([s["cell_index"] for s in sites], dtype=np.int64)
+    dz = np.array([s["elevation"] - s["cell_elevation"] for s in sites], dtype=float)
+    dz = np.where(np.isfinite(dz), dz, 0.0)
+
+    # 按站点所属格点取出数据（每个站点一份，之后原地修正）
+    out = data_array[site_cell]
+    var_index = {str(v): i for i, v in enumerate(variables)}
+
+    if "Tair_f_inst" in var_index:
+        tair = out[:, :, var_index["Tair_f_inst"]]
+        # 压高公式使用格点与站点之间气层的平均气温，每个站点一个值
+        layer_temp = tair.mean(axis=1) - lapse_rate * dz / 2.0
+        tair -= (lapse_rate * dz)[:, None]
+    else:
+        layer_temp = np.full(len(sites), 288.15)
+
+    if "Psurf_f_inst" in var_index:
+        factor = np.exp(-GRAVITY * dz / (R_DRY * layer_temp))
+        out[:, :, var_index["Psurf_f_inst"]] *= factor[:, None]
+
+    print(f"高程降尺度: {len(sites)}个站点，高差范围 {dz.min():.1f} ~ {dz.max():.1f} 米")
+    return out
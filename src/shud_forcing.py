@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SHUD气象驱动数据的单位转换和写出
+功能:
+1. 用一张变量/单位对照表定义GLDAS变量到SHUD驱动列的转换规则；
+   extract_points.py、extract_from_date.py和gldas_to_shud.py各自沿用原有列名和单位的对照表
+2. 对整个[点, 时间, 变量]数据立方体做向量化单位转换（可选numexpr加速）
+3. 读取并拼接多个缓存文件，按SHUD格式写出每个点的驱动文件，并可读回已写出的驱动文件
+4. 向已有驱动文件追加新的时间步，只写入新行并原地改写固定宽度的第一行
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+def convert_to_rh(qair, tair, psurf, out=None):
+    """将比湿转换为相对湿度(0-1)，与AutoSHUD/Rfunction/LDAS_UnitConvert.R的公式一致"""
+    # 0.263为相对湿度计算常数，17.67和29.65来自Bolton饱和水汽压公式
+    if ne is not None:
+        rh = ne.evaluate("0.263 * psurf * qair / exp(17.67 * (tair - 273.15) / (tair - 29.65)) / 100.0")
+    else:
+        rh = 0.263 * psurf * qair / np.exp(17.67 * (tair - 273.15) / (tair - 29.65)) / 100.0
+
+    # 限制在0.1-1.0的范围内
+    return np.clip(rh, 0.1, 1.0, out=out)
+
+# SHUD驱动列的转换规则：
+#   column  - 输出列名
+#   unit    - 输出单位
+#   source  - 需要的GLDAS变量
+#   fallback - 可选，source缺失时依次尝试的其他变量列表
+#   scale/offset - 线性转换: 输出 = 输入 * scale + offset
+#   func    - 非线性转换函数(参数为source中的变量，支持out参数)
+#   default - 缺少变量时使用的常数
+FORCING_TABLE = [
+    {"column": "Precip", "unit": "mm/day", "source": ["Rainf_tavg"], "scale": 86400.0, "offset": 0.0, "default": 0.0},
+    {"column": "Temp", "unit": "C", "source": ["Tair_f_inst"], "scale": 1.0, "offset": -273.15, "default": 15.0},
+    {"column": "RH", "unit": "0-1", "source": ["Qair_f_inst", "Tair_f_inst", "Psurf_f_inst"], "func": convert_to_rh, "default": 0.7},
+    {"column": "VP", "unit": "kPa", "source": ["Psurf_f_inst"], "scale": 0.001, "offset": 0.0, "default": 101.325},
+    {"column": "Wind", "unit": "m/s", "source": ["Wind_f_inst"], "scale": 1.0, "offset": 0.0, "default": 2.0},
+    {"column": "RADN", "unit": "W/m2", "source": ["SWdown_f_tavg"], "scale": 1.0, "offset": 0.0, "default": 0.0},
+]
+
+# extract_points.py和extract_from_date.py原有的驱动文件格式: 列名带单位，没有VP列，
+# 气压为Pa，辐射优先使用净短波辐射（visualize_gldas.py按这些列名读取）
+EXTRACT_TABLE = [
+    {"column": "Precip_mm.d", "unit": "mm/day", "source": ["Rainf_tavg"], "scale": 86400.0, "offset": 0.0, "default": 0.0},
+    {"column": "Temp_C", "unit": "C", "source": ["Tair_f_inst"], "scale": 1.0, "offset": -273.15, "default": 15.0},
+    {"column": "RH_1", "unit": "0-1", "source": ["Qair_f_inst", "Tair_f_inst", "Psurf_f_inst"], "func": convert_to_rh, "default": 0.7},
+    {"column": "Wind_m.s", "unit": "m/s", "source": ["Wind_f_inst"], "scale": 1.0, "offset": 0.0, "default": 2.0},
+    {"column": "RN_w.m2", "unit": "W/m2", "source": ["Swnet_tavg"], "fallback": [["SWdown_f_tavg"]], "scale": 1.0, "offset": 0.0, "default": 0.0},
+    {"column": "Pres_pa", "unit": "Pa", "source": ["Psurf_f_inst"], "scale": 1.0, "offset": 0.0, "default": 101325.0},
+]
+
+# gldas_to_shud.py原有的驱动文件格式: 大写列名，VP为hPa
+GLDAS_TO_SHUD_TABLE = [
+    {"column": "PRCP", "unit": "mm/day", "source": ["Rainf_tavg"], "scale": 86400.0, "offset": 0.0, "default": 0.0},
+    {"column": "TEMP", "unit": "C", "source": ["Tair_f_inst"], "scale": 1.0, "offset": -273.15, "default": 15.0},
+    {"column": "RH", "unit": "0-1", "source": ["Qair_f_inst", "Tair_f_inst", "Psurf_f_inst"], "func": convert_to_rh, "default": 0.7},
+    {"column": "VP", "unit": "hPa", "source": ["Psurf_f_inst"], "scale": 0.01, "offset": 0.0, "default": 1013.25},
+    {"column": "WIND", "unit": "m/s", "source": ["Wind_f_inst"], "scale": 1.0, "offset": 0.0, "default": 2.0},
+    {"column": "RADN", "unit": "W/m2", "source": ["SWdown_f_tavg"], "scale": 1.0, "offset": 0.0, "default": 0.0},
+]
+
+def forcing_columns(table=None):
+    """返回转换表的输出列名"""
+    return [spec["column"] for spec in (table or FORCING_TABLE)]
+
+def convert_cube(data_array, variables, table=None, verbose=True):
+    """对[点, 时间, 变量]数据立方体做整体单位转换，返回([点, 时间, 输出列]数组, 输出列名)
+
+    缺少源变量的列填默认值，verbose为False时不打印提示。
+    """
+    table = table or FORCING_TABLE
+    var_index = {str(v): i for i, v in enumerate(variables)}
+    n_points, n_times = data_array.shape[:2]
+
+    # 输出数组只分配一次，各列直接写入
+    out = np.empty((n_points, n_times, len(table)))
+    for col_idx, spec in enumerate(table):
+        target = out[:, :, col_idx]
+        # 依次尝试source和fallback中的变量列表，使用第一个齐全的
+        candidates = [spec["source"]] + spec.get("fallback", [])
+        source = next((names for names in candidates if all(v in var_index for v in names)), None)
+        if source is None:
+            if verbose:
+                missing = [v for v in spec["source"] if v not in var_index]
+                print(f"  警告: 缺少变量 {missing}，{spec['column']}使用默认值 {spec['default']}")
+            target.fill(spec["default"])
+            continue
+
+        sources = [data_array[:, :, var_index[v]] for v in source]
+        if "func" in spec:
+            spec["func"](*sources, out=target)
+        else:
+            np.multiply(sources[0], spec["scale"], out=target)
+            if spec["offset"]:
+                np.add(target, spec["offset"], out=target)
+
+    return out, forcing_columns(table)
+
+def load_cache_cube(cache_files):
+    """读取并按时间拼接一个或多个缓存文件，返回(数据, 点ID, 变量, 时间)"""
+    if isinstance(cache_files, str):
+        cache_files = [cache_files]
+
+    arrays, all_times = [], []
+    point_ids = variables = None
+    for cache_file in cache_files:
+        with np.load(cache_file, allow_pickle=True) as cache_data:
+            ids = [str(i) for i in cache_data['point_ids']]
+            cache_vars = [str(v) for v in cache_data['variables']]
+            if point_ids is None:
+                point_ids, variables = ids, cache_vars
+            elif ids != point_ids or cache_vars != variables:
+                raise ValueError(f"缓存文件的点或变量不一致: {cache_file}")
+            arrays.append(cache_data['data_array'])
+            all_times.append(pd.to_datetime(cache_data['times']).values)
+
+    times = np.concatenate(all_times)
+    data_array = np.concatenate(arrays, axis=1)
+
+    # 按时间排序并去掉重复时间步
+    times, unique_idx = np.unique(times, return_index=True)
+    if len(unique_idx) != data_array.shape[1] or np.any(np.diff(unique_idx) < 0):
+        data_array = data_array[:, unique_idx, :]
+
+    return data_array, point_ids, variables, pd.DatetimeIndex(times)
+
+# 驱动文件第一行的固定宽度（不含换行符）
+HEADER_WIDTH = 64
+
+def time_intervals_in_days(times):
+    """计算相对于第一个时间点的时间间隔(天)"""
+    times = pd.DatetimeIndex(times)
+    return (times - times[0]) / pd.Timedelta(days=1)
+
+def format_forcing_header(times, num_cols, time_step=None, width=HEADER_WIDTH):
+    """生成SHUD驱动文件第一行: 时间步数 列数 开始日期 结束日期 时间间隔(秒)
+
+    用空格补齐到固定宽度，追加数据后可以原地改写这一行。
+    """
+    times = pd.DatetimeIndex(times)
+    if time_step is None:
+        time_step = int((times[1] - times[0]).total_seconds()) if len(times) > 1 else 0
+    start_date = times[0].strftime("%Y%m%d")
+    end_date = times[-1].strftime("%Y%m%d")
+    return f"{len(times)}\t{num_cols}\t{start_date}\t{end_date}\t{time_step}".ljust(width)
+
+def write_shud_forcing(f, times, values, columns, time_step=None):
+    """按SHUD格式将单个点的驱动数据写入已打开的文本文件，values为[时间, 列]数组"""
+    table = np.column_stack([time_intervals_in_days(times), values])
+
+    # 第一行: 元数据
+    f.write(format_forcing_header(times, len(columns) + 1, time_step) + "\n")
+
+    # 第二行: 列名
+    f.write("Time_interval\t" + "\t".join(columns) + "\n")
+
+    # 数据行
+    np.savetxt(f, table, fmt="%.4f", delimiter="\t")
+
+def write_shud_forcing_csv(csv_file, times, values, columns, time_step=None):
+    """按SHUD格式写出单个点的驱动文件，values为[时间, 列]数组"""
+    with open(csv_file, 'w') as f:
+        write_shud_forcing(f, times, values, columns, time_step)
+
+def read_shud_forcing_csv(csv_file):
+    """读取SHUD格式的驱动文件，返回(时间, [时间, 列]数组, 列名)
+
+    时间由文件头的开始日期和Time_interval计算，有时间步长时按步长取整，
+    避免Time_interval保留4位小数带来的误差。
+    """
+    with open(csv_file, 'r') as f:
+        meta = f.readline().split()
+        columns = f.readline().split()[1:]
+    table = np.loadtxt(csv_file, skiprows=2, ndmin=2)
+
+    step = int(meta[4]) if len(meta) >= 5 else 0
+    seconds = table[:, 0] * 86400.0
+    if step > 0:
+        seconds = np.round(seconds / step) * step
+    times = pd.Timestamp(meta[2]) + pd.to_timedelta(np.round(seconds).astype(np.int64), unit="s")
+    return pd.DatetimeIndex(times), table[:, 1:], columns
+
+def _read_last_line(f):
+    """读取二进制文件的最后一个非空行"""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    block = min(size, 4096)
+    while True:
+        f.seek(size - block)
+        lines = f.read(block).splitlines()
+        if len([line for line in lines if line.strip()]) > 1 or block == size:
+            break
+        block = min(size, block * 4)
+    return next(line for line in reversed(lines) if line.strip()).decode()
+
+def _last_row_time(meta, last_line):
+    """由第一行的元数据和最后一行的Time_interval计算最后一个时间步，与read_shud_forcing_csv一致"""
+    step = int(meta[4])
+    last_seconds = float(last_line.split()[0]) * 86400.0
+    if step > 0:
+        last_seconds = round(last_seconds / step) * step
+    return pd.Timestamp(meta[2]) + pd.Timedelta(seconds=round(last_seconds))
+
+def read_last_forcing_time(csv_file):
+    """读取驱动文件最后一个时间步的时间（只读取第一行和最后一行）"""
+    with open(csv_file, 'rb') as f:
+        meta = f.readline().decode().split()
+        last_line = _read_last_line(f)
+    if len(meta) < 5:
+        raise ValueError(f"驱动文件第一行格式不正确: {csv_file}")
+    return _last_row_time(meta, last_line)
+
+def append_shud_forcing_csv(csv_file, times, values, columns, time_step=None):
+    """将新的时间步追加到已有的驱动文件末尾，并原地改写第一行，返回追加的行数
+
+    只追加晚于文件最后一个时间步的数据；文件的列与columns不一致时抛出ValueError。
+    文件头没有预留宽度（旧版本生成的文件）时重写整个文件。
+    """
+    times = pd.DatetimeIndex(times)
+    with open(csv_file, 'rb') as f:
+        header_line = f.readline()
+        file_columns = f.readline().decode().split()[1:]
+        last_line = _read_last_line(f)
+    meta = header_line.decode().split()
+    if len(meta) < 5:
+        raise ValueError(f"驱动文件第一行格式不正确: {csv_file}")
+    if file_columns != list(columns):
+        raise ValueError(f"驱动文件的列与新数据不一致: {csv_file}")
+
+    start = pd.Timestamp(meta[2])
+    n_rows = int(meta[0])
+    step = int(meta[4])
+    if time_step is not None and int(time_step) != step:
+        raise ValueError(f"驱动文件的时间步长({step}秒)与新数据({time_step}秒)不一致: {csv_file}")
+    last_time = _last_row_time(meta, last_line)
+
+    new = times > last_time
+    if not new.any():
+        return 0
+    new_times = times[new]
+    if step > 0 and new_times[0] - last_time != pd.Timedelta(seconds=step):
+        print(f"  警告: {os.path.basename(csv_file)}的新数据与已有数据之间不连续 ({last_time} -> {new_times[0]})")
+
+    intervals = (new_times - start) / pd.Timedelta(days=1)
+    with open(csv_file, 'ab') as f:
+        np.savetxt(f, np.column_stack([intervals, np.asarray(values)[new]]), fmt="%.4f", delimiter="\t")
+
+    # 原地改写第一行: 行数和结束日期
+    header = f"{n_rows + int(new.sum())}\t{meta[1]}\t{meta[2]}\t{new_times[-1].strftime('%Y%m%d')}\t{meta[4]}"
+    width = len(header_line.rstrip(b"\r\n"))
+    if len(header) <= width:
+        with open(csv_file, 'r+b') as f:
+            f.write(header.ljust(width).encode())
+    else:
+        with open(csv_file, 'rb') as f:
+            f.readline()
+            rest = f.read()
+        tmp_file = csv_file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(header.ljust(HEADER_WIDTH).encode() + b"\n" + rest)
+        os.replace(tmp_file, csv_file)
+
+    return int(new.sum())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+气象驱动数据的缺测检测与插补
+功能:
+1. 将[点, 时间, 变量]数据立方体重新排列到规则时间轴上，缺失文件对应的时间步补为缺测
+2. 将GLDAS填充值(-9999、_FillValue)标记为缺测
+3. 按变量选择插补方法，对所有点同时进行向量化插补:
+   短缺测段 - 气温等状态量线性插值，降水补0
+   长缺测段 - 使用同月同时刻的气候平均值
+4. 输出缺测报告，记录缺失的时间段和每个点每个变量的插补数量
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+# GLDAS中表示缺测的填充值
+FILL_VALUES = [-9999.0]
+
+# 各变量的短缺测段插补方法: linear为线性插值, zero为补0
+GAP_RULES = {
+    "Rainf_tavg": "zero",
+    "Tair_f_inst": "linear",
+    "Qair_f_inst": "linear",
+    "Wind_f_inst": "linear",
+    "SWdown_f_tavg": "linear",
+    "Psurf_f_inst": "linear",
+}
+
+def _time_seconds(times):
+    """将时间转换为整数秒"""
+    return pd.DatetimeIndex(times).values.astype("datetime64[s]").astype(np.int64)
+
+def mask_fill_values(values):
+    """将填充值和超大数值替换为NaN（原地修改），返回被替换的单元数"""
+    # 先用两次归约判断是否存在填充值，通常不需要构建完整的掩码
+    flat = values.ravel()
+    if len(flat) == 0:
+        return 0
+    low, high = np.fmin.reduce(flat), np.fmax.reduce(flat)
+    if low > min(FILL_VALUES) and max(abs(low), abs(high)) <= 1e19:
+        return 0
+
+    mask = np.abs(values) > 1e19
+    for fill_value in FILL_VALUES:
+        mask |= values == fill_value
+    n_fill = int(np.count_nonzero(mask))
+    if n_fill:
+        values[mask] = np.nan
+    return n_fill
+
+def regular_time_axis(times, step):
+    """构建从首个时间点到最后一个时间点的规则时间轴，返回(规则时间, 原时间步位置, 缺失时间步掩码)"""
+    t64 = _time_seconds(times)
+    offsets = t64 - t64[0]
+    if np.any(offsets % step):
+        raise ValueError(f"时间点不在{step}秒的规则时间轴上")
+    slots = offsets // step
+    n_times = int(slots[-1]) + 1
+
+    missing = np.ones(n_times, dtype=bool)
+    missing[slots] = False
+    axis = pd.DatetimeIndex((t64[0] + np.arange(n_times) * step).astype("datetime64[s]"))
+    return axis, slots, missing
+
+def climatology_keys(times):
+    """返回每个时间步的气候分组: (月*24+时, 时)"""
+    times = pd.DatetimeIndex(times)
+    hours = np.asarray(times.hour)
+    return (np.asarray(times.month) - 1) * 24 + hours, hours
+
+def _group_mean(values, valid, members):
+    """计算每个点在一组时间步上的有效值平均（无有效值时为NaN）"""
+    ok = valid[:, members]
+    total = np.where(ok, values[:, members], 0.0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / ok.sum(axis=1)
+
+def climatology(values, valid, times, cols):
+    """计算cols时间步对应的气候平均值，返回[点, len(cols)]数组
+
+    使用同月同时刻的平均值，无数据时依次退化为同时刻平均、全序列平均。
+    只计算cols涉及的时间分组，不需要遍历所有分组。
+    """
+    month_hour, hour = climatology_keys(times)
+    clim = np.full((values.shape[0], len(cols)), np.nan)
+    for key in np.unique(month_hour[cols]):
+        mean = _group_mean(values, valid, month_hour == key)
+        empty = np.isnan(mean)
+        if empty.any():
+            mean[empty] = _group_mean(values[empty], valid[empty], hour == key % 24)
+        clim[:, month_hour[cols] == key] = mean[:, None]
+
+    empty_rows = np.flatnonzero(np.isnan(clim).any(axis=1))
+    if len(empty_rows):
+        series_mean = _group_mean(values[empty_rows], valid[empty_rows], slice(None))
+        clim[empty_rows] = np.where(np.isnan(clim[empty_rows]), series_mean[:, None], clim[empty_rows])
+    return clim
+
+def _nearest_valid(valid):
+    """返回每个时间步之前和之后最近的有效时间步（没有时分别为-1和时间步数）"""
+    n_times = valid.shape[-1]
+    idx = np.arange(n_times, dtype=np.int32)
+    prev = np.maximum.accumulate(np.where(valid, idx, -1), axis=-1)
+    nxt = np.flip(np.minimum.accumulate(np.flip(np.where(valid, idx, n_times), axis=-1), axis=-1), axis=-1)
+    return prev, nxt
+
+def fill_series(values, times, method="linear", max_gap_steps=8):
+    """对[点, 时间]数组插补缺测（原地修改）
+
+    返回每个点的(缺测数, 短缺测插补数, 气候值插补数, 最长缺测段, 未插补数)。
+    """
+    n_points, n_times = values.shape
+    gaps = ~np.isfinite(values)
+    missing = gaps.sum(axis=1)
+    short_count = np.zeros(n_points, dtype=np.int64)
+    clim_count = np.zeros(n_points, dtype=np.int64)
+    longest = np.zeros(n_points, dtype=np.int64)
+    unfilled = np.where(missing == n_times, n_times, 0)
+    if not missing.any():
+        return missing, short_count, clim_count, longest, unfilled
+
+    # 缺失文件造成的缺测对所有点相同，这些时间步的前后有效时间步只需计算一次；
+    # 只有另外还有填充值的点才逐点计算
+    common = gaps.all(axis=0)
+    common_cols = np.flatnonzero(common)
+    shared_rows = np.flatnonzero(missing == len(common_cols)) if len(common_cols) else np.empty(0, dtype=np.int64)
+    own_rows = np.flatnonzero(missing > len(common_cols))
+
+    gap_rows, gap_cols, gap_prev, gap_next = [], [], [], []
+    if len(shared_rows):
+        prev, nxt = _nearest_valid(~common)
+        gap_rows.append(np.repeat(shared_rows, len(common_cols)))
+        gap_cols.append(np.tile(common_cols, len(shared_rows)))
+        gap_prev.append(np.tile(prev[common_cols], len(shared_rows)))
+        gap_next.append(np.tile(nxt[common_cols], len(shared_rows)))
+    if len(own_rows):
+        prev, nxt = _nearest_valid(~gaps[own_rows])
+        rows, cols = np.nonzero(gaps[own_rows])
+        gap_rows.append(own_rows[rows])
+        gap_cols.append(cols)
+        gap_prev.append(prev[rows, cols])
+        gap_next.append(nxt[rows, cols])
+
+    gap_rows = np.concatenate(gap_rows)
+    gap_cols = np.concatenate(gap_cols)
+    gap_prev = np.concatenate(gap_prev).astype(np.int64)
+    gap_next = np.concatenate(gap_next).astype(np.int64)
+    gap_len = gap_next - gap_prev - 1
+    is_long = gap_len > max_gap_steps
+
+    np.maximum.at(longest, gap_rows, gap_len)
+    short_count += np.bincount(gap_rows[~is_long], minlength=n_points)
+    clim_count += np.bincount(gap_rows[is_long], minlength=n_points)
+
+    # 只在缺测单元上计算插补值
+    short = ~is_long
+    if short.any():
+        r, c = gap_rows[short], gap_cols[short]
+        p, n = gap_prev[short], gap_next[short]
+        if method == "zero":
+            estimate = np.zeros(len(r))
+        else:
+            prev_values = values[r, np.clip(p, 0, n_times - 1)]
+            next_values = values[r, np.clip(n, 0, n_times - 1)]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                estimate = prev_values + (next_values - prev_values) * (c - p) / (n - p)
+            # 序列首尾的缺测使用最近的有效值
+            estimate = np.where(p >= 0, estimate, next_values)
+            estimate = np.where(n < n_times, estimate, prev_values)
+        values[r, c] = estimate
+
+    if is_long.any():
+        # 气候值只对有长缺测段的点计算
+        r, c = gap_rows[is_long], gap_cols[is_long]
+        long_rows = np.unique(r)
+        long_cols = np.unique(c)
+        clim = climatology(values[long_rows], ~gaps[long_rows], times, long_cols)
+        values[r, c] = clim[np.searchsorted(long_rows, r), np.searchsorted(long_cols, c)]
+
+    return missing, short_count, clim_count, longest, unfilled
+
+def _missing_ranges(times, missing):
+    """将缺失时间步掩码转换为连续的缺失时间段列表"""
+    ranges = []
+    if not missing.any():
+        return ranges
+    edges = np.diff(np.r_[0, missing.astype(np.int8), 0])
+    for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        ranges.append({"Start": times[start], "End": times[end - 1], "Steps": int(end - start)})
+    return ranges
+
+def fill_cube_gaps(data_array, times, variables, point_ids, step, max_gap_steps=8, chunk_size=256, verbose=True):
+    """检测并插补数据立方体中的缺测，返回(数据, 时间, 缺测报告)；verbose为False时不打印提示"""
+    times, slots, missing = regular_time_axis(times, step)
+    if missing.any():
+        # 有缺失时间步时输出到规则时间轴上的新数组
+        output = np.empty((data_array.shape[0], len(times), data_array.shape[2]))
+    else:
+        output = data_array
+
+    ranges = _missing_ranges(times, missing)
+    if ranges and verbose:
+        print(f"  检测到{int(missing.sum())}个缺失时间步（{len(ranges)}个时间段），已补入规则时间轴")
+
+    # 每个点每个变量的插补统计
+    records = [[] for _ in variables]
+    methods = [GAP_RULES.get(str(var), "linear") for var in variables]
+    n_fill = 0
+    for start in range(0, len(point_ids), chunk_size):
+        # 按点分块以限制临时数组的内存，块内转为[变量, 点, 时间]使时间轴连续
+        block = np.moveaxis(data_array[start:start + chunk_size], 2, 0)
+        if missing.any():
+            chunk = np.full(block.shape[:2] + (len(times),), np.nan)
+            chunk[:, :, slots] = block
+        else:
+            chunk = np.ascontiguousarray(block)
+
+        changed = output is not data_array
+        for var_idx, var in enumerate(variables):
+            values = chunk[var_idx]
+            n_fill += mask_fill_values(values)
+            n_missing, short, clim, longest, n_unfilled = fill_series(values, times, methods[var_idx], max_gap_steps)
+            if not n_missing.any():
+                continue
+            changed = True
+            for offset in np.flatnonzero(n_missing):
+                records[var_idx].append({
+                    "Point_ID": point_ids[start + offset],
+                    "Variable": var,
+                    "Missing": int(n_missing[offset]),
+                    "Method": methods[var_idx],
+                    "Short_Filled": int(short[offset]),
+                    "Climatology_Filled": int(clim[offset]),
+                    "Longest_Gap_Steps": int(longest[offset]),
+                    "Unfilled": int(n_unfilled[offset]),
+                })
+        if changed:
+            output[start:start + chunk_size] = np.moveaxis(chunk, 0, 2)
+    records = [record for var_records in records for record in var_records]
+
+    if n_fill and verbose:
+        print(f"  检测到{n_fill}个填充值单元")
+    unfilled = sum(r["Unfilled"] for r in records)
+    if unfilled and verbose:
+        print(f"  警告: {unfilled}个单元无法插补（该点该变量没有任何有效数据，可能位于海洋）")
+    if records and verbose:
+        print(f"  已插补{sum(r['Missing'] - r['Unfilled'] for r in records)}个缺测单元")
+
+    report = {"missing_ranges": ranges, "records": records}
+    return output, times, report
+
+def write_gap_report(report, output_dir):
+    """写出缺测报告: gap_report.csv（每个点每个变量）和gap_times.csv（缺失时间段）"""
+    columns = ["Point_ID", "Variable", "Missing", "Method", "Short_Filled",
+               "Climatology_Filled", "Longest_Gap_Steps", "Unfilled"]
+    report_file = os.path.join(output_dir, "gap_report.csv")
+    pd.DataFrame(report["records"], columns=columns).to_csv(report_file, index=False)
+
+    times_file = os.path.join(output_dir, "gap_times.csv")
+    ranges = pd.DataFrame(report["missing_ranges"], columns=["Start", "End", "Steps"])
+    ranges.to_csv(times_file, index=False, date_format="%Y-%m-%d %H:%M")
+
+    print(f"缺测报告已保存至: {report_file}, {times_file}")
+    return report_file
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SHUD网格文件读写工具
+功能:
+1. 读取SHUD模型的.sp.mesh文件（三角形单元和节点）
+2. 批量计算单元质心和高程，并转换为经纬度
+3. 读取.sp.att文件并写入FORC列（气象驱动序号）
+"""
+
+import os
+import glob
+import shutil
+import numpy as np
+import pandas as pd
+
+# .sp.att文件的默认列，新建文件时使用
+ATT_COLUMNS = ["INDEX", "SOIL", "GEOL", "LC", "FORC", "MF", "BC", "SS", "LAKE"]
+
+def _read_table(lines, start):
+    """从start行读取一个SHUD表格（第一行为行数和列数，第二行为列名），返回(DataFrame, 下一个表格的起始行)"""
+    nrow = int(lines[start].split()[0])
+    columns = lines[start + 1].split()
+    body = lines[start + 2:start + 2 + nrow]
+    values = np.loadtxt(body, ndmin=2) if nrow > 0 else np.empty((0, len(columns)))
+    df = pd.DataFrame(values[:, :len(columns)], columns=columns)
+    return df, start + 2 + nrow
+
+def read_shud_mesh(mesh_file):
+    """读取.sp.mesh文件，返回(单元表, 节点表)"""
+    with open(mesh_file, 'r') as f:
+        lines = [line for line in f if line.strip()]
+
+    elements, next_start = _read_table(lines, 0)
+    nodes, _ = _read_table(lines, next_start)
+
+    for col in ("ID", "Node1", "Node2", "Node3"):
+        elements[col] = elements[col].astype(np.int64)
+    nodes["ID"] = nodes["ID"].astype(np.int64)
+
+    print(f"读取SHUD网格: {len(elements)}个单元, {len(nodes)}个节点")
+    return elements, nodes
+
+def _node_positions(elements, nodes):
+    """返回每个单元三个节点在节点表中的行号，形状为[单元数, 3]"""
+    node_ids = nodes["ID"].values
+    order = np.argsort(node_ids)
+    tri = elements[["Node1", "Node2", "Node3"]].values
+    pos = np.searchsorted(node_ids, tri, sorter=order)
+    return order[np.clip(pos, 0, len(order) - 1)]
+
+def element_centroids(elements, nodes):
+    """批量计算所有单元的质心坐标（网格原始坐标系）"""
+    pos = _node_positions(elements, nodes)
+    x = nodes["X"].values[pos].mean(axis=1)
+    y = nodes["Y"].values[pos].mean(axis=1)
+    return x, y
+
+def element_elevations(elements, nodes):
+    """批量计算所有单元的平均地表高程（三个节点高程的平均值）"""
+    pos = _node_positions(elements, nodes)
+    return nodes["Elevation"].values[pos].mean(axis=1)
+
+def find_mesh_crs(mesh_file):
+    """在网格文件所在目录及gis子目录中查找.prj投影文件"""
+    mesh_dir = os.path.dirname(os.path.abspath(mesh_file))
+    candidates = []
+    for d in (mesh_dir, os.path.join(mesh_dir, "gis"), os.path.join(os.path.dirname(mesh_dir), "gis")):
+        candidates.extend(sorted(glob.glob(os.path.join(d, "*.prj"))))
+    if not candidates:
+        return None
+    with open(candidates[0], 'r') as f:
+        print(f"使用投影文件: {candidates[0]}")
+        return f.read()
+
+def to_lonlat(x, y, crs):
+    """将网格坐标批量转换为经纬度(EPSG:4326)"""
+    if crs is None:
+        return np.asarray(x), np.asarray(y)
+    from pyproj import CRS, Transformer
+    source = CRS.from_user_input(crs)
+    if source.is_geographic:
+        return np.asarray(x), np.asarray(y)
+    transformer = Transformer.from_crs(source, "EPSG:4326", always_xy=True)
+    return transformer.transform(np.asarray(x), np.asarray(y))
+
+def read_mesh_points(mesh_file, mesh_crs=None, with_elevation=False):
+    """读取网格并返回(单元ID, 质心经度, 质心纬度)数组，with_elevation为True时再返回单元高程"""
+    elements, nodes = read_shud_mesh(mesh_file)
+    x, y = element_centroids(elements, nodes)
+
+    crs = mesh_crs or find_mesh_crs(mesh_file)
+    if crs is None:
+        if np.all(np.abs(x) <= 180) and np.all(np.abs(y) <= 90):
+            print("警告: 未找到投影信息，网格坐标看起来是经纬度，按EPSG:4326处理")
+        else:
+            raise ValueError("未找到网格的投影信息，请使用--mesh-crs指定（例如 EPSG:32632）")
+
+    lons, lats = to_lonlat(x, y, crs)
+    if with_elevation:
+        return elements["ID"].values, np.asarray(lons), np.asarray(lats), element_elevations(elements, nodes)
+    return elements["ID"].values, np.asarray(lons), np.asarray(lats)
+
+def read_shud_att(att_file):
+    """读取.sp.att文件"""
+    with open(att_file, 'r') as f:
+        lines = [line for line in f if line.strip()]
+    att, _ = _read_table(lines, 0)
+    return att.astype(np.int64)
+
+def write_shud_att_forc(att_file, element_ids, forc):
+    """将每个单元的气象驱动序号写入.sp.att文件的FORC列（文件不存在时新建）"""
+    element_ids = np.asarray(element_ids, dtype=np.int64)
+    forc = np.asarray(forc, dtype=np.int64)
+
+    if os.path.exists(att_file):
+        att = read_shud_att(att_file)
+        # 按INDEX对齐单元
+        order = np.argsort(att["INDEX"].values)
+        # 大于所有INDEX的单元ID会得到len(att)，先截断再比较，由下面的检查报告不一致
+        found = np.searchsorted(att["INDEX"].values, element_ids, sorter=order)
+        pos = order[np.minimum(found, len(order) - 1)]
+        if not np.array_equal(att["INDEX"].values[pos], element_ids):
+            raise ValueError(f"{att_file}中的单元与网格文件不一致")
+        att.loc[pos, "FORC"] = forc
+
+        # 首次覆盖前备份原文件
+        backup = att_file + ".bak"
+        if not os.path.exists(backup):
+            shutil.copy(att_file, backup)
+    else:
+        att = pd.DataFrame({col: np.zeros(len(element_ids), dtype=np.int64) for col in ATT_COLUMNS})
+        att["INDEX"] = element_ids
+        att[["SOIL", "GEOL", "LC", "MF"]] = 1
+        att["FORC"] = forc
+
+    with open(att_file, 'w') as f:
+        f.write(f"{len(att)}\t{len(att.columns)}\n")
+        f.write("\t".join(att.columns) + "\n")
+        np.savetxt(f, att.values, fmt="%d", delimiter="\t")
+
+    print(f"已写入{len(att)}个单元的FORC列: {att_file}")
+    return True
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SHUD气象驱动数据的NetCDF导出和读回
+功能:
+1. 将所有点的驱动数据写入一个CF-1.8离散采样几何(DSG) timeSeries格式的NetCDF文件，
+   [站点, 时间]二维数组分块压缩存储，代替成千上万个小CSV文件
+2. 站点坐标和元数据（FORC序号、包含的点数、高程）与meteo_locations.csv一致
+3. 按需从NetCDF文件读回任意站点，重新生成SHUD格式的CSV驱动文件
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from shud_forcing import write_shud_forcing_csv
+
+# 各驱动列的CF属性
+CF_ATTRIBUTES = {
+    "Precip": {"units": "mm day-1", "standard_name": "lwe_precipitation_rate", "long_name": "降水强度"},
+    "Temp": {"units": "degC", "standard_name": "air_temperature", "long_name": "气温"},
+    "RH": {"units": "1", "standard_name": "relative_humidity", "long_name": "相对湿度"},
+    "VP": {"units": "kPa", "standard_name": "surface_air_pressure", "long_name": "地表气压"},
+    "Wind": {"units": "m s-1", "standard_name": "wind_speed", "long_name": "风速"},
+    "RADN": {"units": "W m-2", "standard_name": "surface_downwelling_shortwave_flux_in_air", "long_name": "向下短波辐射"},
+    "Tmin": {"units": "degC", "standard_name": "air_temperature", "long_name": "时段最低气温", "cell_methods": "time: minimum"},
+    "Tmax": {"units": "degC", "standard_name": "air_temperature", "long_name": "时段最高气温", "cell_methods": "time: maximum"},
+    "PET": {"units": "mm day-1", "long_name": "FAO-56参考蒸散发"},
+    "Rn": {"units": "W m-2", "standard_name": "surface_net_downward_radiative_flux", "long_name": "净辐射"},
+    "Ea": {"units": "kPa", "standard_name": "water_vapor_partial_pressure_in_air", "long_name": "实际水汽压"},
+}
+
+# 默认分块: 每块包含的站点数和时间步数
+NETCDF_CHUNK_STATIONS = 16
+NETCDF_CHUNK_TIMES = 8760
+
+def write_forcing_netcdf(nc_file, times, values, columns, cells, time_step=None, complevel=4):
+    """将[站点, 时间, 列]驱动数据写入CF DSG timeSeries格式的NetCDF文件
+
+    cells为气象驱动站点列表（与meteo_locations.csv相同的信息），顺序与values的第一维一致。
+    """
+    times = pd.DatetimeIndex(times)
+    if time_step is None:
+        time_step = int((times[1] - times[0]).total_seconds()) if len(times) > 1 else 0
+    n_stations, n_times = values.shape[:2]
+
+    coords = {
+        "time": ("time", times.values, {"standard_name": "time", "axis": "T"}),
+        "station_id": ("station", np.array([c["id"] for c in cells], dtype=object),
+                       {"cf_role": "timeseries_id", "long_name": "气象驱动站点ID"}),
+        "lon": ("station", np.array([c["lon"] for c in cells], dtype=float),
+                {"standard_name": "longitude", "units": "degrees_east", "axis": "X"}),
+        "lat": ("station", np.array([c["lat"] for c in cells], dtype=float),
+                {"standard_name": "latitude", "units": "degrees_north", "axis": "Y"}),
+    }
+    data_vars = {
+        "FORC": ("station", np.arange(1, n_stations + 1, dtype=np.int32), {"long_name": "meteo.tsd.forc中的序号"}),
+        "N_Points": ("station", np.array([c.get("n_points", 1) for c in cells], dtype=np.int32),
+                     {"long_name": "使用该驱动的点数"}),
+    }
+    if "elevation" in cells[0]:
+        data_vars["Elevation"] = ("station", np.array([c["elevation"] for c in cells], dtype=float),
+                                  {"units": "m", "long_name": "站点平均高程"})
+        data_vars["GLDAS_Elevation"] = ("station", np.array([c["cell_elevation"] for c in cells], dtype=float),
+                                        {"units": "m", "long_name": "GLDAS格点平均高程"})
+
+    chunks = (min(NETCDF_CHUNK_STATIONS, n_stations), min(NETCDF_CHUNK_TIMES, n_times))
+    encoding = {"time": {"units": "seconds since 1970-01-01 00:00:00", "dtype": "int64"}}
+    for col_idx, column in enumerate(columns):
+        attrs = dict(CF_ATTRIBUTES.get(column, {"long_name": column}))
+        attrs["coordinates"] = "time lat lon station_id"
+        data_vars[column] = (("station", "time"), values[:, :, col_idx], attrs)
+        encoding[column] = {"zlib": True, "complevel": complevel, "shuffle": True,
+                            "chunksizes": chunks, "_FillValue": None}
+
+    ds = xr.Dataset(data_vars, coords=coords, attrs={
+        "Conventions": "CF-1.8",
+        "featureType": "timeSeries",
+        "title": "SHUD气象驱动数据",
+        "source": "GLDAS2SHUD",
+        "time_step_seconds": int(time_step),
+        "shud_columns": " ".join(columns),
+    })
+    tmp_file = nc_file + ".tmp"
+    ds.to_netcdf(tmp_file, format="NETCDF4", encoding=encoding)
+    os.replace(tmp_file, nc_file)
+    print(f"NetCDF驱动文件已保存至: {nc_file}（{n_stations}个站点，{n_times}个时间步）")
+    return nc_file
+
+def read_forcing_netcdf(nc_file, station_ids=None):
+    """从NetCDF驱动文件读取[站点, 时间, 列]数据，返回(数据, 时间, 站点ID, 列名, 时间步长)"""
+    with xr.open_dataset(nc_file) as ds:
+        columns = ds.attrs["shud_columns"].split()
+        ids = [str(s) for s in ds["station_id"].values]
+        if station_ids is not None:
+            index = pd.Index(ids).get_indexer([str(s) for s in station_ids])
+            if np.any(index < 0):
+                raise ValueError(f"NetCDF文件中没有这些站点: {[s for s, i in zip(station_ids, index) if i < 0]}")
+            ds = ds.isel(station=index)
+            ids = [ids[i] for i in index]
+        values = np.stack([ds[column].values for column in columns], axis=2)
+        times = pd.DatetimeIndex(ds["time"].values)
+        time_step = int(ds.attrs.get("time_step_seconds", 0)) or None
+    return values, times, ids, columns, time_step
+
+def netcdf_start_date(nc_file):
+    """NetCDF驱动文件的开始日期(YYYYMMDD)"""
+    with xr.open_dataset(nc_file) as ds:
+        return pd.Timestamp(ds["time"].values[0]).strftime("%Y%m%d")
+
+def netcdf_to_csv(nc_file, csv_dir, station_ids=None, force=False):
+    """从NetCDF驱动文件重新生成SHUD格式的CSV文件，返回写出的文件数"""
+    values, times, ids, columns, time_step = read_forcing_netcdf(nc_file, station_ids)
+    os.makedirs(csv_dir, exist_ok=True)
+    written = 0
+    for s_idx, station_id in enumerate(ids):
+        csv_file = os.path.join(csv_dir, f"{station_id}.csv")
+        if os.path.exists(csv_file) and not force:
+            continue
+        write_shud_forcing_csv(csv_file, times, values[s_idx], columns, time_step)
+        written += 1
+    print(f"从{nc_file}生成了{written}个CSV文件: {csv_dir}")
+    return written
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SHUD模型项目目录的组装和增量同步
+功能:
+1. 按meteo.tsd.forc列出的驱动文件，从一个共享的驱动数据池组装SHUD项目目录
+2. 文件优先硬链接，其次reflink（写时复制克隆）、符号链接，都不支持时才复制
+3. 项目目录中的清单(.sync_manifest.json)记录每个文件的大小、修改时间和SHA-256，
+   再次同步时大小和修改时间未变的文件不重新计算哈希，内容未变的文件不做任何操作，
+   不再列出的文件从项目目录中删除
+4. 同一个数据池可组装任意多个项目目录（情景、子流域等）
+"""
+
+import os
+import json
+import shutil
+import hashlib
+
+# 链接方式，auto按顺序尝试硬链接、reflink、符号链接、复制
+LINK_MODES = ["auto", "hardlink", "reflink", "symlink", "copy"]
+AUTO_LINK_ORDER = ["hardlink", "reflink", "symlink", "copy"]
+
+MANIFEST_NAME = ".sync_manifest.json"
+
+# Linux的FICLONE ioctl，btrfs、XFS等文件系统支持
+FICLONE = 0x40049409
+
+def file_sha256(path, block_size=1 << 20):
+    """计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _reflink(src, dst):
+    """用FICLONE克隆文件（写时复制），不支持时抛出OSError"""
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+def _place_file(src, dst, mode):
+    """按指定方式将src放到dst"""
+    if mode == "hardlink":
+        os.link(src, dst)
+    elif mode == "reflink":
+        _reflink(src, dst)
+    elif mode == "symlink":
+        os.symlink(os.path.relpath(os.path.abspath(src), os.path.dirname(os.path.abspath(dst))), dst)
+    else:
+        shutil.copy2(src, dst)
+
+def link_file(src, dst, mode="auto"):
+    """链接或复制单个文件，返回实际使用的方式"""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    for candidate in (AUTO_LINK_ORDER if mode == "auto" else [mode]):
+        try:
+            _place_file(src, dst, candidate)
+            return candidate
+        except (OSError, ImportError):
+            if mode != "auto":
+                raise
+    raise OSError(f"无法链接或复制文件: {src}")
+
+def load_manifest(project_dir):
+    """读取项目目录的同步清单"""
+    manifest_file = os.path.join(project_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r') as f:
+        return json.load(f)
+
+def save_manifest(project_dir, manifest):
+    """保存项目目录的同步清单"""
+    manifest_file = os.path.join(project_dir, MANIFEST_NAME)
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+def _source_entry(src, previous):
+    """源文件的清单条目，大小和修改时间未变时沿用已记录的哈希"""
+    st = os.stat(src)
+    if previous and previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns:
+        sha256 = previous["sha256"]
+    else:
+        sha256 = file_sha256(src)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256}
+
+def _target_current(src, dst, previous, entry, mode):
+    """项目中的文件是否已是源文件的当前内容（且放置方式与指定的一致）"""
+    if previous is None or not os.path.lexists(dst) or previous["sha256"] != entry["sha256"]:
+        return False
+    if mode != "auto" and previous["mode"] != mode:
+        return False
+    if previous["mode"] in ("hardlink", "symlink"):
+        return os.path.exists(dst) and os.path.samefile(src, dst)
+    return os.path.getsize(dst) == entry["size"]
+
+def sync_files(pairs, project_dir, mode="auto"):
+    """将(源文件, 项目内相对路径)列表同步到项目目录，返回各操作的文件数"""
+    manifest = load_manifest(project_dir)
+    new_manifest = {}
+    counts = {"unchanged": 0, "missing": 0}
+
+    for src, rel_path in pairs:
+        dst = os.path.join(project_dir, rel_path)
+        previous = manifest.get(rel_path)
+        if not os.path.exists(src):
+            counts["missing"] += 1
+            continue
+        entry = _source_entry(src, previous)
+        if _target_current(src, dst, previous, entry, mode):
+            entry["mode"] = previous["mode"]
+            counts["unchanged"] += 1
+        else:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            entry["mode"] = link_file(src, dst, mode)
+            counts[entry["mode"]] = counts.get(entry["mode"], 0) + 1
+        new_manifest[rel_path] = entry
+
+    # 删除上次同步过、本次不再列出的文件
+    removed = 0
+    for rel_path in set(manifest) - set(new_manifest):
+        dst = os.path.join(project_dir, rel_path)
+        if os.path.lexists(dst):
+            os.remove(dst)
+            removed += 1
+    counts["removed"] = removed
+
+    save_manifest(project_dir, new_manifest)
+    return counts
+
+def read_forc_file(forc_file):
+    """读取meteo.tsd.forc，返回(驱动文件相对目录, 驱动文件名列表)"""
+    with open(forc_file, 'r') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    n_files = int(lines[0].split()[0])
+    return lines[1], lines[2:2 + n_files]
+
+def assemble_project(pool_dir, project_dir, forc_file=None, mode="auto"):
+    """从驱动数据池组装一个SHUD项目目录，返回各操作的文件数
+
+    forc_file默认为数据池中的meteo.tsd.forc，可指定只列出部分驱动文件的meteo.tsd.forc；
+    驱动文件的相对目录按meteo.tsd.forc中的记录，在项目目录中保持不变。
+    """
+    forc_file = forc_file or os.path.join(pool_dir, "meteo.tsd.forc")
+    csv_path, csv_files = read_forc_file(forc_file)
+    source_dir = os.path.join(pool_dir, csv_path)
+
+    pairs = [(forc_file, "meteo.tsd.forc")]
+    pairs += [(os.path.join(source_dir, name), os.path.normpath(os.path.join(csv_path, name))) for name in csv_files]
+
+    os.makedirs(project_dir, exist_ok=True)
+    counts = sync_files(pairs, project_dir, mode)
+    summary = "，".join(f"{key} {value}" for key, value in counts.items() if value)
+    print(f"SHUD项目已同步: {project_dir}（{summary or '无文件'}）")
+    if counts["missing"]:
+        print(f"警告: {counts['missing']}个驱动文件在数据池中不存在: {source_dir}")
+    return counts
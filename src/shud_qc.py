@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+气象驱动数据的质量控制
+功能:
+1. 对[点, 时间, 变量]数据立方体按变量做物理范围、变化率(尖峰)和持续不变检查，
+   以及比湿超过饱和值的一致性检查，所有点同时向量化计算
+2. 检查结果以uint8位掩码保存在缓存文件旁，每个单元1个字节
+3. 输出每个点的质控汇总表
+4. 可选将不合格的值标记为缺测，交由缺测插补(shud_gaps.py)处理
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+# 质控标志位
+QC_RANGE = 1        # 超出物理范围
+QC_SPIKE = 2        # 与前后时间步相比的孤立尖峰
+QC_PERSIST = 4      # 长时间持续不变
+QC_SUPERSAT = 8     # 比湿超过饱和比湿（相对湿度明显大于1）
+QC_MISSING = 16     # 缺测或填充值
+
+QC_FLAGS = {
+    "Range": QC_RANGE,
+    "Spike": QC_SPIKE,
+    "Persistence": QC_PERSIST,
+    "Supersaturation": QC_SUPERSAT,
+    "Missing": QC_MISSING,
+}
+
+# 设置qc_mask时视为无效值的标志位（持续不变可能是真实情况，不作为无效值）
+QC_MASK_FLAGS = QC_RANGE | QC_SPIKE | QC_SUPERSAT
+
+# 各变量的检查阈值（GLDAS原始单位）：
+#   min/max - 物理范围
+#   spike   - 与前后两个时间步的差值都超过此值（同方向）时判为尖峰
+#   persist - 连续相同值的时间步数达到此值时判为持续不变
+#   persist_ignore - 不参与持续不变检查的值（如夜间辐射和无雨时的0）
+QC_RULES = {
+    "Rainf_tavg": {"min": 0.0, "max": 0.05, "spike": 0.01, "persist": 16, "persist_ignore": 0.0},
+    "Tair_f_inst": {"min": 183.0, "max": 333.0, "spike": 15.0, "persist": 16},
+    "Qair_f_inst": {"min": 0.0, "max": 0.05, "spike": 0.01, "persist": 16},
+    "Wind_f_inst": {"min": 0.0, "max": 75.0, "spike": 20.0, "persist": 16},
+    "SWdown_f_tavg": {"min": 0.0, "max": 1400.0, "spike": 1000.0, "persist": 16, "persist_ignore": 0.0},
+    "Psurf_f_inst": {"min": 30000.0, "max": 110000.0, "spike": 3000.0, "persist": 48},
+}
+
+# 饱和检查允许的相对湿度上限
+SUPERSAT_RH = 1.05
+
+def check_range(values, rule):
+    """物理范围检查"""
+    with np.errstate(invalid="ignore"):
+        return (values < rule["min"]) | (values > rule["max"])
+
+def check_spike(values, threshold):
+    """孤立尖峰检查: 与前后时间步的差值都超过阈值且方向相同"""
+    flags = np.zeros(values.shape, dtype=bool)
+    if values.shape[1] < 3:
+        return flags
+    step = np.diff(values, axis=1)
+    with np.errstate(invalid="ignore"):
+        rise = step > threshold
+        fall = step < -threshold
+    # 先升后降或先降后升
+    flags[:, 1:-1] = (rise[:, :-1] & fall[:, 1:]) | (fall[:, :-1] & rise[:, 1:])
+    return flags
+
+def check_persistence(values, min_length, ignore_value=None):
+    """持续不变检查: 连续相同值的长度达到min_length的所有时间步"""
+    n_points, n_times = values.shape
+    flags = np.zeros((n_points, n_times), dtype=bool)
+    same = values[:, 1:] == values[:, :-1]
+    if ignore_value is not None:
+        same &= values[:, 1:] != ignore_value
+
+    # 只有相同值个数足够的点才需要计算段长度
+    rows = np.flatnonzero(np.count_nonzero(same, axis=1) >= min_length - 1)
+    if len(rows) == 0:
+        return flags
+
+    change = np.ones((len(rows), n_times), dtype=bool)
+    change[:, 1:] = ~same[rows]
+    # 每一行的第一个时间步都是新的一段，因此可以把所有行展平后统一计算段长度
+    run_id = np.cumsum(change.ravel()) - 1
+    run_length = np.bincount(run_id)[run_id].reshape(len(rows), n_times)
+    flags[rows] = run_length >= min_length
+    return flags
+
+def relative_humidity_unclipped(qair, tair, psurf):
+    """不做截断的相对湿度，与shud_forcing.convert_to_rh公式一致"""
+    with np.errstate(invalid="ignore", over="ignore"):
+        return 0.263 * psurf * qair / np.exp(17.67 * (tair - 273.15) / (tair - 29.65)) / 100.0
+
+def set_flag(flags, mask, bit):
+    """将mask为True的位置设置标志位（原地修改）"""
+    # 布尔数组按uint8视图相乘，避免布尔索引的散列读写
+    flags |= mask.view(np.uint8) * np.uint8(bit)
+
+def qc_cube(data_array, variables, chunk_size=256):
+    """对整个数据立方体做质控检查，返回与数据同形状的uint8标志数组"""
+    n_points, n_times, n_vars = data_array.shape
+    flags = np.zeros((n_points, n_times, n_vars), dtype=np.uint8)
+    var_index = {str(v): i for i, v in enumerate(variables)}
+    humidity = [var_index.get(v) for v in ("Qair_f_inst", "Tair_f_inst", "Psurf_f_inst")]
+
+    for start in range(0, n_points, chunk_size):
+        # 块内转为[变量, 点, 时间]使时间轴连续
+        chunk = np.ascontiguousarray(np.moveaxis(data_array[start:start + chunk_size], 2, 0))
+        chunk_flags = np.zeros(chunk.shape, dtype=np.uint8)
+
+        for var_idx, var in enumerate(variables):
+            values = chunk[var_idx]
+            var_flags = chunk_flags[var_idx]
+            set_flag(var_flags, ~np.isfinite(values) | (values == -9999.0), QC_MISSING)
+
+            rule = QC_RULES.get(str(var))
+            if rule is None:
+                continue
+            set_flag(var_flags, check_range(values, rule), QC_RANGE)
+            set_flag(var_flags, check_spike(values, rule["spike"]), QC_SPIKE)
+            set_flag(var_flags, check_persistence(values, rule["persist"], rule.get("persist_ignore")), QC_PERSIST)
+
+        if None not in humidity:
+            qair, tair, psurf = (chunk[i] for i in humidity)
+            with np.errstate(invalid="ignore"):
+                supersat = relative_humidity_unclipped(qair, tair, psurf) > SUPERSAT_RH
+            set_flag(chunk_flags[humidity[0]], supersat, QC_SUPERSAT)
+
+        flags[start:start + chunk_size] = np.moveaxis(chunk_flags, 0, 2)
+
+    return flags
+
+def apply_qc_mask(data_array, flags, mask_flags=QC_MASK_FLAGS):
+    """将不合格的值设为NaN（原地修改），返回被屏蔽的单元数"""
+    mask = (flags & mask_flags) != 0
+    data_array[mask] = np.nan
+    return int(mask.sum())
+
+def summarize_qc(flags, point_ids, variables):
+    """生成每个点的质控汇总表: 各类标志的单元数、被标记的比例和问题最多的变量"""
+    n_points, n_times, n_vars = flags.shape
+    summary = pd.DataFrame({"Point_ID": point_ids})
+
+    # 每个点统计一次各标志字节值的出现次数，再换算为各标志位的单元数
+    histogram = np.stack([np.bincount(flags[i].ravel(), minlength=256) for i in range(n_points)]) \
+        if n_points else np.zeros((0, 256), dtype=np.int64)
+    bit_table = np.array([[(value & bit) != 0 for bit in QC_FLAGS.values()] for value in range(256)], dtype=np.int64)
+    counts = histogram @ bit_table
+    for col_idx, name in enumerate(QC_FLAGS):
+        summary[name] = counts[:, col_idx]
+
+    flagged = np.count_nonzero(flags, axis=1)
+    summary["Flagged_Fraction"] = np.round(flagged.sum(axis=1) / float(n_times * n_vars), 6)
+    worst = flagged.argmax(axis=1)
+    summary["Worst_Variable"] = np.where(flagged.max(axis=1) > 0, np.asarray(variables, dtype=str)[worst], "")
+    return summary
+
+def qc_flags_file(cache_files):
+    """质控标志文件路径: 与缓存文件在同一目录，使用相同的产品前缀"""
+    first = cache_files[0] if isinstance(cache_files, (list, tuple)) else cache_files
+    prefix = os.path.basename(first).split("-")[0]
+    return os.path.join(os.path.dirname(first), f"{prefix}-qc-flags.npz")
+
+def run_qc(data_array, times, point_ids, variables, flags_file, summary_file, mask=False):
+    """执行质控检查，保存标志数组和汇总表，mask为True时将不合格的值设为NaN
+
+    flags_file为None时只检查（和屏蔽），不保存标志数组和汇总表。
+    """
+    print("执行质量控制检查...")
+    flags = qc_cube(data_array, variables)
+
+    if flags_file is None:
+        if mask:
+            n_masked = apply_qc_mask(data_array, flags)
+            print(f"  已将{n_masked}个不合格的值标记为缺测")
+        return flags
+
+    np.savez_compressed(flags_file, flags=flags, point_ids=np.asarray(point_ids, dtype=str),
+                        variables=np.asarray(variables, dtype=str), times=np.asarray(times, dtype="datetime64[s]"),
+                        flag_names=np.array(list(QC_FLAGS), dtype=str),
+                        flag_bits=np.array(list(QC_FLAGS.values()), dtype=np.uint8))
+    summary = summarize_qc(flags, point_ids, variables)
+    summary.to_csv(summary_file, index=False)
+
+    for name, bit in QC_FLAGS.items():
+        count = int(summary[name].sum())
+        if count:
+            print(f"  {name}: {count}个单元")
+    print(f"质控标志已保存至: {flags_file}")
+    print(f"质控汇总表已保存至: {summary_file}")
+
+    if mask:
+        n_masked = apply_qc_mask(data_array, flags)
+        print(f"  已将{n_masked}个不合格的值标记为缺测")
+
+    return flags
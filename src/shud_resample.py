@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SHUD气象驱动数据的时间重采样
+功能:
+1. 将[点, 时间, 列]驱动数据整体聚合到更长的时间步长（如日尺度），
+   时间轴重排为[点, 块数, 每块步数, 列]后直接做向量化归约
+2. 将驱动数据整体插值到更短的时间步长（如逐小时）
+3. 每一列的聚合和插值方式由RESAMPLE_RULES定义
+"""
+
+import numpy as np
+import pandas as pd
+
+# 各驱动列的重采样方式：
+#   aggregate - 聚合到更长步长时的方法: mean或sum（降水和辐射为时段平均速率，取平均即保持总量）
+#   interp    - 插值到更短步长时的方法: linear为线性插值, repeat为时段内保持不变（保持总量）
+RESAMPLE_RULES = {
+    "Precip": {"aggregate": "mean", "interp": "repeat"},
+    "Temp": {"aggregate": "mean", "interp": "linear"},
+    "RH": {"aggregate": "mean", "interp": "linear"},
+    "VP": {"aggregate": "mean", "interp": "linear"},
+    "Wind": {"aggregate": "mean", "interp": "linear"},
+    "RADN": {"aggregate": "mean", "interp": "repeat"},
+    "PET": {"aggregate": "mean", "interp": "repeat"},
+    "Rn": {"aggregate": "mean", "interp": "repeat"},
+    "Ea": {"aggregate": "mean", "interp": "linear"},
+}
+
+# 聚合时可附加的气温极值列
+TEMP_EXTREME_COLUMNS = ["Tmin", "Tmax"]
+
+def parse_time_step(value):
+    """将时间步长（如1D、3H、30min或秒数）转换为秒"""
+    if value is None or str(value).strip() == "":
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        seconds = int(value)
+    else:
+        seconds = int(pd.Timedelta(value.lower()).total_seconds())
+    if seconds <= 0:
+        raise ValueError(f"无效的时间步长: {value}")
+    return seconds
+
+def native_time_step(times):
+    """返回时间轴的原始步长(秒)，取相邻时间差的中位数"""
+    t64 = pd.DatetimeIndex(times).values.astype("datetime64[s]").astype(np.int64)
+    if len(t64) < 2:
+        raise ValueError("时间点少于2个，无法确定原始时间步长")
+    return int(np.median(np.diff(t64)))
+
+def aggregate_cube(values, times, columns, step, temp_extremes=False, verbose=True):
+    """将[点, 时间, 列]数据聚合到更长的时间步长，返回(数据, 时间, 列名)
+
+    时间块与步长的整数倍对齐（日尺度即从UTC零点开始），首尾不完整的块被丢弃，
+    中间缺少时间步的块使用已有数据计算。verbose为False时不打印提示。
+    """
+    native = native_time_step(times)
+    factor = step // native
+    t64 = pd.DatetimeIndex(times).values.astype("datetime64[s]").astype(np.int64)
+
+    # 每个时间步在规则时间轴上的位置
+    origin = t64[0] - t64[0] % step
+    offsets = t64 - origin
+    if np.any(offsets % native):
+        raise ValueError("时间点不在规则时间轴上，无法聚合")
+    slots = offsets // native
+    n_blocks = int(slots[-1] // factor + 1)
+
+    n_points, _, n_cols = values.shape
+    if len(slots) == n_blocks * factor and slots[0] == 0 and np.all(np.diff(slots) == 1):
+        # 时间轴完整且对齐时直接重排，不复制数据
+        grid = values
+        has_gaps = False
+    else:
+        grid = np.full((n_points, n_blocks * factor, n_cols), np.nan)
+        grid[:, slots, :] = values
+        has_gaps = True
+    blocks = grid.reshape(n_points, n_blocks, factor, n_cols)
+
+    # 只保留从第一个完整块到最后一个完整块之间的时间块
+    counts = np.bincount(slots // factor, minlength=n_blocks)
+    complete = np.flatnonzero(counts == factor)
+    if len(complete) == 0:
+        raise ValueError(f"没有完整的{step}秒时间块，无法聚合")
+    keep = slice(complete[0], complete[-1] + 1)
+    dropped = n_blocks - (complete[-1] + 1 - complete[0])
+    if dropped and verbose:
+        print(f"  丢弃首尾{dropped}个不完整的时间块")
+    partial = int(np.sum(counts[keep] < factor))
+    if partial and verbose:
+        print(f"  警告: {partial}个时间块缺少部分时间步，使用已有数据计算")
+    blocks = blocks[:, keep]
+
+    reduce_mean = np.nanmean if has_gaps else np.mean
+    out_columns = list(columns)
+    add_extremes = temp_extremes and "Temp" in columns
+    if add_extremes:
+        out_columns += TEMP_EXTREME_COLUMNS
+
+    out = np.empty((n_points, blocks.shape[1], len(out_columns)))
+    for col_idx, column in enumerate(columns):
+        method = RESAMPLE_RULES.get(column, {}).get("aggregate", "mean")
+        col_blocks = blocks[:, :, :, col_idx]
+        if method == "sum":
+            out[:, :, col_idx] = np.nansum(col_blocks, axis=2)
+        else:
+            out[:, :, col_idx] = reduce_mean(col_blocks, axis=2)
+
+    if add_extremes:
+        temp_blocks = blocks[:, :, :, list(columns).index("Temp")]
+        out[:, :, len(columns)] = (np.nanmin if has_gaps else np.min)(temp_blocks, axis=2)
+        out[:, :, len(columns) + 1] = (np.nanmax if has_gaps else np.max)(temp_blocks, axis=2)
+
+    block_starts = origin + (np.arange(n_blocks)[keep] * step)
+    new_times = pd.DatetimeIndex(block_starts.astype("datetime64[s]"))
+    return out, new_times, out_columns
+
+def interpolate_cube(values, times, columns, step):
+    """将[点, 时间, 列]数据插值到更短的时间步长，返回(数据, 时间, 列名)
+
+    最后一个原始时间步也展开为完整时段，状态量在时段末保持最后的值。
+    """
+    native = native_time_step(times)
+    factor = native // step
+    t64 = pd.DatetimeIndex(times).values.astype("datetime64[s]").astype(np.int64)
+    if np.any(np.diff(t64) != native):
+        raise ValueError("时间轴存在缺口，请先补齐缺测时间步再插值")
+
+    n_points, n_times, n_cols = values.shape
+    n_out = n_times * factor
+
+    # 每个输出时间步对应的原始位置和线性插值权重
+    position = np.minimum(np.arange(n_out) / factor, n_times - 1)
+    lower = np.minimum(position.astype(np.int64), max(n_times - 2, 0))
+    upper = np.minimum(lower + 1, n_times - 1)
+    weight = (position - lower)[None, :]
+
+    out = np.empty((n_points, n_out, n_cols))
+    for col_idx, column in enumerate(columns):
+        method = RESAMPLE_RULES.get(column, {}).get("interp", "linear")
+        col_values = values[:, :, col_idx]
+        if method == "repeat":
+            out[:, :, col_idx] = np.repeat(col_values, factor, axis=1)
+        else:
+            out[:, :, col_idx] = col_values[:, lower] * (1.0 - weight) + col_values[:, upper] * weight
+
+    new_times = pd.DatetimeIndex((t64[0] + np.arange(n_out) * step).astype("datetime64[s]"))
+    return out, new_times, list(columns)
+
+def resample_cube(values, times, columns, step, temp_extremes=False, verbose=True):
+    """将驱动数据重采样到指定时间步长(秒)，返回(数据, 时间, 列名)，verbose为False时不打印提示"""
+    native = native_time_step(times)
+    if step == native:
+        return values, pd.DatetimeIndex(times), list(columns)
+
+    if step > native and step % native == 0:
+        if verbose:
+            print(f"聚合驱动数据: {native}秒 -> {step}秒")
+        return aggregate_cube(values, times, columns, step, temp_extremes, verbose)
+    if step < native and native % step == 0:
+        if verbose:
+            print(f"插值驱动数据: {native}秒 -> {step}秒")
+        return interpolate_cube(values, times, columns, step)
+
+    raise ValueError(f"目标时间步长{step}秒必须是原始步长{native}秒的整数倍或约数")
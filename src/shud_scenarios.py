@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SHUD气象驱动数据的情景和集合生成
+功能:
+1. 解析扰动定义（如Precip按0.8~1.2倍缩放、Temp增加1~4°C），生成全组合情景或蒙特卡洛抽样情景
+2. 每个驱动文件只读取一次，所有情景的扰动列一次向量化计算
+3. 未扰动的列直接复用原文件中已格式化的文本，只格式化被扰动的列；
+   与原数据完全相同的情景直接复制原文件（不使用硬链接，--append追加基准文件时不影响情景）
+4. 扰动Temp时聚合输出的Tmin、Tmax一起扰动；派生变量(PET、Rn、Ea)无法在驱动文件上重新计算，
+   扰动其输入列时拒绝带有派生列的驱动文件
+"""
+
+import shutil
+import itertools
+import numpy as np
+import pandas as pd
+
+from shud_derived import DERIVED_COLUMNS
+from shud_resample import TEMP_EXTREME_COLUMNS
+
+# 扰动方式: scale为乘以系数, shift为加上增量
+SCENARIO_MODES = {
+    "scale": 1.0,
+    "shift": 0.0,
+}
+
+# 扰动后各列的取值范围
+SCENARIO_LIMITS = {
+    "Precip": {"min": 0.0},
+    "RH": {"min": 0.1, "max": 1.0},
+    "Wind": {"min": 0.0},
+    "RADN": {"min": 0.0},
+}
+
+# 扰动某列时一起扰动的同类列
+SCENARIO_FAMILIES = {
+    "Temp": ["Temp"] + TEMP_EXTREME_COLUMNS,
+}
+
+# 派生变量依赖的驱动列（Precip不参与派生变量计算）
+DERIVED_INPUTS = ["Temp", "RH", "VP", "Wind", "RADN"]
+
+def parse_perturbation(spec):
+    """解析扰动定义，格式为 列名:方式:值1,值2,...，例如 Precip:scale:0.8,1.0,1.2"""
+    try:
+        column, mode, values = spec.split(":")
+        values = [float(v) for v in values.split(",") if v.strip()]
+    except ValueError:
+        raise ValueError(f"无法解析扰动定义 '{spec}'，格式应为 列名:方式:值1,值2,...")
+    if mode not in SCENARIO_MODES:
+        raise ValueError(f"未知的扰动方式 '{mode}'，可用: {', '.join(SCENARIO_MODES)}")
+    if not values:
+        raise ValueError(f"扰动定义 '{spec}' 没有给出取值")
+    return {"column": column, "mode": mode, "values": values}
+
+def build_scenarios(perturbations, samples=None, seed=None):
+    """生成情景参数，返回(情景名列表, [情景, 扰动]参数数组)
+
+    默认取所有扰动取值的全组合；指定samples时在每个扰动的取值范围内均匀随机抽样。
+    """
+    if samples:
+        rng = np.random.default_rng(seed)
+        low = np.array([min(p["values"]) for p in perturbations])
+        high = np.array([max(p["values"]) for p in perturbations])
+        params = rng.uniform(low, high, size=(samples, len(perturbations)))
+    else:
+        params = np.array(list(itertools.product(*[p["values"] for p in perturbations])), dtype=float)
+
+    width = len(str(len(params)))
+    names = [f"S{i + 1:0{width}d}" for i in range(len(params))]
+    return names, params
+
+def scenario_table(names, params, perturbations):
+    """情景参数表，每行一个情景"""
+    table = pd.DataFrame({"Scenario": names})
+    for k, p in enumerate(perturbations):
+        table[f"{p['column']}_{p['mode']}"] = params[:, k]
+    return table
+
+def perturbed_columns(perturbation, columns):
+    """扰动实际作用的驱动列（包括同类列），只保留文件中存在的列"""
+    family = SCENARIO_FAMILIES.get(perturbation["column"], [perturbation["column"]])
+    return [c for c in family if c in columns]
+
+def check_perturbations(perturbations, columns):
+    """检查扰动定义与驱动文件的列是否兼容，不兼容时抛出ValueError"""
+    targets = [c for p in perturbations for c in perturbed_columns(p, columns)]
+    if len(set(targets)) != len(targets):
+        raise ValueError(f"多个扰动作用于同一驱动列: {targets}")
+    derived = [spec["column"] for spec in DERIVED_COLUMNS if spec["column"] in columns]
+    inputs = [p["column"] for p in perturbations if p["column"] in DERIVED_INPUTS and perturbed_columns(p, columns)]
+    if derived and inputs:
+        raise ValueError(f"驱动文件带有派生列{derived}，扰动{inputs}后无法重新计算，"
+                         "请不使用--derived columns重新生成基准驱动数据")
+
+def identity_scenarios(params, perturbations):
+    """与原数据完全相同的情景（缩放系数全为1且增量全为0）"""
+    identity = np.array([SCENARIO_MODES[p["mode"]] for p in perturbations])
+    return np.all(params == identity, axis=1)
+
+def perturb_values(values, modes, params, columns):
+    """对[时间, 扰动]数据一次计算所有情景，返回[情景, 时间, 扰动]数组"""
+    scale = np.where([m == "scale" for m in modes], params, 1.0)
+    shift = np.where([m == "shift" for m in modes], params, 0.0)
+    out = values[None, :, :] * scale[:, None, :] + shift[:, None, :]
+    for k, column in enumerate(columns):
+        limits = SCENARIO_LIMITS.get(column, {})
+        if limits:
+            np.clip(out[:, :, k], limits.get("min", -np.inf), limits.get("max", np.inf), out=out[:, :, k])
+    return out
+
+def write_point_scenarios(task):
+    """为单个驱动文件写出一批情景（供进程池调用），返回写出的文件数"""
+    base_file, out_files, perturbations, params = task
+    with open(base_file, 'r') as f:
+        header = f.readline()
+        column_line = f.readline()
+        rows = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+    columns = column_line.split()
+    tokens = list(zip(*rows))
+
+    check_perturbations(perturbations, columns[1:])
+
+    # 扰动列在文件中的位置（第0列为Time_interval），同类列使用同一扰动参数，不存在的列不扰动
+    positions, keep, targets = [], [], []
+    for k, p in enumerate(perturbations):
+        for column in perturbed_columns(p, columns[1:]):
+            positions.append(columns.index(column))
+            keep.append(k)
+            targets.append(column)
+    if not keep:
+        for out_file in out_files:
+            shutil.copyfile(base_file, out_file)
+        return len(out_files)
+
+    identity = identity_scenarios(params[:, keep], [perturbations[k] for k in keep])
+
+    # 相邻的未扰动列预先拼接，每个情景只需拼接少数几段
+    segments, slots = [], [None] * len(positions)
+    run = []
+    for col_idx in range(len(columns)):
+        if col_idx in positions:
+            if run:
+                segments.append(list(map("\t".join, zip(*run))))
+                run = []
+            slots[positions.index(col_idx)] = len(segments)
+            segments.append(None)
+        else:
+            run.append(tokens[col_idx])
+    if run:
+        segments.append(list(map("\t".join, zip(*run))))
+
+    values = np.column_stack([np.array(tokens[pos], dtype=float) for pos in positions])
+    perturbed = perturb_values(values, [perturbations[k]["mode"] for k in keep], params[:, keep], targets)
+
+    for s_idx, out_file in enumerate(out_files):
+        if identity[s_idx]:
+            shutil.copyfile(base_file, out_file)
+            continue
+        parts = list(segments)
+        for k, slot in enumerate(slots):
+            parts[slot] = list(map("{:.4f}".format, perturbed[s_idx, :, k].tolist()))
+        with open(out_file, 'w') as f:
+            f.write(header)
+            f.write(column_line)
+            f.write("\n".join(map("\t".join, zip(*parts))))
+            f.write("\n")
+    return len(out_files)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地HTTP点位驱动数据服务
+功能:
+1. 常驻进程中保持一个ForcingStore（文件目录、格点坐标轴、最近使用的已打开数据集和
+   按内存大小淘汰的序列缓存），重复查询已缓存格点只需毫秒级
+2. 多个点的查询按文件批量读取，每个文件只读取缺少的格点，并做与驱动文件相同的单位转换
+3. 接口:
+   GET  /series?lon=&lat=&start=YYYYMMDD&end=YYYYMMDD&vars=Precip,Temp&step=1D&format=json|csv
+   GET  /batch?points=lon,lat;lon,lat&start=&end=&vars=&step=
+   POST /batch  {"points": [[lon, lat], ...], "start": "", "end": "", "vars": [], "step": ""}
+   GET  /catalog
+"""
+
+import io
+import json
+import numpy as np
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from shud_forcing import write_shud_forcing
+from shud_resample import parse_time_step
+from shud_store import ForcingStore, DEFAULT_CACHE_BYTES
+
+class PointForcingService:
+    """点位驱动数据查询，多个请求线程共享一个ForcingStore（文件目录、打开的数据集和序列缓存）
+
+    ForcingStore内部只对缓存访问和文件读取分别加锁，已缓存格点的查询不会被其他请求的文件读取阻塞。
+    """
+
+    def __init__(self, data_dir, product=None, max_open_files=64, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.store = ForcingStore(data_dir, product, cache_bytes, max_open_files)
+        # 启动时建立文件目录并读取格点坐标轴，数据目录为空时立即报错
+        self.store.refresh()
+        self.store.grid
+
+    def series(self, lons, lats, start=None, end=None, columns=None, step=None):
+        """查询若干坐标的SHUD驱动数据，返回(时间, [点, 时间, 列]数组, 列名, 格点列表, 时间步长)"""
+        times, forcing, columns, cells = self.store.series(list(zip(lons, lats)), start, end, columns, step)
+        return times, forcing, columns, cells, parse_time_step(step)
+
+    def catalog(self):
+        """文件目录和缓存状态"""
+        return self.store.summary()
+
+    def close(self):
+        self.store.close()
+
+def _json_values(array):
+    """NaN转换为null的嵌套列表"""
+    return [[None if np.isnan(v) else round(v, 6) for v in row] for row in array.tolist()]
+
+def _parse_points(spec):
+    """解析 lon,lat;lon,lat 格式的点列表"""
+    points = []
+    for item in spec.split(";"):
+        if item.strip():
+            lon, lat = item.split(",")
+            points.append((float(lon), float(lat)))
+    return points
+
+class ForcingRequestHandler(BaseHTTPRequestHandler):
+    """处理/series、/batch和/catalog请求"""
+
+    service = None
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}")
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, obj):
+        self._send(status, json.dumps(obj, ensure_ascii=False))
+
+    def _query(self, params, points):
+        """执行查询，返回JSON响应或SHUD格式文本"""
+        columns = params.get("vars")
+        if isinstance(columns, str):
+            columns = [c for c in columns.split(",") if c]
+        times, forcing, columns, cells, time_step = self.service.series(
+            [p[0] for p in points], [p[1] for p in points],
+            params.get("start"), params.get("end"), columns, params.get("step"))
+
+        if params.get("format") == "csv":
+            if len(points) != 1:
+                raise ValueError("CSV格式只支持单个点")
+            buffer = io.StringIO()
+            write_shud_forcing(buffer, times, forcing[0], columns, time_step)
+            return None, buffer.getvalue()
+
+        series = [{"point": {"lon": lon, "lat": lat}, "cell": cell, "values": _json_values(forcing[k])}
+                  for k, ((lon, lat), cell) in enumerate(zip(points, cells))]
+        return {"columns": columns, "times": [t.isoformat() for t in times], "series": series}, None
+
+    def _handle(self, path, params, points):
+        try:
+            if path == "/catalog":
+                self._send_json(200, self.service.catalog())
+                return
+            if path == "/series":
+                points = [(float(params["lon"]), float(params["lat"]))]
+            elif path != "/batch":
+                self._send_json(404, {"error": f"未知的接口: {path}"})
+                return
+            if not points:
+                raise ValueError("没有指定查询点")
+            result, text = self._query(params, points)
+            if text is not None:
+                self._send(200, text, "text/csv; charset=utf-8")
+            elif path == "/series":
+                single = result["series"][0]
+                self._send_json(200, {"columns": result["columns"], "times": result["times"], **single})
+            else:
+                self._send_json(200, result)
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            points = _parse_points(params["points"]) if "points" in params else []
+        except ValueError as e:
+            self._send_json(400, {"error": f"无法解析points: {str(e)}"})
+            return
+        self._handle(url.path, params, points)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = json.loads(self.rfile.read(length) or b"{}")
+            points = [(float(p[0]), float(p[1])) for p in params.get("points", [])]
+        except (ValueError, TypeError, IndexError) as e:
+            self._send_json(400, {"error": f"无法解析请求: {str(e)}"})
+            return
+        self._handle(url.path, params, points)
+
+def serve(service, host="127.0.0.1", port=8765):
+    """启动HTTP服务（阻塞，Ctrl+C结束）"""
+    handler = type("Handler", (ForcingRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"驱动数据服务已启动: http://{host}:{port}/（{len(service.store.files)}个文件）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("停止服务")
+    finally:
+        server.server_close()
+        service.close()
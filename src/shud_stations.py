@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+站点观测数据的读取、空间关联和时间对齐
+功能:
+1. 读取站点观测表（每行一个站点一个时间，列名与SHUD驱动列相同，如Precip、Temp），
+   一次性重排为[站点, 时间, 列]数组
+2. 用空间索引(cKDTree)将站点关联到其所在的GLDAS格点，降尺度站点按所属格点关联
+3. 将观测数据和驱动数据按相同的时间块（与步长整数倍对齐）求平均，对齐到共同的时间轴
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+# 观测表中站点ID和时间列的可选列名
+OBS_ID_COLUMNS = ["ID", "Station_ID", "id", "station"]
+OBS_TIME_COLUMNS = ["Time", "Date", "time", "date"]
+
+def _find_column(frame, candidates, what):
+    """在表中查找第一个存在的列名"""
+    column = next((c for c in candidates if c in frame.columns), None)
+    if column is None:
+        raise ValueError(f"观测表缺少{what}列（可用列名: {', '.join(candidates)}）")
+    return column
+
+def read_observations(obs_file, station_ids, columns):
+    """读取站点观测表，返回([站点, 时间, 列]数组, 时间, 列名)
+
+    只保留station_ids中的站点和columns中的列，没有观测的单元为NaN。
+    """
+    frame = pd.read_csv(obs_file)
+    id_col = _find_column(frame, OBS_ID_COLUMNS, "站点ID")
+    time_col = _find_column(frame, OBS_TIME_COLUMNS, "时间")
+    obs_columns = [c for c in columns if c in frame.columns]
+    if not obs_columns:
+        raise ValueError(f"观测表中没有可用的变量列（需要: {', '.join(columns)}）")
+
+    station_ids = [str(s) for s in station_ids]
+    frame[id_col] = frame[id_col].astype(str)
+    unknown = sorted(set(frame[id_col]) - set(station_ids))
+    if unknown:
+        print(f"  警告: 观测表中{len(unknown)}个站点不在站点文件中，已忽略: {', '.join(unknown[:10])}")
+    frame = frame[frame[id_col].isin(station_ids)]
+
+    # 站点和时间编码为整数后一次性写入数组，重复记录取最后一条
+    station_index = pd.Index(station_ids).get_indexer(frame[id_col])
+    times, time_index = np.unique(pd.to_datetime(frame[time_col]).values.astype("datetime64[s]"),
+                                  return_inverse=True)
+    obs = np.full((len(station_ids), len(times), len(obs_columns)), np.nan)
+    obs[station_index, time_index.ravel()] = frame[obs_columns].to_numpy(dtype=float)
+
+    print(f"读取观测数据: {len(frame)}条记录，{int(np.any(np.isfinite(obs), axis=(1, 2)).sum())}个站点，"
+          f"变量: {', '.join(obs_columns)}")
+    return obs, pd.DatetimeIndex(times), obs_columns
+
+def link_stations(station_lons, station_lats, cells, resolution):
+    """将站点关联到所在的GLDAS格点
+
+    返回(每个站点关联的格点序号, 每个驱动序列所属的格点序号, 格点数)，站点不在任何格点内时为-1。
+    降尺度时同一格点有多个驱动站点，它们共享同一个格点序号。
+    """
+    coords = np.array([[c["lon"], c["lat"]] for c in cells], dtype=float)
+    unique_coords, cell_of_series = np.unique(coords, axis=0, return_inverse=True)
+    tree = cKDTree(unique_coords)
+
+    # 用切比雪夫距离查询，站点落在格点范围内即关联
+    query = np.column_stack([np.asarray(station_lons, dtype=float), np.asarray(station_lats, dtype=float)])
+    dist, idx = tree.query(query, p=np.inf, distance_upper_bound=resolution / 2.0 * (1.0 + 1e-9))
+    station_cell = np.where(np.isfinite(dist), idx, -1)
+
+    n_linked = int((station_cell >= 0).sum())
+    print(f"{n_linked}/{len(station_cell)}个站点位于驱动格点内")
+    return station_cell, cell_of_series.ravel(), len(unique_coords)
+
+def representative_series(cell_of_series, cells, n_cells):
+    """每个格点的代表驱动序列: 包含点数最多的站点（未降尺度时即格点本身）"""
+    n_points = np.array([c.get("n_points", 1) for c in cells], dtype=float)
+    # 按(格点, 点数)排序后取每个格点的最后一个
+    order = np.lexsort((n_points, cell_of_series))
+    last = np.r_[np.flatnonzero(np.diff(cell_of_series[order])), len(order) - 1]
+    series = np.full(n_cells, -1, dtype=np.int64)
+    series[cell_of_series[order][last]] = order[last]
+    return series
+
+def block_means(values, times, step):
+    """将[序列, 时间, 列]数据按step秒的时间块求平均（忽略NaN），返回(数据, 块开始时间, 每个时间步所在的块)
+
+    时间块与步长的整数倍对齐（日尺度即从UTC零点开始），没有数据的块不输出。
+    """
+    t64 = pd.DatetimeIndex(times).values.astype("datetime64[s]").astype(np.int64)
+    block_start = t64 - t64 % step
+    starts, block_of_time = np.unique(block_start, return_inverse=True)
+    block_of_time = block_of_time.ravel()
+    if len(starts) == len(t64):
+        return values, pd.DatetimeIndex(starts.astype("datetime64[s]")), block_of_time
+
+    # 时间已排序，每个块是连续的一段，用reduceat求和
+    edges = np.r_[0, np.flatnonzero(np.diff(block_of_time)) + 1]
+    valid = np.isfinite(values)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), edges, axis=1)
+    counts = np.add.reduceat(valid, edges, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    return means, pd.DatetimeIndex(starts.astype("datetime64[s]")), block_of_time
+
+def common_step(*steps):
+    """对齐观测和驱动数据的共同时间步长（较长的一个），要求较长步长是较短步长的整数倍"""
+    step = max(steps)
+    if any(step % s for s in steps):
+        raise ValueError(f"时间步长{list(steps)}秒不能对齐到共同的时间轴")
+    return step
+
+def align_series(model, model_times, obs, obs_times, step):
+    """将驱动数据和观测数据按step秒的时间块平均后对齐到共同的时间块，返回(驱动, 观测, 块开始时间)
+
+    两者都有效的单元才保留，其余设为NaN，保证配对样本一致。
+    """
+    model_blocks, model_starts, _ = block_means(model, model_times, step)
+    obs_blocks, obs_starts, _ = block_means(obs, obs_times, step)
+    starts, model_idx, obs_idx = np.intersect1d(model_starts.values, obs_starts.values,
+                                                assume_unique=True, return_indices=True)
+    model_aligned = model_blocks[:, model_idx]
+    obs_aligned = obs_blocks[:, obs_idx]
+    paired = np.isfinite(model_aligned) & np.isfinite(obs_aligned)
+    return np.where(paired, model_aligned, np.nan), np.where(paired, obs_aligned, np.nan), pd.DatetimeIndex(starts)
@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SHUD气象驱动数据的Python接口
+功能:
+1. ForcingStore(data_dir).series(points, start, end, variables)直接返回任意坐标的SHUD驱动数据，
+   不需要命令行参数，也不打印处理进度（缺少变量等数据问题通过warnings模块提示），
+   可在notebook和其他程序中调用
+2. 按需逐步解析: 首次查询时才建立文件目录（按文件名解析时间，不打开文件）和格点坐标轴，
+   再将坐标对齐到格点，最后只批量读取缓存中缺少的(格点, 月份)数据
+3. 已读取的数据按(格点, 月份)保存在按内存大小淘汰的LRU缓存中，多次调用之间复用
+4. stream()按时间顺序逐个时次返回(时间, [点, 列]数组)，后台线程只预读有限个文件，
+   内存占用与时间长度无关，适合在线同化、流式质控等只需要逐时次数据的使用方
+
+示例:
+    from shud_store import ForcingStore
+    store = ForcingStore("data/gldas_data")
+    times, values, columns, cells = store.series([(11.2, 43.8)], "20230501", "20230531", ["Precip", "Temp"])
+    for timestamp, values in store.stream([(11.2, 43.8)], "20000101", "20191231"):
+        ...
+"""
+
+import os
+import warnings
+import threading
+import numpy as np
+import pandas as pd
+import xarray as xr
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ldas_products import get_product, available_variables, read_product_points
+from shud_forcing import convert_cube, forcing_columns
+from shud_gaps import fill_cube_gaps
+from shud_resample import parse_time_step, resample_cube
+from shud_catalog import (get_nc4_files, extract_date_from_filename, read_grid_axes,
+                          lookup_grid_indices, format_cell_id)
+
+# 默认缓存上限(字节)
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+# 流式读取时默认预读的文件数
+DEFAULT_READ_AHEAD = 4
+
+def _read_file_points(nc_file, product, variables, lat_idx, lon_idx):
+    """打开单个文件，批量读取所有格点后立即关闭"""
+    with xr.open_dataset(nc_file) as ds:
+        return read_product_points(ds, product, variables, lat_idx, lon_idx)
+
+def stream_file_points(files, product, variables, lat_idx, lon_idx, read_ahead=DEFAULT_READ_AHEAD):
+    """按顺序逐个返回每个文件中所有格点的原始变量[格点, 变量]
+
+    后台线程最多提前读取read_ahead个文件，生成器提前关闭时取消尚未开始的读取。
+    """
+    read_ahead = max(1, read_ahead)
+    pending = deque()
+    files = iter(files)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            for nc_file in files:
+                pending.append(executor.submit(_read_file_points, nc_file, product, variables, lat_idx, lon_idx))
+                if len(pending) >= read_ahead:
+                    break
+            while pending:
+                values = pending.popleft().result()
+                nc_file = next(files, None)
+                if nc_file is not None:
+                    pending.append(executor.submit(_read_file_points, nc_file, product, variables, lat_idx, lon_idx))
+                yield values
+        finally:
+            for future in pending:
+                future.cancel()
+
+class SeriesCache:
+    """按内存大小淘汰的LRU缓存，值为带nbytes属性的对象"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """取出缓存项并标记为最近使用，不存在时返回None"""
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """加入或更新缓存项，超过上限时淘汰最久未用的项"""
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self._items[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes and len(self._items) > 1:
+            _, evicted = self._items.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self._items.clear()
+        self.nbytes = 0
+
+class _MonthBlock:
+    """单个格点一个月的原始变量，loaded标记已读取的文件"""
+
+    def __init__(self, files, n_vars):
+        self.files = files
+        self.values = np.full((len(files), n_vars), np.nan)
+        self.loaded = np.zeros(len(files), dtype=bool)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.loaded.nbytes
+
+class ForcingStore:
+    """按需读取LDAS文件的点位驱动数据存储
+
+    可在多个线程间共享: 文件目录和缓存的访问只持有短锁，文件读取另用一个锁串行
+    （HDF5不支持并发读取），已缓存数据的查询不需要等待其他线程的文件读取。
+    """
+
+    def __init__(self, data_dir="data/gldas_data", product=None, cache_bytes=DEFAULT_CACHE_BYTES, max_open_files=64):
+        self.data_dir = data_dir
+        self.product = get_product(product)
+        self.cache = SeriesCache(cache_bytes)
+        self.max_open_files = max_open_files
+        self._datasets = OrderedDict()
+        self._dir_stamp = None
+        self._times = None
+        self._files = None
+        self._grid = None
+        self._variables = None
+        self._lock = threading.RLock()
+        self._io_lock = threading.Lock()
+
+    # ---------- 文件目录 ----------
+
+    def _directory_stamp(self):
+        """数据目录和downloads子目录的修改时间，有文件增删时变化"""
+        dirs = [self.data_dir, os.path.join(self.data_dir, "downloads")]
+        return tuple(os.stat(d).st_mtime_ns if os.path.isdir(d) else 0 for d in dirs)
+
+    def refresh(self):
+        """数据目录有变化时重新建立文件目录，返回是否重建"""
+        with self._lock:
+            stamp = self._directory_stamp()
+            if stamp == self._dir_stamp:
+                return False
+            dated = [(extract_date_from_filename(f), f) for f in get_nc4_files(self.data_dir, self.product["file_pattern"], verbose=False)]
+            dated = sorted((d, f) for d, f in dated if d is not None)
+            if not dated:
+                raise FileNotFoundError(f"数据目录中没有{self.product['name']}文件: {self.data_dir}")
+            self._times = pd.DatetimeIndex([d for d, _ in dated])
+            self._files = [f for _, f in dated]
+            self._dir_stamp = stamp
+            return True
+
+    def snapshot(self):
+        """刷新后返回(时间, 文件列表)，一次查询内使用同一份文件目录"""
+        with self._lock:
+            self.refresh()
+            return self._times, self._files
+
+    @property
+    def times(self):
+        """文件目录中各文件的时间"""
+        if self._times is None:
+            self.refresh()
+        return self._times
+
+    @property
+    def files(self):
+        """按时间排序的文件列表"""
+        if self._files is None:
+            self.refresh()
+        return self._files
+
+    @property
+    def grid(self):
+        """(纬度坐标轴, 经度坐标轴)，从第一个文件读取一次"""
+        if self._grid is None:
+            with self._io_lock:
+                if self._grid is None:
+                    self._grid = read_grid_axes(self.files[0])
+        return self._grid
+
+    @property
+    def variables(self):
+        """文件中可提取的标准变量"""
+        if self._variables is None:
+            with self._io_lock:
+                if self._variables is None:
+                    with xr.open_dataset(self.files[0]) as ds:
+                        variables = available_variables(self.product, ds.variables, verbose=False)
+                    missing = [name for name in self.product["variables"] if name not in variables]
+                    if missing:
+                        warnings.warn(f"{self.product['name']}数据中缺少变量 {missing}，相应的驱动列使用默认值")
+                    self._variables = variables
+        return self._variables
+
+    def _dataset(self, nc_file):
+        """从LRU中取已打开的数据集，超过上限时关闭最久未用的（调用方持有_io_lock）"""
+        ds = self._datasets.pop(nc_file, None)
+        if ds is None:
+            ds = xr.open_dataset(nc_file)
+        self._datasets[nc_file] = ds
+        while len(self._datasets) > self.max_open_files:
+            _, old = self._datasets.popitem(last=False)
+            old.close()
+        return ds
+
+    def close(self):
+        """关闭所有打开的数据集"""
+        with self._io_lock:
+            for ds in self._datasets.values():
+                ds.close()
+            self._datasets.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 格点和时间 ----------
+
+    def locate(self, lons, lats):
+        """将坐标对齐到最近格点，返回(纬度索引, 经度索引)数组"""
+        grid_lats, grid_lons = self.grid
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lat_idx = lookup_grid_indices(lats, grid_lats)
+        lon_idx = lookup_grid_indices(lons, grid_lons)
+        outside = ((np.abs(grid_lats[lat_idx] - lats) > np.abs(np.diff(grid_lats)).max())
+                   | (np.abs(grid_lons[lon_idx] - lons) > np.abs(np.diff(grid_lons)).max()))
+        if outside.any():
+            raise ValueError(f"点位于数据网格范围之外: {[f'{x},{y}' for x, y in zip(lons[outside], lats[outside])]}")
+        return lat_idx, lon_idx
+
+    def time_range(self, start=None, end=None, times=None):
+        """[开始日期, 结束日期]（只给日期时结束日期包含当天）在文件目录中的索引范围[i0, i1)"""
+        times = self.times if times is None else times
+        t0 = pd.Timestamp(start) if start else times[0]
+        if end:
+            t1 = pd.Timestamp(end)
+            t1 = t1 + pd.Timedelta(days=1) if t1 == t1.normalize() else t1 + pd.Timedelta(seconds=1)
+        else:
+            t1 = times[-1] + pd.Timedelta(seconds=1)
+        i0, i1 = times.searchsorted(t0, side="left"), times.searchsorted(t1, side="left")
+        if i1 <= i0:
+            raise ValueError(f"时间范围内没有数据文件: {start} ~ {end}")
+        return int(i0), int(i1)
+
+    @staticmethod
+    def _month_blocks(times, i0, i1):
+        """将[i0, i1)按月份切分，返回(月份, 整月范围, 请求范围)列表"""
+        months = times.year * 100 + times.month
+        blocks = []
+        i = i0
+        while i < i1:
+            month = months[i]
+            m0 = int(np.searchsorted(months, month, side="left"))
+            m1 = int(np.searchsorted(months, month, side="right"))
+            blocks.append((int(month), (m0, m1), (i, min(m1, i1))))
+            i = m1
+        return blocks
+
+    # ---------- 读取 ----------
+
+    def read_raw(self, lat_idx, lon_idx, i0, i1, catalog=None):
+        """读取格点在文件[i0, i1)上的原始变量，返回[格点, 时间, 变量]数组
+
+        先查缓存，只对缺少的(格点, 文件)按文件批量读取，同一文件中的所有格点一次读取。
+        catalog为snapshot()返回的文件目录，默认使用当前文件目录。
+        """
+        times, all_files = catalog or self.snapshot()
+        point_cells = list(zip(np.asarray(lat_idx).tolist(), np.asarray(lon_idx).tolist()))
+        cells = list(dict.fromkeys(point_cells))
+        n_vars = len(self.variables)
+
+        # 持有短锁取出(或新建)各月数据块
+        months = []
+        with self._lock:
+            for month, (m0, m1), (r0, r1) in self._month_blocks(times, i0, i1):
+                files = tuple(all_files[m0:m1])
+                blocks = {}
+                for cell in cells:
+                    block = self.cache.get((cell, month))
+                    # 文件目录变化（新文件到达）后旧的月份数据块作废
+                    if block is None or block.files != files:
+                        block = _MonthBlock(files, n_vars)
+                        self.cache.put((cell, month), block)
+                    blocks[cell] = block
+                months.append((month, files, blocks, r0 - m0, r1 - m0))
+
+        # 只有缺少数据时才等待文件读取锁；拿到锁后重新检查，其他线程可能已读取
+        if any(not block.loaded[k0:k1].all() for _, _, blocks, k0, k1 in months for block in blocks.values()):
+            with self._io_lock:
+                for month, files, blocks, k0, k1 in months:
+                    for k in range(k0, k1):
+                        missing = [cell for cell in cells if not blocks[cell].loaded[k]]
+                        if not missing:
+                            continue
+                        values = read_product_points(self._dataset(files[k]), self.product, self.variables,
+                                                     [c[0] for c in missing], [c[1] for c in missing])
+                        for cell, row in zip(missing, values):
+                            blocks[cell].values[k] = row
+                            blocks[cell].loaded[k] = True
+
+        with self._lock:
+            for month, files, blocks, k0, k1 in months:
+                for cell in cells:
+                    # 重新放入缓存以更新LRU顺序和占用的内存
+                    self.cache.put((cell, month), blocks[cell])
+            cube = np.stack([np.concatenate([blocks[cell].values[k0:k1] for _, _, blocks, k0, k1 in months])
+                             for cell in cells])
+        return cube[[cells.index(cell) for cell in point_cells]]
+
+    @staticmethod
+    def _parse_points(points):
+        """(lon, lat)或'lon,lat'，单个或列表，统一为[(lon, lat), ...]"""
+        if isinstance(points, (str, tuple)):
+            points = [points]
+        return [tuple(map(float, p.split(","))) if isinstance(p, str) else (float(p[0]), float(p[1])) for p in points]
+
+    def series(self, points, start=None, end=None, variables=None, step=None, max_gap_steps=8):
+        """查询若干坐标的SHUD驱动数据
+
+        points为(lon, lat)列表或'lon,lat'字符串列表；variables为驱动列（如Precip、Temp），默认全部；
+        step为聚合步长（如1D）。缺失的文件按产品时间步补入规则时间轴，缺测按process_gldas_for_shud
+        相同的规则插补（短缺口插值，超过max_gap_steps的用气候值）。
+        返回(时间, [点, 时间, 列]数组, 列名, 格点列表)。
+        """
+        coords = self._parse_points(points)
+        lons = [c[0] for c in coords]
+        lats = [c[1] for c in coords]
+
+        # 文件目录 -> 格点 -> 只读取缺少的数据
+        catalog = self.snapshot()
+        lat_idx, lon_idx = self.locate(lons, lats)
+        i0, i1 = self.time_range(start, end, catalog[0])
+        raw = self.read_raw(lat_idx, lon_idx, i0, i1, catalog)
+        times = catalog[0][i0:i1]
+
+        grid_lats, grid_lons = self.grid
+        cells = [{"id": format_cell_id(grid_lons[j], grid_lats[i]), "lon": float(grid_lons[j]), "lat": float(grid_lats[i])}
+                 for i, j in zip(lat_idx, lon_idx)]
+
+        # 补齐缺失的时间步并插补缺测，保证返回的时间轴与声明的步长一致
+        raw, times, gap_report = fill_cube_gaps(raw, times, self.variables, [c["id"] for c in cells],
+                                                self.product["timestep_hours"] * 3600, max_gap_steps, verbose=False)
+        if gap_report["missing_ranges"]:
+            n_steps = sum(r["Steps"] for r in gap_report["missing_ranges"])
+            warnings.warn(f"时间范围内缺少{n_steps}个时间步的文件，已插补")
+        unfilled = sum(r["Unfilled"] for r in gap_report["records"])
+        if unfilled:
+            warnings.warn(f"{unfilled}个单元无法插补（该点该变量没有任何有效数据），保留为NaN")
+
+        forcing, columns = convert_cube(raw, self.variables, verbose=False)
+        time_step = parse_time_step(step)
+        if time_step:
+            forcing, times, columns = resample_cube(forcing, times, columns, time_step, verbose=False)
+        if variables:
+            unknown = [v for v in variables if v not in columns]
+            if unknown:
+                raise ValueError(f"未知的驱动列: {unknown}，可用: {', '.join(columns)}")
+            forcing = forcing[:, :, [columns.index(v) for v in variables]]
+            columns = list(variables)
+        return times, forcing, columns, cells
+
+    def stream(self, points, start=None, end=None, variables=None, read_ahead=DEFAULT_READ_AHEAD):
+        """按时间顺序逐个时次返回(时间, [点, 列]数组)
+
+        与series()使用相同的批量读取和单位转换，但不经过序列缓存，也不保持文件打开，
+        任意时间长度的内存占用只取决于点数和read_ahead。只返回实际存在的文件，不插补缺测，
+        使用方需要根据返回的时间判断缺失的时次。
+        """
+        coords = self._parse_points(points)
+        all_times, all_files = self.snapshot()
+        lat_idx, lon_idx = self.locate([c[0] for c in coords], [c[1] for c in coords])
+        i0, i1 = self.time_range(start, end, all_times)
+        times = all_times[i0:i1]
+        files = all_files[i0:i1]
+
+        columns = forcing_columns()
+        if variables:
+            unknown = [v for v in variables if v not in columns]
+            if unknown:
+                raise ValueError(f"未知的驱动列: {unknown}，可用: {', '.join(columns)}")
+            column_index = [columns.index(v) for v in variables]
+        else:
+            column_index = list(range(len(columns)))
+
+        # 每个文件只读取一次不重复的格点，再展开回输入点的顺序
+        cells = list(dict.fromkeys(zip(lat_idx.tolist(), lon_idx.tolist())))
+        index = [cells.index(cell) for cell in zip(lat_idx.tolist(), lon_idx.tolist())]
+        rows = stream_file_points(files, self.product, self.variables,
+                                  [c[0] for c in cells], [c[1] for c in cells], read_ahead)
+
+        # 按read_ahead个时次一组做单位转换，减少逐时次的numpy调用开销
+        block = max(1, read_ahead)
+        for b0 in range(0, len(files), block):
+            raw = np.stack([next(rows) for _ in range(min(block, len(files) - b0))], axis=1)
+            forcing, _ = convert_cube(raw[index], self.variables, verbose=False)
+            for k in range(forcing.shape[1]):
+                yield times[b0 + k], forcing[:, k, column_index]
+
+    def summary(self):
+        """文件目录和缓存状态"""
+        times, files = self.snapshot()
+        variables = self.variables
+        with self._lock:
+            return {
+                "product": self.product["name"],
+                "files": len(files),
+                "start": times[0].isoformat(),
+                "end": times[-1].isoformat(),
+                "variables": variables,
+                "cached_blocks": len(self.cache),
+                "cached_bytes": self.cache.nbytes,
+                "open_datasets": len(self._datasets),
+            }
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+GLDAS驱动数据与站点观测的对比验证
+功能:
+1. 对已对齐的[站点, 时间, 变量]驱动和观测数据，按季节一次计算所有站点所有变量的
+   偏差(Bias)、均方根误差(RMSE)、相关系数(R)和Kling-Gupta效率系数(KGE)
+2. 汇总为一张表（每个站点、变量、季节一行）
+3. 可选为每个站点绘制观测与驱动数据的对比图
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+# 季节划分（北半球气象季节），All为全部时间
+SEASONS = {
+    "All": list(range(1, 13)),
+    "DJF": [12, 1, 2],
+    "MAM": [3, 4, 5],
+    "JJA": [6, 7, 8],
+    "SON": [9, 10, 11],
+}
+
+# 计算相关系数和KGE所需的最少配对样本数
+MIN_PAIRS = 3
+
+VARIABLE_LABELS = {
+    "Precip": "降水量 (mm/day)",
+    "Temp": "温度 (°C)",
+    "RH": "相对湿度 (0-1)",
+    "Wind": "风速 (m/s)",
+    "RADN": "辐射 (W/m²)",
+}
+
+def validation_metrics(model, obs):
+    """沿时间轴计算验证指标，model和obs为[站点, 时间, 变量]的配对数据（缺测为NaN）
+
+    返回指标字典，每个指标为[站点, 变量]数组。
+    """
+    valid = np.isfinite(model) & np.isfinite(obs)
+    n = valid.sum(axis=1)
+    m = np.where(valid, model, 0.0)
+    o = np.where(valid, obs, 0.0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        count = np.where(n > 0, n, np.nan)
+        mean_m = m.sum(axis=1) / count
+        mean_o = o.sum(axis=1) / count
+        dm = np.where(valid, model - mean_m[:, None], 0.0)
+        do = np.where(valid, obs - mean_o[:, None], 0.0)
+        std_m = np.sqrt((dm ** 2).sum(axis=1) / count)
+        std_o = np.sqrt((do ** 2).sum(axis=1) / count)
+
+        r = (dm * do).sum(axis=1) / count / (std_m * std_o)
+        r = np.where(n >= MIN_PAIRS, r, np.nan)
+        alpha = std_m / std_o
+        beta = mean_m / mean_o
+        kge = 1.0 - np.sqrt((r - 1.0) ** 2 + (alpha - 1.0) ** 2 + (beta - 1.0) ** 2)
+
+        return {
+            "N": n,
+            "Obs_Mean": mean_o,
+            "Model_Mean": mean_m,
+            "Bias": mean_m - mean_o,
+            "RMSE": np.sqrt(((m - o) ** 2).sum(axis=1) / count),
+            "R": r,
+            "KGE": kge,
+        }
+
+def validate_cube(model, obs, times, station_ids, cell_ids, columns):
+    """按季节计算所有站点所有变量的验证指标，返回汇总表"""
+    months = np.asarray(pd.DatetimeIndex(times).month)
+    frames = []
+    for season, season_months in SEASONS.items():
+        in_season = np.isin(months, season_months)
+        if not in_season.any():
+            continue
+        metrics = validation_metrics(model[:, in_season], obs[:, in_season])
+
+        # [站点, 变量]展平为长表
+        n_stations, n_cols = metrics["N"].shape
+        frame = pd.DataFrame({
+            "Station_ID": np.repeat(np.asarray(station_ids, dtype=str), n_cols),
+            "Cell_ID": np.repeat(np.asarray(cell_ids, dtype=str), n_cols),
+            "Variable": np.tile(np.asarray(columns, dtype=str), n_stations),
+            "Season": season,
+        })
+        for name, values in metrics.items():
+            frame[name] = values.ravel()
+        frames.append(frame[frame["N"] > 0])
+
+    summary = pd.concat(frames, ignore_index=True)
+    season_order = {name: i for i, name in enumerate(SEASONS)}
+    summary = summary.sort_values(["Station_ID", "Variable", "Season"],
+                                  key=lambda s: s.map(season_order) if s.name == "Season" else s)
+    return summary.reset_index(drop=True)
+
+def plot_station_validation(times, model, obs, columns, station_id, cell_id, output_file):
+    """绘制单个站点的观测与驱动数据对比图，model和obs为[时间, 变量]"""
+    n_cols = len(columns)
+    fig, axs = plt.subplots(n_cols, 1, figsize=(12, 3 * n_cols), sharex=True, squeeze=False)
+    for i, column in enumerate(columns):
+        ax = axs[i, 0]
+        ax.plot(times, obs[:, i], '-', color="k", label="观测")
+        ax.plot(times, model[:, i], '-', color=f"C{i}", alpha=0.8, label="GLDAS")
+        ax.set_ylabel(VARIABLE_LABELS.get(column, column))
+        ax.grid(True)
+    axs[0, 0].legend(loc="upper right")
+    fig.suptitle(f"站点 {station_id} 与GLDAS格点 {cell_id} 的对比", fontsize=14)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=150)
+    plt.close(fig)
+    return output_file
+
+def write_validation_figures(times, model, obs, columns, station_ids, cell_ids, fig_dir):
+    """为每个有观测的站点绘制对比图"""
+    os.makedirs(fig_dir, exist_ok=True)
+    n_figures = 0
+    for s_idx, station_id in enumerate(station_ids):
+        if not np.isfinite(obs[s_idx]).any():
+            continue
+        plot_station_validation(times, model[s_idx], obs[s_idx], columns, station_id, cell_ids[s_idx],
+                                os.path.join(fig_dir, f"{station_id}.png"))
+        n_figures += 1
+    print(f"已保存{n_figures}张站点对比图至: {fig_dir}")
+    return n_figures
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+监视数据目录中新到达的LDAS文件
+功能:
+1. 用os.scandir定时扫描数据目录和downloads子目录，只比较文件名、大小和修改时间，不打开文件
+2. 防抖: 文件在两次扫描之间大小和修改时间都没有变化、且最后修改已超过指定秒数才认为下载完成，
+   避免读取正在写入的文件
+3. 每次扫描返回新出现且已稳定的文件，由调用方增量提取
+"""
+
+import os
+import time
+import fnmatch
+
+def scan_directories(directories, pattern):
+    """列出目录中匹配的文件，返回{路径: (大小, 修改时间ns)}"""
+    files = {}
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and fnmatch.fnmatch(entry.name, pattern):
+                    st = entry.stat()
+                    files[entry.path] = (st.st_size, st.st_mtime_ns)
+    return files
+
+def stable_files(current, previous, settle_seconds, now=None):
+    """两次扫描之间没有变化、且最后修改已超过settle_seconds的非空文件"""
+    now_ns = int((now if now is not None else time.time()) * 1e9)
+    settle_ns = int(settle_seconds * 1e9)
+    return [path for path, (size, mtime_ns) in current.items()
+            if size > 0 and previous.get(path) == (size, mtime_ns) and now_ns - mtime_ns >= settle_ns]
+
+def watch_directories(directories, pattern, known, poll_seconds=60, settle_seconds=120):
+    """持续监视目录，每次扫描后返回新出现且已稳定的文件列表（可能为空）
+
+    known为已处理过的文件集合，返回的文件会加入其中。
+    """
+    previous = {}
+    while True:
+        current = scan_directories(directories, pattern)
+        candidates = {path: stat for path, stat in current.items() if path not in known}
+        ready = sorted(stable_files(candidates, previous, settle_seconds))
+        known.update(ready)
+        previous = candidates
+        yield ready
+        time.sleep(poll_seconds)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+率定时段驱动数据切片工具
+功能:
+1. 直接从已有的提取缓存(cache/*-points.cache.npz)或已生成的驱动文件读取数据，不访问NetCDF文件；
+   驱动文件经过高程降尺度或偏差校正时（缓存无法重现）自动改为从驱动文件切片
+2. 一次读取、插补和单位转换后，按任意[开始, 结束]时段（如预热期、率定期、验证期）
+   和任意点子集切片，所有时段的边界一次向量化查找
+3. 每个时段输出独立的csv/目录和meteo.tsd.forc，Time_interval从时段开始重新计算，并行写出
+4. 驱动文件带有派生变量(--derived)时，缓存模式下重新计算派生变量，
+   sidecar模式的derived/目录同样按时段切片
+"""
+
+import os
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from ldas_products import PRODUCTS, DEFAULT_PRODUCT, get_product
+from shud_bias import bias_transfer_file
+from shud_derived import compute_derived, DERIVED_COLUMNS
+from shud_forcing import load_cache_cube, convert_cube, write_shud_forcing_csv, read_shud_forcing_csv
+from shud_gaps import fill_cube_gaps
+from shud_resample import parse_time_step, native_time_step, resample_cube
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="按率定时段从已有缓存切片SHUD气象驱动数据")
+    parser.add_argument("--output-dir", default="output", help="process_gldas_for_shud.py的输出目录（读取cache/）")
+    parser.add_argument("--product", choices=sorted(PRODUCTS), default=DEFAULT_PRODUCT, help="LDAS数据产品（决定缓存文件前缀）")
+    parser.add_argument("--from-csv", action="store_true",
+                        help="从已生成的驱动文件(csv/)切片，保留质量控制屏蔽、降尺度、偏差校正等处理结果"
+                             "（检测到降尺度或偏差校正时自动使用）")
+    parser.add_argument("--window", action="append", required=True,
+                        help="时段定义 名称:开始:结束，日期为YYYYMMDD（结束日期包含当天），可重复指定")
+    parser.add_argument("--points", nargs='+', type=str, help="只输出这些驱动文件ID（如X10.375Y43.125），默认全部")
+    parser.add_argument("--window-dir", type=str, help="时段输出目录，默认为输出目录下的windows/")
+    parser.add_argument("--time-step", type=str, help="输出驱动数据的时间步长，如1D、1H，默认与原始数据相同")
+    parser.add_argument("--max-gap-steps", type=int, default=8, help="超过此步数的缺测段使用气候平均值插补")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="并行进程数，默认为CPU核数")
+    return parser.parse_args()
+
+def parse_window(spec):
+    """解析时段定义 名称:开始:结束，返回(名称, 开始时间, 结束时间(不含))"""
+    try:
+        name, start, end = spec.split(":")
+        start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+    except ValueError:
+        raise ValueError(f"无法解析时段定义 '{spec}'，格式应为 名称:YYYYMMDD:YYYYMMDD")
+    # 只给日期时结束日期包含当天
+    if end == end.normalize():
+        end = end + pd.Timedelta(days=1)
+    if end <= start:
+        raise ValueError(f"时段 '{name}' 的结束时间早于开始时间")
+    return name, start, end
+
+def window_bounds(times, windows):
+    """一次查找所有时段在时间轴上的[开始, 结束)索引"""
+    t64 = pd.DatetimeIndex(times).values
+    starts = np.searchsorted(t64, np.array([w[1] for w in windows], dtype="datetime64[ns]"), side="left")
+    ends = np.searchsorted(t64, np.array([w[2] for w in windows], dtype="datetime64[ns]"), side="left")
+    return starts, ends
+
+def load_cache_forcing(cache_dir, prefix, point_ids=None, max_gap_steps=8, derived=False):
+    """从缓存文件读取驱动数据，插补缺测并转换单位，返回([点, 时间, 列], 时间, 点ID, 列名)
+
+    derived为True时与process_gldas_for_shud.py相同，派生变量作为附加列。
+    """
+    cache_files = sorted(glob.glob(os.path.join(cache_dir, f"{prefix}-*-points.cache.npz")))
+    if not cache_files:
+        raise FileNotFoundError(f"没有找到缓存文件: {cache_dir}/{prefix}-*-points.cache.npz")
+    print(f"从{len(cache_files)}个缓存文件读取数据...")
+    data_array, ids, variables, times = load_cache_cube(cache_files)
+
+    if point_ids:
+        index = pd.Index(ids).get_indexer(point_ids)
+        if np.any(index < 0):
+            raise ValueError(f"缓存中没有这些点: {[p for p, i in zip(point_ids, index) if i < 0]}")
+        data_array, ids = data_array[index], list(point_ids)
+
+    data_array, times, _ = fill_cube_gaps(data_array, times, variables, ids, native_time_step(times), max_gap_steps)
+    forcing, columns = convert_cube(data_array, variables)
+    if derived:
+        extra, extra_columns = compute_derived(data_array, variables)
+        forcing = np.concatenate([forcing, extra], axis=2)
+        columns = columns + extra_columns
+    return forcing, times, ids, columns
+
+def load_csv_forcing(csv_dir, point_ids, derived_dir=None):
+    """从已生成的驱动文件读取数据，返回([点, 时间, 列], 时间, 点ID, 列名)
+
+    derived_dir为sidecar模式的派生变量目录，其中的列追加在驱动列之后。
+    """
+    arrays, times, columns = [], None, None
+    for point_id in point_ids:
+        file_times, values, file_columns = read_shud_forcing_csv(os.path.join(csv_dir, f"{point_id}.csv"))
+        if derived_dir:
+            derived_times, extra, extra_columns = read_shud_forcing_csv(os.path.join(derived_dir, f"{point_id}.csv"))
+            if len(derived_times) != len(file_times) or not np.all(derived_times == file_times):
+                raise ValueError(f"派生变量文件与驱动文件的时间轴不一致: {point_id}.csv")
+            values = np.concatenate([values, extra], axis=1)
+            file_columns = file_columns + extra_columns
+        if times is None:
+            times, columns = file_times, file_columns
+        elif len(file_times) != len(times) or not np.all(file_times == times) or file_columns != columns:
+            raise ValueError(f"驱动文件的时间轴或列不一致: {point_id}.csv")
+        arrays.append(values)
+    return np.stack(arrays), times, list(point_ids), columns
+
+def cache_only_steps(output_dir, cache_dir, prefix):
+    """检查已生成的驱动文件是否经过缓存模式无法重现的处理，返回处理名称列表"""
+    steps = []
+    cache_files = sorted(glob.glob(os.path.join(cache_dir, f"{prefix}-*-points.cache.npz")))
+    if not cache_files:
+        return steps
+    # 降尺度后驱动文件ID为站点ID（格点ID加高程带），不在缓存的格点ID中
+    if os.path.exists(os.path.join(output_dir, "meteo.tsd.forc")):
+        cache_ids = set()
+        for cache_file in cache_files:
+            with np.load(cache_file) as cache_data:
+                cache_ids.update(str(i) for i in cache_data['point_ids'])
+        if any(point_id not in cache_ids for point_id in read_forc_ids(output_dir)):
+            steps.append("高程降尺度")
+    if os.path.exists(bias_transfer_file(cache_files)):
+        steps.append("偏差校正")
+    return steps
+
+def derived_mode(output_dir):
+    """检查已生成的驱动文件是否带有派生变量，返回'columns'、'sidecar'或None"""
+    derived_names = {spec["column"] for spec in DERIVED_COLUMNS}
+    csv_files = sorted(glob.glob(os.path.join(output_dir, "csv", "*.csv")))
+    if csv_files:
+        with open(csv_files[0], 'r') as f:
+            f.readline()
+            if derived_names & set(f.readline().split()[1:]):
+                return "columns"
+    if os.path.isdir(os.path.join(output_dir, "derived")):
+        return "sidecar"
+    return None
+
+def read_forc_ids(output_dir):
+    """读取meteo.tsd.forc中的驱动文件ID"""
+    with open(os.path.join(output_dir, "meteo.tsd.forc"), 'r') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return [name[:-len(".csv")] for name in lines[2:2 + int(lines[0].split()[0])]]
+
+def write_window_file(task):
+    """写出单个时段单个点的驱动文件（供进程池调用）"""
+    csv_file, times, values, columns, time_step = task
+    write_shud_forcing_csv(csv_file, times, values, columns, time_step)
+    return csv_file
+
+def write_window_forc(window_dir, point_ids, start_date):
+    """写出时段的meteo.tsd.forc"""
+    with open(os.path.join(window_dir, "meteo.tsd.forc"), 'w') as f:
+        f.write(f"{len(point_ids)} {start_date}\n")
+        f.write("./csv/\n")
+        for point_id in point_ids:
+            f.write(f"{point_id}.csv\n")
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    windows = [parse_window(spec) for spec in args.window]
+
+    prefix = get_product(args.product)["cache_prefix"]
+    cache_dir = os.path.join(args.output_dir, "cache")
+    from_csv = args.from_csv
+    derived = derived_mode(args.output_dir)
+    if not from_csv:
+        steps = cache_only_steps(args.output_dir, cache_dir, prefix)
+        if steps:
+            print(f"驱动文件经过{'、'.join(steps)}，缓存无法重现，改为从csv/切片")
+            from_csv = True
+        else:
+            print("从缓存切片: 只做缺测插补和单位转换；如果生成驱动文件时使用了--qc-mask，请改用--from-csv")
+
+    if from_csv:
+        point_ids = args.points or read_forc_ids(args.output_dir)
+        derived_dir = os.path.join(args.output_dir, "derived") if derived == "sidecar" else None
+        forcing, times, point_ids, columns = load_csv_forcing(os.path.join(args.output_dir, "csv"), point_ids, derived_dir)
+    else:
+        forcing, times, point_ids, columns = load_cache_forcing(cache_dir, prefix, args.points, args.max_gap_steps,
+                                                                derived=bool(derived))
+
+    time_step = parse_time_step(args.time_step)
+    if time_step:
+        forcing, times, columns = resample_cube(forcing, times, columns, time_step)
+    print(f"驱动数据: {len(point_ids)}个点，{len(times)}个时间步（{times[0]} ~ {times[-1]}）")
+
+    # sidecar模式下派生变量单独写入时段的derived目录
+    derived_names = [spec["column"] for spec in DERIVED_COLUMNS]
+    if derived == "sidecar":
+        forcing_idx = [i for i, c in enumerate(columns) if c not in derived_names]
+        derived_idx = [i for i, c in enumerate(columns) if c in derived_names]
+    else:
+        forcing_idx = list(range(len(columns)))
+        derived_idx = []
+
+    # 所有时段的边界一次查找，每个时段只是数据立方体的一个切片
+    starts, ends = window_bounds(times, windows)
+    window_root = args.window_dir or os.path.join(args.output_dir, "windows")
+    tasks = []
+    for (name, _, _), start, end in zip(windows, starts, ends):
+        if end - start < 2:
+            print(f"警告: 时段 '{name}' 在数据范围内少于2个时间步，跳过")
+            continue
+        window_dir = os.path.join(window_root, name)
+        os.makedirs(os.path.join(window_dir, "csv"), exist_ok=True)
+        if derived_idx:
+            os.makedirs(os.path.join(window_dir, "derived"), exist_ok=True)
+        window_times = times[start:end]
+        write_window_forc(window_dir, point_ids, window_times[0].strftime("%Y%m%d"))
+        print(f"  时段 {name}: {window_times[0]} ~ {window_times[-1]}，{end - start}个时间步")
+        for p_idx, point_id in enumerate(point_ids):
+            tasks.append((os.path.join(window_dir, "csv", f"{point_id}.csv"), window_times,
+                          forcing[p_idx, start:end][:, forcing_idx], [columns[i] for i in forcing_idx], time_step))
+            if derived_idx:
+                tasks.append((os.path.join(window_dir, "derived", f"{point_id}.csv"), window_times,
+                              forcing[p_idx, start:end][:, derived_idx], [columns[i] for i in derived_idx], time_step))
+
+    # 所有时段的文件并行写出
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for idx, _ in enumerate(executor.map(write_window_file, tasks, chunksize=max(1, len(tasks) // (args.workers * 8)))):
+            if (idx + 1) % 500 == 0 or idx + 1 == len(tasks):
+                print(f"  已写出 {idx+1}/{len(tasks)} 个驱动文件")
+
+    print(f"时段切片完成，保存在 {window_root}")
+    return 0
+
+if __name__ == "__main__":
+    try:
+        exit_code = main()
+        exit(exit_code)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        exit(1)
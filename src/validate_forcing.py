@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+GLDAS驱动数据的站点验证工具
+功能:
+1. 读取站点shapefile和站点观测表，用空间索引将站点关联到已生成的气象驱动格点
+2. 只读取关联格点的驱动文件（csv/中没有时从forcing.nc读取），与观测数据按共同时间步长对齐为[站点, 时间, 变量]数组
+3. 按站点、变量和季节计算Bias、RMSE、R和KGE，输出一张汇总表
+4. 可选为每个站点输出观测与驱动数据的对比图
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+from ldas_products import PRODUCTS, DEFAULT_PRODUCT, get_product
+from shud_forcing import read_shud_forcing_csv
+from shud_netcdf import read_forcing_netcdf
+from shud_resample import native_time_step
+from shud_stations import read_observations, link_stations, representative_series, common_step, align_series
+from shud_validation import VARIABLE_LABELS, validate_cube, write_validation_figures
+from process_gldas_for_shud import read_shapefile_coordinates
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="用站点观测验证GLDAS气象驱动数据")
+    parser.add_argument("--output-dir", default="output", help="process_gldas_for_shud.py的输出目录")
+    parser.add_argument("--stations-file", default=os.path.join("data", "shp数据", "hydro_stations.shp"),
+                        help="站点shapefile（ID字段）")
+    parser.add_argument("--obs-file", required=True, help="站点观测CSV（ID, Time和Precip、Temp等驱动列）")
+    parser.add_argument("--nc-file", type=str, help="csv/中没有驱动文件时读取的NetCDF驱动文件，默认为输出目录下的forcing.nc")
+    parser.add_argument("--product", choices=sorted(PRODUCTS), default=DEFAULT_PRODUCT, help="LDAS数据产品（决定格点大小）")
+    parser.add_argument("--variables", nargs='+', default=list(VARIABLE_LABELS), help="参与验证的驱动列")
+    parser.add_argument("--report-file", type=str, help="汇总表路径，默认为输出目录下的validation_summary.csv")
+    parser.add_argument("--figures", action="store_true", help="为每个站点输出对比图（fig/validation/）")
+    return parser.parse_args()
+
+def read_forcing_locations(output_dir):
+    """读取meteo_locations.csv中的气象驱动格点"""
+    locations = pd.read_csv(os.path.join(output_dir, "meteo_locations.csv"))
+    return [
+        {"id": str(row.ID), "lon": float(row.GLDAS_Lon), "lat": float(row.GLDAS_Lat), "n_points": int(row.N_Points)}
+        for row in locations.itertuples(index=False)
+    ]
+
+def read_forcing_series(output_dir, cell_ids, columns, nc_file=None):
+    """读取若干驱动文件，返回([序列, 时间, 列]数组, 时间, 列名)
+
+    优先读取csv/中的驱动文件；只输出NetCDF时（csv/中没有驱动文件）从nc_file读取。
+    """
+    csv_dir = os.path.join(output_dir, "csv")
+    if not all(os.path.exists(os.path.join(csv_dir, f"{cell_id}.csv")) for cell_id in cell_ids):
+        nc_file = nc_file or os.path.join(output_dir, "forcing.nc")
+        if not os.path.exists(nc_file):
+            raise FileNotFoundError(f"没有找到驱动数据: {csv_dir} 或 {nc_file}")
+        print(f"csv/中缺少驱动文件，从NetCDF驱动文件读取: {nc_file}")
+        values, times, _, file_columns, _ = read_forcing_netcdf(nc_file, cell_ids)
+        out_columns = [c for c in columns if c in file_columns]
+        return values[:, :, [file_columns.index(c) for c in out_columns]], times, out_columns
+
+    arrays, times, out_columns = [], None, None
+    for cell_id in cell_ids:
+        file_times, values, file_columns = read_shud_forcing_csv(os.path.join(csv_dir, f"{cell_id}.csv"))
+        if times is None:
+            times = file_times
+            out_columns = [c for c in columns if c in file_columns]
+        elif len(file_times) != len(times) or not np.all(file_times == times):
+            raise ValueError(f"驱动文件的时间轴不一致: {cell_id}.csv")
+        arrays.append(values[:, [file_columns.index(c) for c in out_columns]])
+    return np.stack(arrays), times, out_columns
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    product = get_product(args.product)
+
+    # 读取站点并关联到驱动格点
+    station_ids, lons, lats = read_shapefile_coordinates(args.stations_file)
+    station_ids = [str(s) for s in station_ids]
+    cells = read_forcing_locations(args.output_dir)
+    station_cell, cell_of_series, n_cells = link_stations(lons, lats, cells, product["resolution"])
+    linked = np.flatnonzero(station_cell >= 0)
+    if len(linked) == 0:
+        print("错误: 没有站点位于驱动格点内")
+        return 1
+
+    # 只读取关联格点的驱动文件
+    series = representative_series(cell_of_series, cells, n_cells)[station_cell[linked]]
+    cell_ids = [cells[i]["id"] for i in series]
+    unique_ids, inverse = np.unique(cell_ids, return_inverse=True)
+    print(f"读取{len(unique_ids)}个驱动文件...")
+    forcing, times, columns = read_forcing_series(args.output_dir, unique_ids, args.variables, args.nc_file)
+
+    obs, obs_times, obs_columns = read_observations(args.obs_file, [station_ids[i] for i in linked], columns)
+    forcing = forcing[inverse.ravel()][:, :, [columns.index(c) for c in obs_columns]]
+
+    # 对齐到共同的时间轴
+    step = common_step(native_time_step(times), native_time_step(obs_times))
+    model, obs, block_times = align_series(forcing, times, obs, obs_times, step)
+    if len(block_times) == 0:
+        print("错误: 观测数据与驱动数据没有重叠的时间")
+        return 1
+    print(f"对齐到共同时间轴: {len(block_times)}个时间步（步长{step}秒）")
+
+    linked_ids = [station_ids[i] for i in linked]
+    summary = validate_cube(model, obs, block_times, linked_ids, cell_ids, obs_columns)
+    report_file = args.report_file or os.path.join(args.output_dir, "validation_summary.csv")
+    summary.to_csv(report_file, index=False, float_format="%.4f")
+    print(f"验证汇总表已保存至: {report_file}")
+
+    overall = summary[summary["Season"] == "All"]
+    for variable, group in overall.groupby("Variable", sort=False):
+        print(f"  {variable}: {len(group)}个站点，平均Bias {group['Bias'].mean():.3f}，"
+              f"平均RMSE {group['RMSE'].mean():.3f}，KGE中位数 {group['KGE'].median():.3f}")
+
+    if args.figures:
+        write_validation_figures(block_times, model, obs, obs_columns, linked_ids, cell_ids,
+                                 os.path.join(args.output_dir, "fig", "validation"))
+
+    return 0
+
+if __name__ == "__main__":
+    try:
+        exit_code = main()
+        exit(exit_code)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        exit(1)